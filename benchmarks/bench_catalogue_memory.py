@@ -0,0 +1,58 @@
+"""Compare the Python heap used by the catalogue of MemoryRepository and of ColumnarMemoryRepository.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_catalogue_memory [copies]
+
+games/adapters/data/games.csv is written `copies` times (with fresh game ids) to a temporary data folder.
+The columnar store itself is memory-mapped and not on the Python heap, its pages are shared between all
+processes that map it; its file size is reported separately.
+"""
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from games.adapters import password_hashing
+from games.adapters.columnar_repository import ColumnarMemoryRepository
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.repository_populate import populate
+
+from benchmarks.bench_csv_import import write_catalogue
+from utils import get_project_root
+
+
+def heap_used(make_repository, data_path: str) -> tuple[object, int]:
+    gc.collect()
+    tracemalloc.start()
+    repo = make_repository()
+    populate(data_path, repo, False)
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return repo, used
+
+
+def main(copies: int = 10):
+    password_hashing.password_hash_method = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as directory:
+        write_catalogue(os.path.join(directory, "games.csv"), copies)
+        shutil.copy(get_project_root() / "games" / "adapters" / "data" / "users.csv", directory)
+        store_path = os.path.join(directory, "catalogue.columns")
+        # Build the store first so that only mapping it is measured.
+        populate(directory, ColumnarMemoryRepository(store_path), False)
+
+        repo, memory = heap_used(MemoryRepository, directory)
+        game_count = len(repo.getAllGames())
+        del repo
+        repo, columnar = heap_used(lambda: ColumnarMemoryRepository(store_path), directory)
+        print(f"{game_count} games")
+        print(f"MemoryRepository:          {memory / 1024 / 1024:8.1f} MiB heap ({memory / game_count:.0f} bytes/game)")
+        print(f"ColumnarMemoryRepository:  {columnar / 1024 / 1024:8.1f} MiB heap ({columnar / game_count:.0f} bytes/game)"
+              f" + {os.path.getsize(store_path) / 1024 / 1024:.1f} MiB shared store")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
@@ -0,0 +1,58 @@
+"""Compare the serial and the parallel game CSV readers on a large catalogue.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_csv_import [copies] [workers]
+
+games/adapters/data/games.csv is written `copies` times (with fresh game ids) to a temporary file,
+which is then parsed with GameFileCSVReader and with ParallelGameFileCSVReader.
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+from games.adapters.datareader.csvdatareader import GameFileCSVReader, ParallelGameFileCSVReader
+
+from utils import get_project_root
+
+
+def write_catalogue(filename: str, copies: int):
+    source = get_project_root() / "games" / "adapters" / "data" / "games.csv"
+    with open(source, 'r', encoding='utf-8-sig', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        rows = list(reader)
+    app_id = header.index("AppID")
+    with open(filename, 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for copy in range(copies):
+            for row in rows:
+                row = list(row)
+                row[app_id] = str(int(row[app_id]) + copy * 10_000_000)
+                writer.writerow(row)
+
+
+def time_reader(reader) -> tuple[int, float]:
+    start = time.perf_counter()
+    count = sum(1 for _ in reader.iter_games())
+    return count, time.perf_counter() - start
+
+
+def main(copies: int = 200, workers: int = None):
+    workers = workers or os.cpu_count()
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "games.csv")
+        write_catalogue(filename, copies)
+        print(f"{os.path.getsize(filename) / 1024 / 1024:.1f} MiB")
+        count, serial = time_reader(GameFileCSVReader(filename))
+        print(f"serial:   {count} games in {serial:.2f}s ({count / serial:.0f} games/sec)")
+        count, parallel = time_reader(ParallelGameFileCSVReader(filename, workers))
+        print(f"parallel: {count} games in {parallel:.2f}s ({count / parallel:.0f} games/sec, {workers} workers)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+         int(sys.argv[2]) if len(sys.argv) > 2 else None)
@@ -0,0 +1,56 @@
+"""Report the memory used per game by the domain model, with and without shared genres and publishers.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_model_memory [game counts...]
+
+The rows of games/adapters/data/games.csv are repeated (with fresh game ids) up to each game count, by default
+10000 and 100000. "shared" is how the CSV readers build games, with one Genre and Publisher instance per name;
+"per game" gives every game its own instances, as the readers used to.
+"""
+import csv
+import gc
+import sys
+import tracemalloc
+
+from games.adapters.datareader.csvdatareader import CatalogueFlyweights, GameFileCSVReader
+
+from utils import get_project_root
+
+
+def read_rows() -> list[list[str]]:
+    with open(get_project_root() / "games" / "adapters" / "data" / "games.csv", 'r', encoding='utf-8-sig',
+              newline='') as file:
+        reader = csv.reader(file)
+        positions = GameFileCSVReader.column_positions(next(reader))
+        return [[row[position] for position in positions] for row in reader]
+
+
+def bytes_per_game(rows: list[list[str]], game_count: int, shared: bool) -> float:
+    gc.collect()
+    tracemalloc.start()
+    flyweights = CatalogueFlyweights() if shared else None
+    games = []
+    for i in range(game_count):
+        # Decoded again so that every game has its own title and description strings, as when read from a file.
+        values = [str(value.encode('utf-8'), 'utf-8') for value in rows[i % len(rows)]]
+        values[0] = str(int(values[0]) + (i // len(rows)) * 10_000_000)
+        games.append(GameFileCSVReader.parse_row(values, flyweights))
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del games
+    return used / game_count
+
+
+def main(game_counts: list[int]):
+    rows = read_rows()
+    print(f"{'games':>10}{'shared (bytes/game)':>22}{'per game (bytes/game)':>24}")
+    for game_count in game_counts:
+        shared = bytes_per_game(rows, game_count, True)
+        per_game = bytes_per_game(rows, game_count, False)
+        print(f"{game_count:>10}{shared:>22.0f}{per_game:>24.0f}")
+
+
+if __name__ == "__main__":
+    main([int(argument) for argument in sys.argv[1:]] or [10_000, 100_000])
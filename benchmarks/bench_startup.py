@@ -0,0 +1,47 @@
+"""Compare populating the memory repository from the CSV with loading it from a catalogue snapshot.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_startup [copies]
+
+games/adapters/data/games.csv is written `copies` times (with fresh game ids) to a temporary data folder.
+Passwords are hashed with a cheap method so that the timings are about the catalogue.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from games.adapters import password_hashing
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.repository_populate import populate
+
+from benchmarks.bench_csv_import import write_catalogue
+from utils import get_project_root
+
+
+def time_populate(data_path: str, snapshot_path: str = None) -> float:
+    start = time.perf_counter()
+    populate(data_path, MemoryRepository(), False, snapshot_path=snapshot_path)
+    return time.perf_counter() - start
+
+
+def main(copies: int = 1):
+    password_hashing.password_hash_method = 'pbkdf2:sha256:1000'
+    with tempfile.TemporaryDirectory() as directory:
+        write_catalogue(os.path.join(directory, "games.csv"), copies)
+        shutil.copy(get_project_root() / "games" / "adapters" / "data" / "users.csv", directory)
+        snapshot_path = os.path.join(directory, "catalogue.snapshot")
+
+        cold = time_populate(directory)
+        first = time_populate(directory, snapshot_path)
+        warm = time_populate(directory, snapshot_path)
+        print(f"snapshot: {os.path.getsize(snapshot_path) / 1024 / 1024:.1f} MiB")
+        print(f"cold CSV load:          {cold:.3f}s")
+        print(f"CSV load + snapshot:    {first:.3f}s")
+        print(f"snapshot load:          {warm:.3f}s ({cold / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -0,0 +1,53 @@
+"""Compare the full-text index with the substring scan browse used for title searches.
+
+Run from the project directory:
+
+    python -m benchmarks.bench_text_search [copies]
+
+The catalogue from games/adapters/data is loaded `copies` times (with fresh game ids) to show how both
+approaches scale with catalogue size.
+"""
+import sys
+import timeit
+
+from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from games.adapters.memory_repository import MemoryRepository
+from games.browse import services
+from games.domainmodel.model import Game
+
+from utils import get_project_root
+
+QUERIES = ["zombie", "call of duty", "space", "war", "puzzle adventure"]
+
+
+def build_repository(copies: int) -> MemoryRepository:
+    reader = GameFileCSVReader(str(get_project_root() / "games" / "adapters" / "data" / "games.csv"))
+    reader.read_csv_file()
+    repo = MemoryRepository()
+    for copy in range(copies):
+        for game in reader.dataset_of_games:
+            clone = Game(game.game_id + copy * 10_000_000, game.title)
+            clone.description = game.description
+            clone.publisher = game.publisher
+            for genre in game.genres:
+                clone.add_genre(genre)
+            repo.add_game(clone)
+    return repo
+
+
+def main(copies: int = 1):
+    repo = build_repository(copies)
+    games = repo.getAllGames()
+    print(f"{len(games)} games")
+    print(f"{'query':<20}{'scan (ms)':>12}{'index (ms)':>12}{'scan hits':>12}{'index hits':>12}")
+    for query in QUERIES:
+        number = 20
+        scan = timeit.timeit(lambda: services.searchGameByTitle(games, query), number=number) / number
+        index = timeit.timeit(lambda: repo.search_games(text=query, limit=10), number=number) / number
+        scan_hits = len(services.searchGameByTitle(games, query))
+        index_hits = repo.search_games(text=query, limit=10)[1]
+        print(f"{query:<20}{scan * 1000:>12.3f}{index * 1000:>12.3f}{scan_hits:>12}{index_hits:>12}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1)
@@ -19,9 +19,53 @@ class Config:
 
     REPOSITORY = environ.get('REPOSITORY')
 
+    # Password hashing, e.g. a cheap 'pbkdf2:sha256:1000' for development, werkzeug's default when not set
+    PASSWORD_HASH_METHOD = environ.get('PASSWORD_HASH_METHOD')
+    # File keeping the hashes of users.csv between runs, not used when not set
+    PASSWORD_HASH_CACHE = environ.get('PASSWORD_HASH_CACHE')
+
+    # Processes that parse the CSVs and hash the passwords when the repository is populated
+    POPULATE_WORKERS = int(environ.get('POPULATE_WORKERS', 1))
+
+    # Catalogue snapshot file for the memory repository, not used when not set
+    CATALOGUE_SNAPSHOT = environ.get('CATALOGUE_SNAPSHOT')
+
+    # Seconds between checks of games.csv for changes, which are then loaded while serving; 0 turns it off
+    CATALOGUE_RELOAD_INTERVAL = float(environ.get('CATALOGUE_RELOAD_INTERVAL', 0))
+
+    # Memory-mapped columnar catalogue file, when set the memory repository keeps its catalogue in it
+    COLUMNAR_STORE = environ.get('COLUMNAR_STORE')
+
     # Database configuration
     SQLALCHEMY_DATABASE_URI = environ.get('SQLALCHEMY_DATABASE_URI')
 
+    # Connection pool of the database repository (not used for in-memory SQLite)
+    SQLALCHEMY_POOL_SIZE = int(environ.get('SQLALCHEMY_POOL_SIZE', 5))
+    SQLALCHEMY_MAX_OVERFLOW = int(environ.get('SQLALCHEMY_MAX_OVERFLOW', 10))
+    SQLALCHEMY_POOL_TIMEOUT = float(environ.get('SQLALCHEMY_POOL_TIMEOUT', 30))
+    SQLALCHEMY_POOL_PRE_PING = environ.get('SQLALCHEMY_POOL_PRE_PING', 'True').lower().strip() == "true"
+    SQLALCHEMY_POOL_RECYCLE = int(environ.get('SQLALCHEMY_POOL_RECYCLE', 1800))
+
+    # SQLite pragmas applied to every new connection
+    SQLITE_JOURNAL_MODE = environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(environ.get('SQLITE_CACHE_SIZE', -64 * 1024))
+
+    # Read-through cache of catalogue data in front of the database repository, 0 entries turns it off
+    CATALOGUE_CACHE_SIZE = int(environ.get('CATALOGUE_CACHE_SIZE', 10000))
+    CATALOGUE_CACHE_TTL = float(environ.get('CATALOGUE_CACHE_TTL', 300))
+
+    # Memory in bytes for rendered game details and browse listings, 0 turns the fragment cache off
+    FRAGMENT_CACHE_SIZE = int(environ.get('FRAGMENT_CACHE_SIZE', 16 * 1024 * 1024))
+
+    # Seconds browsers and shared caches may keep the home and browse pages of anonymous users
+    PAGE_CACHE_MAX_AGE = int(environ.get('PAGE_CACHE_MAX_AGE', 60))
+
+    # Reviews queued and inserted in batches by a background thread, 0 inserts every review right away
+    REVIEW_WRITE_BEHIND_BATCH_SIZE = int(environ.get('REVIEW_WRITE_BEHIND_BATCH_SIZE', 0))
+    REVIEW_WRITE_BEHIND_DELAY = float(environ.get('REVIEW_WRITE_BEHIND_DELAY', 0.05))
+
     echo_string = environ.get('SQLALCHEMY_ECHO')
     SQLALCHEMY_ECHO = False
     if echo_string.lower().strip() == "true":
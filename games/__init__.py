@@ -0,0 +1,162 @@
+"""Initialize Flask app."""
+
+from pathlib import Path
+
+from flask import Flask
+from sqlalchemy import inspect
+from sqlalchemy.orm import sessionmaker, clear_mappers
+
+import games.adapters.repository as repo
+from games.adapters import memory_repository, database_repository, repository_populate, password_hashing
+from games.adapters.catalogue_reload import CatalogueReloader
+from games.adapters.catalogue_cache import CatalogueCache, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL
+from games.adapters.columnar_repository import ColumnarMemoryRepository
+from games.adapters.database_engine import create_database_engine
+from games.adapters.orm import metadata, map_model_to_tables, create_schema
+from games.adapters.write_behind import DEFAULT_WRITE_BEHIND_DELAY
+from games.utilities import fragment_cache, http_caching
+
+
+def create_app(test_config=None):
+    """Construct the core application.
+
+    The repository is created and populated here, once per process that imports the app. Served with
+    gunicorn's preload_app (see gunicorn.conf.py) that is the master process, and the workers forked from it
+    share the loaded catalogue through copy-on-write instead of each reading the CSVs again.
+    """
+
+    # Create the Flask app object.
+    app = Flask(__name__)
+
+    # Configure the app from configuration-file settings.
+    app.config.from_object('config.Config')
+    data_path = Path('games') / 'adapters' / 'data'
+
+    if test_config is not None:
+        # Load test configuration, and override any configuration settings.
+        app.config.from_mapping(test_config)
+        data_path = app.config['TEST_DATA_PATH']
+
+    if app.config.get('PASSWORD_HASH_METHOD'):
+        password_hashing.password_hash_method = app.config['PASSWORD_HASH_METHOD']
+    workers = int(app.config.get('POPULATE_WORKERS') or 1)
+    password_hash_cache = app.config.get('PASSWORD_HASH_CACHE')
+    catalogue_reloader = None
+
+    # Here the "magic" of our repository pattern happens. We can easily switch between in memory data and
+    # persistent database data storage for our application.
+
+    if app.config['REPOSITORY'] == 'memory':
+        # Create the MemoryRepository implementation for a memory-based repository, with its catalogue in a
+        # memory-mapped store when one is configured.
+        if app.config.get('COLUMNAR_STORE'):
+            repo.repo_instance = ColumnarMemoryRepository(app.config['COLUMNAR_STORE'])
+        else:
+            repo.repo_instance = memory_repository.MemoryRepository()
+        # fill the content of the repository from the provided csv files (has to be done every time we start app!)
+        database_mode = False
+        repository_populate.populate(data_path, repo.repo_instance, database_mode, workers=workers,
+                                     password_hash_cache=password_hash_cache,
+                                     snapshot_path=app.config.get('CATALOGUE_SNAPSHOT'))
+        # Pick up changes to games.csv while the app is running
+        reload_interval = float(app.config.get('CATALOGUE_RELOAD_INTERVAL') or 0)
+        if reload_interval > 0:
+            catalogue_reloader = CatalogueReloader(repo.repo_instance, data_path, reload_interval, workers,
+                                                   snapshot_path=app.config.get('CATALOGUE_SNAPSHOT'))
+
+    elif app.config['REPOSITORY'] == 'database':
+        # Pool size and SQLite pragmas come from the configuration, see create_database_engine.
+        # Note that creating the engine does not establish any actual DB connection directly!
+        database_engine = create_database_engine(app.config)
+
+        # Create the database session factory using sessionmaker (this has to be done once, in a global manner)
+        session_factory = sessionmaker(autocommit=False, autoflush=True, bind=database_engine)
+        # Create the SQLAlchemy DatabaseRepository instance for an sqlite3-based repository.
+        catalogue_cache = CatalogueCache(int(app.config.get('CATALOGUE_CACHE_SIZE', DEFAULT_CACHE_SIZE)),
+                                         float(app.config.get('CATALOGUE_CACHE_TTL', DEFAULT_CACHE_TTL)))
+        repo.repo_instance = database_repository.SqlAlchemyRepository(
+            session_factory, catalogue_cache,
+            review_batch_size=int(app.config.get('REVIEW_WRITE_BEHIND_BATCH_SIZE', 0)),
+            review_batch_delay=float(app.config.get('REVIEW_WRITE_BEHIND_DELAY', DEFAULT_WRITE_BEHIND_DELAY)))
+
+        if app.config['TESTING'] in (True, 'True') or len(inspect(database_engine).get_table_names()) == 0:
+            print("REPOPULATING DATABASE...")
+            # For testing, or first-time use of the web application, reinitialise the database.
+            clear_mappers()
+            create_schema(database_engine)  # Conditionally create database tables.
+            for table in reversed(metadata.sorted_tables):  # Remove any data from the tables.
+                database_engine.execute(table.delete())
+
+            # Generate mappings that map domain model classes to the database tables.
+            map_model_to_tables()
+
+            database_mode = True
+            repository_populate.populate(data_path, repo.repo_instance, database_mode, workers=workers,
+                                         password_hash_cache=password_hash_cache)
+            print("REPOPULATING DATABASE... FINISHED")
+
+        else:
+            # Add the tables and indexes that a database created by an older version is missing, and
+            # generate mappings that map domain model classes to the database tables.
+            create_schema(database_engine)
+            clear_mappers()
+            map_model_to_tables()
+
+    # Rendered pieces of the browse pages, 0 bytes turns the cache off
+    fragment_cache_size = int(app.config.get('FRAGMENT_CACHE_SIZE', fragment_cache.DEFAULT_FRAGMENT_CACHE_SIZE))
+    fragment_cache.cache_instance = None
+    if fragment_cache_size > 0:
+        fragment_cache.cache_instance = fragment_cache.FragmentCache(fragment_cache_size)
+
+    # Static files are linked with their fingerprint, see http_caching.static_url
+    app.add_template_global(http_caching.static_url, 'static_url')
+    app.after_request(http_caching.cache_static_files)
+
+    # Build the application - these steps require an application context.
+    with app.app_context():
+        # Register blueprints.
+        from .home import home
+        app.register_blueprint(home.home)
+
+        from .browse import browse
+        app.register_blueprint(browse.browse)
+
+        from .authentication import authentication
+        app.register_blueprint(authentication.authentication)
+
+        from .profile import profile
+        app.register_blueprint(profile.profile)
+
+        from .review import review
+        app.register_blueprint(review.review)
+
+        from .wishlist import wishlist
+        app.register_blueprint(wishlist.wishlist)
+
+        from .api import api
+        app.register_blueprint(api.api)
+
+        # Register a callback the makes sure that database sessions are associated with http requests
+        # We reset the session inside the database repository before a new flask request is generated,
+        # and everything the request changes is committed together after it.
+        @app.before_request
+        def before_flask_http_request_function():
+            if catalogue_reloader is not None:
+                catalogue_reloader.ensure_running()
+            if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
+                repo.repo_instance.reset_session()
+                repo.repo_instance.begin_unit_of_work()
+
+        @app.after_request
+        def after_flask_http_request_function(response):
+            if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
+                repo.repo_instance.commit_unit_of_work()
+            return response
+
+        # Register a tear-down method that will be called after each request has been processed.
+        @app.teardown_appcontext
+        def shutdown_session(exception=None):
+            if isinstance(repo.repo_instance, database_repository.SqlAlchemyRepository):
+                repo.repo_instance.close_session()
+
+    return app
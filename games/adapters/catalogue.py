@@ -0,0 +1,97 @@
+from games.adapters.text_index import GameTextIndex
+from games.domainmodel.model import Genre, Game, Publisher
+
+
+class Catalogue:
+    """Games, genres and publishers of a MemoryRepository, together with their indexes.
+
+    A catalogue is only changed while it is being built. Once MemoryRepository has published it, it is never
+    changed again: changes go into a copy, which then replaces it. Readers therefore take the current
+    catalogue without a lock and keep a consistent view of it for as long as they hold on to it.
+    """
+
+    __slots__ = ('games', 'games_by_id', 'game_ids_by_genre', 'game_ids_by_publisher', 'text_index',
+                 'genres', 'genre_names', 'publishers', 'publisher_names', 'version', '__game_ids_sorted')
+
+    def __init__(self):
+        # The lists keep insertion order for the getAll* methods, the dicts/sets beside them are
+        # the lookup indexes so that single-item reads and duplicate checks do not scan the lists.
+        self.games = list()
+        self.games_by_id = dict()
+        self.game_ids_by_genre = dict()
+        self.game_ids_by_publisher = dict()
+        self.text_index = GameTextIndex()
+        self.genres = list()
+        self.genre_names = set()
+        self.publishers = list()
+        self.publisher_names = set()
+        # Set when the catalogue is published, each published catalogue has a higher version than the last
+        self.version = 0
+        self.__game_ids_sorted = None
+
+    def add_game(self, game: Game):
+        if game.game_id not in self.games_by_id:
+            self.games_by_id[game.game_id] = game
+            self.games.append(game)
+            self.__game_ids_sorted = None
+            for genre in game.genres:
+                self.game_ids_by_genre.setdefault(genre.genre_name, set()).add(game.game_id)
+            if game.publisher is not None:
+                self.game_ids_by_publisher.setdefault(game.publisher.publisher_name, set()).add(game.game_id)
+            self.text_index.add_game(game)
+
+    def add_genre(self, genre: Genre):
+        if genre.genre_name not in self.genre_names:
+            self.genre_names.add(genre.genre_name)
+            self.genres.append(genre)
+
+    def add_publisher(self, publisher: Publisher):
+        if publisher.publisher_name not in self.publisher_names:
+            self.publisher_names.add(publisher.publisher_name)
+            self.publishers.append(publisher)
+
+    def game_ids_sorted(self) -> list[int]:
+        # Sorted on first use; two readers doing so at the same time both store the same list.
+        if self.__game_ids_sorted is None:
+            self.__game_ids_sorted = sorted(self.games_by_id)
+        return self.__game_ids_sorted
+
+    def prepare(self):
+        """Build the lazily built parts now, e.g. before publishing a catalogue that replaces another."""
+        self.game_ids_sorted()
+        self.text_index.prepare()
+
+    def copy(self) -> 'Catalogue':
+        """A copy to make changes to. The domain objects are shared, the containers holding them are not."""
+        catalogue = Catalogue()
+        catalogue.games = list(self.games)
+        catalogue.games_by_id = dict(self.games_by_id)
+        catalogue.game_ids_by_genre = {name: set(ids) for name, ids in self.game_ids_by_genre.items()}
+        catalogue.game_ids_by_publisher = {name: set(ids) for name, ids in self.game_ids_by_publisher.items()}
+        catalogue.text_index = self.text_index.copy()
+        catalogue.genres = list(self.genres)
+        catalogue.genre_names = set(self.genre_names)
+        catalogue.publishers = list(self.publishers)
+        catalogue.publisher_names = set(self.publisher_names)
+        catalogue.__game_ids_sorted = self.__game_ids_sorted
+        return catalogue
+
+    def to_dict(self) -> dict:
+        return {
+            'games': self.games,
+            'games_by_id': self.games_by_id,
+            'game_ids_by_genre': self.game_ids_by_genre,
+            'game_ids_by_publisher': self.game_ids_by_publisher,
+            'text_index': self.text_index,
+            'genres': self.genres,
+            'genre_names': self.genre_names,
+            'publishers': self.publishers,
+            'publisher_names': self.publisher_names,
+        }
+
+    @classmethod
+    def from_dict(cls, catalogue: dict) -> 'Catalogue':
+        instance = cls()
+        for name, value in catalogue.items():
+            setattr(instance, name, value)
+        return instance
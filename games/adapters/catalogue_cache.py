@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300.0
+
+
+class CatalogueCache:
+    """Read-through cache for catalogue data, shared by all threads of a process.
+
+    Entries are evicted least recently used first once there are more than max_entries, and expire ttl seconds
+    after they were loaded. Loaders run outside the lock, so a slow query never blocks readers of other keys.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL, clock=time.monotonic):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__clock = clock
+        self.__entries = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key, loader):
+        """Return the cached value for key, calling loader() to fill it on a miss. None is never cached."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[0] > self.__clock():
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[1]
+            self.__misses += 1
+            generation = self.__generation
+
+        value = loader()
+
+        with self.__lock:
+            # An invalidation while loading means the value may already be stale, so it is not kept.
+            if value is not None and generation == self.__generation:
+                self.__entries[key] = (self.__clock() + self.__ttl, value)
+                self.__entries.move_to_end(key)
+                while len(self.__entries) > self.__max_entries:
+                    self.__entries.popitem(last=False)
+                    self.__evictions += 1
+        return value
+
+    def invalidate(self, *keys):
+        """Drop the given keys, or everything when no keys are given."""
+        with self.__lock:
+            self.__generation += 1
+            if len(keys) == 0:
+                self.__entries.clear()
+            for key in keys:
+                self.__entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'entries': len(self.__entries),
+            }
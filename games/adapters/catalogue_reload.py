@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from pathlib import Path
+
+from games.adapters.columnar_repository import ColumnarMemoryRepository
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.snapshot import is_current, source_fingerprint, write_snapshot
+
+
+class CatalogueReloader:
+    """Polls games.csv from a background thread and reloads the catalogue of a MemoryRepository when it changes.
+
+    The new catalogue is built next to the one being served and then swapped in (see
+    MemoryRepository.reload_catalogue), so requests never wait for a reload and users, reviews and wishlists are
+    kept. A change is only picked up once the file has had the same size and mtime for two polls, so a CSV that
+    is still being copied in is not read half written. The thread is started per process on first use, which
+    makes it survive gunicorn forking the preloaded app into workers.
+    """
+
+    def __init__(self, repo: MemoryRepository, data_path, interval: float, workers: int = 1,
+                 snapshot_path=None):
+        self.__repo = repo
+        self.__data_path = Path(data_path)
+        self.__games_filename = self.__data_path / "games.csv"
+        self.__interval = interval
+        self.__workers = workers
+        self.__snapshot_path = snapshot_path
+        self.__fingerprint = source_fingerprint(self.__games_filename)
+        self.__changed_stat = None
+        self.__previous_catalogue = None
+        self.__pid = None
+        self.__lock = threading.Lock()
+        self.reloads = 0
+
+    def ensure_running(self):
+        if self.__pid != os.getpid():
+            with self.__lock:
+                if self.__pid != os.getpid():
+                    threading.Thread(target=self.__run, name='catalogue-reload', daemon=True).start()
+                    self.__pid = os.getpid()
+
+    def check(self) -> bool:
+        """Reload the catalogue if games.csv has changed and settled since the last check."""
+        # The catalogue replaced by the previous reload is released here, outside of any request
+        self.__previous_catalogue = None
+        if is_current(self.__fingerprint, self.__games_filename):
+            self.__changed_stat = None
+            return False
+        stat = os.stat(self.__games_filename)
+        changed_stat = (stat.st_mtime_ns, stat.st_size)
+        if changed_stat != self.__changed_stat:
+            self.__changed_stat = changed_stat
+            return False
+
+        # Taken before reading, a change made during the reload is picked up by a later check
+        fingerprint = source_fingerprint(self.__games_filename)
+        start = time.perf_counter()
+        try:
+            self.__previous_catalogue = self.__repo.reload_catalogue(self.__data_path, self.__workers)
+        except Exception as e:
+            print(f"Could not reload the catalogue from {self.__games_filename}: {e}")
+            return False
+        self.__fingerprint = fingerprint
+        self.__changed_stat = None
+        self.reloads += 1
+        print(f"Reloaded the catalogue from {self.__games_filename} in {time.perf_counter() - start:.2f}s")
+
+        if self.__snapshot_path is not None and not isinstance(self.__repo, ColumnarMemoryRepository):
+            write_snapshot(self.__snapshot_path, self.__games_filename, self.__repo.export_catalogue())
+        return True
+
+    def __run(self):
+        while True:
+            time.sleep(self.__interval)
+            try:
+                self.check()
+            except OSError as e:
+                print(f"Could not check {self.__games_filename} for changes: {e}")
@@ -0,0 +1,153 @@
+from pathlib import Path
+
+from games.adapters.columnar_store import ColumnarGameStore, is_store_current, write_columnar_store
+from games.adapters.datareader.csvdatareader import stream_gamedata
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.repository import RepositoryException, initial_catalogue_version
+from games.adapters.text_index import GameTextIndex
+from games.domainmodel.model import Genre, Game, Publisher
+
+
+class ColumnarMemoryRepository(MemoryRepository):
+    """MemoryRepository with a read-only catalogue in a memory-mapped ColumnarGameStore.
+
+    Users, reviews and wishlists are kept in memory as in MemoryRepository. The catalogue is shared between
+    all workers that map the same store file, only the full-text index is built per process, on first use.
+    """
+
+    def __init__(self, store_path):
+        super().__init__()
+        self.__store_path = store_path
+        self.__store = None
+        # Versions key page ETags, which browsers keep across restarts of the app
+        self.__store_version = initial_catalogue_version()
+        self.__text_index = None
+
+    def load_catalogue(self, data_path: Path, workers: int = 1) -> int:
+        """Map the store, after (re)writing it from games.csv if it is missing or the CSV has changed."""
+        games_filename = Path(data_path) / "games.csv"
+        if not is_store_current(self.__store_path, games_filename):
+            write_columnar_store(self.__store_path, stream_gamedata(data_path, workers), games_filename)
+        self.__store = ColumnarGameStore(self.__store_path)
+        self.__store_version += 1
+        self.__text_index = None
+        return len(self.__store)
+
+    def reload_catalogue(self, data_path: Path, workers: int = 1) -> ColumnarGameStore:
+        """Rewrite the store from games.csv and map the new one. The store file is replaced, not overwritten,
+        so requests still reading the previous mapping keep a valid view of it; that store is returned."""
+        games_filename = Path(data_path) / "games.csv"
+        write_columnar_store(self.__store_path, stream_gamedata(data_path, workers), games_filename)
+        store = ColumnarGameStore(self.__store_path)
+        previous = self.__store
+        self.__store = store
+        # Counted after the swap, so that games read after a version are never older than it
+        self.__store_version += 1
+        return previous
+
+    def catalogue_version(self) -> int:
+        return self.__store_version
+
+    # Game Related Methods
+    def add_game(self, game: Game):
+        raise RepositoryException("The columnar catalogue is read-only")
+
+    def getAllGames(self) -> list[Game]:
+        return self.__store.games()
+
+    def getGameById(self, id: int):
+        store = self.__store
+        row = store.row_of(id)
+        return None if row is None else store.game(row)
+
+    def getGamesByGenres(self, genres: list[Genre], load_plan=None) -> list[Game]:
+        store = self.__store
+        if genres is None or len(genres) == 0 or genres[0] == '':
+            return store.games()
+        rows = set()
+        for genre in genres:
+            rows.update(store.rows_with_genre(genre.genre_name))
+        # Rows are in game id order
+        return store.games(sorted(rows))
+
+    def search_games(self, title: str = None, genres: list[Genre] = None, genre_terms: list[str] = None,
+                     publisher: str = None, min_rating: float = None, sort_by_rating: bool = False,
+                     text: str = None, offset: int = 0, limit: int = None,
+                     load_plan=None) -> tuple[list[Game], int]:
+        # Same conditions as MemoryRepository.search_games, worked out on rows so that only the games on
+        # the requested page are built.
+        store = self.__store
+        rows = None
+        ranked_rows = None
+        if text:
+            ranked_rows = [store.row_of(game_id) for game_id in self.__get_text_index(store).search(text)]
+            rows = set(ranked_rows)
+        if genres:
+            rows = set()
+            for genre in genres:
+                rows.update(store.rows_with_genre(genre.genre_name))
+        for term in genre_terms or []:
+            term_rows = set()
+            for genre in store.genres:
+                if genre.genre_name.lower() == term.lower():
+                    term_rows.update(store.rows_with_genre(genre.genre_name))
+            rows = term_rows if rows is None else rows & term_rows
+        if publisher:
+            publisher_rows = set()
+            for store_publisher in store.publishers:
+                if publisher.lower() in store_publisher.publisher_name.lower():
+                    publisher_rows.update(store.rows_with_publisher(store_publisher.publisher_name))
+            rows = publisher_rows if rows is None else rows & publisher_rows
+
+        if ranked_rows is not None:
+            # Full-text matches keep their relevance order
+            rows = [row for row in ranked_rows if row in rows]
+        elif rows is None:
+            rows = range(len(store))
+        else:
+            rows = sorted(rows)
+
+        if title:
+            rows = [row for row in rows if title.lower() in (store.string('title', row) or "").lower()]
+        if min_rating is not None:
+            rows = [row for row in rows if self.__average_rating(store.game_id(row)) >= min_rating]
+        if sort_by_rating:
+            rows = sorted(rows, key=lambda row: self.__average_rating(store.game_id(row)), reverse=True)
+
+        end = None if limit is None else offset + limit
+        return [store.game(row) for row in rows[offset:end]], len(rows)
+
+    def __average_rating(self, game_id: int) -> float:
+        review_count, rating_total = self.get_rating_summary(game_id)
+        return rating_total / review_count if review_count > 0 else -1
+
+    def __get_text_index(self, store: ColumnarGameStore) -> GameTextIndex:
+        # The index is kept together with the store it was built from, a reloaded store gets a new one.
+        indexed = self.__text_index
+        if indexed is None or indexed[0] is not store:
+            text_index = GameTextIndex()
+            for game in store.games():
+                text_index.add_game(game)
+            indexed = self.__text_index = (store, text_index)
+        return indexed[1]
+
+    # Genre Related Methods
+    def add_genre(self, genre: Genre):
+        raise RepositoryException("The columnar catalogue is read-only")
+
+    def getAllGenres(self) -> list[Genre]:
+        return self.__store.genres
+
+    # Publisher Related Methods
+    def add_publisher(self, publisher: Publisher):
+        raise RepositoryException("The columnar catalogue is read-only")
+
+    def getAllPublishers(self) -> list[Publisher]:
+        return list(self.__store.publishers)
+
+    # Catalogue Snapshot Methods
+    def export_catalogue(self) -> dict:
+        raise RepositoryException("The columnar catalogue is kept in its store file, not in a snapshot")
+
+    def import_catalogue(self, catalogue: dict):
+        raise RepositoryException("The columnar catalogue is kept in its store file, not in a snapshot")
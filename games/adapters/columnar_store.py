@@ -0,0 +1,269 @@
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+
+from games.adapters.snapshot import is_current, source_fingerprint
+from games.domainmodel.model import Game, Genre, Publisher
+
+# File layout: MAGIC, a little endian u32 format version and u32 header length, the JSON header describing
+# the columns, then the columns themselves (8 byte aligned) and finally one blob holding all strings.
+MAGIC = b'GAMECOLS'
+STORE_FORMAT = 1
+PREAMBLE = struct.Struct('<8sII')
+
+STRING_FIELDS = ('title', 'release_date', 'description', 'image_url', 'website_url')
+
+WINDOWS, MAC, LINUX = 1, 2, 4
+
+
+def write_columnar_store(filename, games, source_filename=None):
+    """Write games to a columnar store file.
+
+    Rows are ordered by game id so that a game is found by bisecting the id column, the csv_order column
+    keeps the order the games were given in. Strings are encoded into one blob with a column of n + 1
+    offsets per field, the genres of the games and the games of every genre and publisher are kept as
+    offset/value column pairs.
+    """
+    # Like MemoryRepository.add_game, the first game with an id wins.
+    unique_games = dict()
+    for game in games:
+        unique_games.setdefault(game.game_id, game)
+    given_order = list(unique_games.values())
+    games = sorted(given_order, key=lambda game: game.game_id)
+    genre_names = sorted({genre.genre_name for game in games for genre in game.genres
+                          if genre.genre_name is not None})
+    publisher_names = sorted({game.publisher.publisher_name for game in games
+                              if game.publisher is not None and game.publisher.publisher_name is not None})
+    genre_ids = {name: i for i, name in enumerate(genre_names)}
+    publisher_ids = {name: i for i, name in enumerate(publisher_names)}
+
+    columns = {
+        'game_id': array('q', (game.game_id for game in games)),
+        'price': array('d', (math.nan if game.price is None else game.price for game in games)),
+        'platforms': array('B', ((WINDOWS if game.isWindows else 0) | (MAC if game.isMac else 0) |
+                                 (LINUX if game.isLinux else 0) for game in games)),
+        'publisher': array('i', (publisher_ids.get(game.publisher.publisher_name, -1)
+                                 if game.publisher is not None else -1 for game in games)),
+    }
+    rows_by_id = {game.game_id: row for row, game in enumerate(games)}
+    columns['csv_order'] = array('I', (rows_by_id[game.game_id] for game in given_order))
+
+    genre_offsets, game_genres = array('I', [0]), array('H')
+    genre_rows = [[] for _ in genre_names]
+    publisher_rows = [[] for _ in publisher_names]
+    for row, game in enumerate(games):
+        for genre in game.genres:
+            if genre.genre_name is None:
+                continue
+            game_genres.append(genre_ids[genre.genre_name])
+            genre_rows[genre_ids[genre.genre_name]].append(row)
+        genre_offsets.append(len(game_genres))
+        if columns['publisher'][row] >= 0:
+            publisher_rows[columns['publisher'][row]].append(row)
+    columns['genre_offsets'], columns['genres'] = genre_offsets, game_genres
+    columns['genre_row_offsets'], columns['genre_rows'] = _postings(genre_rows)
+    columns['publisher_row_offsets'], columns['publisher_rows'] = _postings(publisher_rows)
+
+    blob = bytearray()
+    for field in STRING_FIELDS:
+        offsets = array('Q', [len(blob)])
+        for game in games:
+            value = getattr(game, field)
+            if value is not None:
+                blob += value.encode('utf-8')
+            offsets.append(len(blob))
+        columns[f'{field}_offsets'] = offsets
+
+    header = {
+        'count': len(games),
+        'genres': genre_names,
+        'publishers': publisher_names,
+        'source': source_fingerprint(source_filename) if source_filename is not None else None,
+        'columns': {},
+    }
+    # The column offsets are relative to the end of the header, whose length depends on them.
+    position = 0
+    for name, column in columns.items():
+        header['columns'][name] = [column.typecode, position, len(column)]
+        position = _aligned(position + len(column) * column.itemsize)
+    header['blob'] = [position, len(blob)]
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _aligned(PREAMBLE.size + len(header_bytes))
+
+    filename = Path(filename)
+    temporary_filename = filename.with_name(f"{filename.name}.{os.getpid()}.tmp")
+    with open(temporary_filename, 'wb') as file:
+        file.write(PREAMBLE.pack(MAGIC, STORE_FORMAT, len(header_bytes)))
+        file.write(header_bytes)
+        for name, column in columns.items():
+            file.seek(data_start + header['columns'][name][1])
+            column.tofile(file)
+        file.seek(data_start + position)
+        file.write(blob)
+    os.replace(temporary_filename, filename)
+
+
+def _postings(rows_per_key: list[list[int]]) -> tuple[array, array]:
+    offsets, rows = array('I', [0]), array('I')
+    for key_rows in rows_per_key:
+        rows.extend(key_rows)
+        offsets.append(len(rows))
+    return offsets, rows
+
+
+def _aligned(position: int) -> int:
+    return (position + 7) & ~7
+
+
+def read_store_header(filename):
+    """Return the header of a columnar store file, or None when it is missing or not in STORE_FORMAT."""
+    try:
+        with open(filename, 'rb') as file:
+            magic, store_format, header_length = PREAMBLE.unpack(file.read(PREAMBLE.size))
+            if magic != MAGIC or store_format != STORE_FORMAT:
+                return None
+            return json.loads(file.read(header_length))
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def is_store_current(filename, source_filename) -> bool:
+    header = read_store_header(filename)
+    return header is not None and header['source'] is not None and is_current(header['source'], source_filename)
+
+
+class ColumnarGameStore:
+    """Read-only catalogue on a memory-mapped columnar store file.
+
+    The columns are memoryviews straight onto the mapped file and strings are only decoded when a game is
+    built, so every process that opens the same file shares its pages through the OS page cache. Game
+    objects are built on access and not kept, the genres and publishers are one shared instance each.
+    """
+
+    def __init__(self, filename):
+        header = read_store_header(filename)
+        if header is None:
+            raise ValueError(f"{filename} is not a columnar game store")
+        with open(filename, 'rb') as file:
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.__data = memoryview(self.__mmap)
+        _, _, header_length = PREAMBLE.unpack_from(self.__mmap)
+        data_start = _aligned(PREAMBLE.size + header_length)
+        self.__columns = dict()
+        for name, (typecode, position, length) in header['columns'].items():
+            start = data_start + position
+            self.__columns[name] = self.__data[start:start + length * array(typecode).itemsize].cast(typecode)
+        blob_position, blob_length = header['blob']
+        blob_start = data_start + blob_position
+        self.__blob = self.__data[blob_start:blob_start + blob_length]
+        self.__count = header['count']
+        self.__genres = [Genre(name) for name in header['genres']]
+        self.__publishers = [Publisher(name) for name in header['publishers']]
+        self.__genre_ids = {genre.genre_name: i for i, genre in enumerate(self.__genres)}
+        self.__publisher_ids = {publisher.publisher_name: i for i, publisher in enumerate(self.__publishers)}
+
+    def __len__(self):
+        return self.__count
+
+    @property
+    def genres(self) -> list[Genre]:
+        return self.__genres
+
+    @property
+    def publishers(self) -> list[Publisher]:
+        return self.__publishers
+
+    def row_of(self, game_id: int):
+        """Return the row of the game with this id, or None."""
+        ids = self.__columns['game_id']
+        row = bisect.bisect_left(ids, game_id)
+        if row < self.__count and ids[row] == game_id:
+            return row
+        return None
+
+    def game_id(self, row: int) -> int:
+        return self.__columns['game_id'][row]
+
+    def string(self, field: str, row: int):
+        offsets = self.__columns[f'{field}_offsets']
+        start, end = offsets[row], offsets[row + 1]
+        if start == end:
+            return None
+        return str(self.__blob[start:end], 'utf-8')
+
+    def game(self, row: int) -> Game:
+        """Build the Game in this row."""
+        columns = self.__columns
+        game = Game(columns['game_id'][row], self.string('title', row))
+        price = columns['price'][row]
+        if not math.isnan(price):
+            game.price = price
+        release_date = self.string('release_date', row)
+        if release_date is not None:
+            game.release_date = release_date
+        game.description = self.string('description', row)
+        game.image_url = self.string('image_url', row)
+        game.website_url = self.string('website_url', row)
+        platforms = columns['platforms'][row]
+        game.isWindows = bool(platforms & WINDOWS)
+        game.isMac = bool(platforms & MAC)
+        game.isLinux = bool(platforms & LINUX)
+        publisher = columns['publisher'][row]
+        if publisher >= 0:
+            game.publisher = self.__publishers[publisher]
+        offsets = columns['genre_offsets']
+        for genre in columns['genres'][offsets[row]:offsets[row + 1]]:
+            game.add_genre(self.__genres[genre])
+        return game
+
+    def rows_in_csv_order(self):
+        return self.__columns['csv_order']
+
+    def rows_with_genre(self, genre_name: str):
+        genre = self.__genre_ids.get(genre_name)
+        if genre is None:
+            return []
+        return self.__posting(genre, 'genre')
+
+    def rows_with_publisher(self, publisher_name: str):
+        publisher = self.__publisher_ids.get(publisher_name)
+        if publisher is None:
+            return []
+        return self.__posting(publisher, 'publisher')
+
+    def __posting(self, key: int, kind: str):
+        offsets = self.__columns[f'{kind}_row_offsets']
+        return self.__columns[f'{kind}_rows'][offsets[key]:offsets[key + 1]]
+
+    def games(self, rows=None) -> 'GameSequence':
+        return GameSequence(self, self.rows_in_csv_order() if rows is None else rows)
+
+    def close(self):
+        for column in self.__columns.values():
+            column.release()
+        self.__blob.release()
+        self.__data.release()
+        self.__columns = dict()
+        self.__mmap.close()
+
+
+class GameSequence(Sequence):
+    """The games in some rows of a ColumnarGameStore, each built when it is accessed."""
+
+    def __init__(self, store: ColumnarGameStore, rows):
+        self.__store = store
+        self.__rows = rows
+
+    def __len__(self):
+        return len(self.__rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.__store.game(row) for row in self.__rows[index]]
+        return self.__store.game(self.__rows[index])
@@ -0,0 +1,138 @@
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MAX_OVERFLOW = 10
+DEFAULT_POOL_TIMEOUT = 30.0
+DEFAULT_POOL_RECYCLE = 1800
+
+# Applied to every new SQLite connection. WAL lets readers carry on while a request writes, NORMAL only syncs
+# at checkpoints (safe with WAL), mmap_size is in bytes and a negative cache_size is in KiB.
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+}
+
+
+class PoolStats:
+    """Connection and checkout counters of a pool, including how long checkouts waited for a connection."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__connects = 0
+        self.__checkouts = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+
+    def record_connect(self):
+        with self.__lock:
+            self.__connects += 1
+
+    def record_checkout(self, wait: float):
+        with self.__lock:
+            self.__checkouts += 1
+            self.__total_wait += wait
+            self.__max_wait = max(self.__max_wait, wait)
+
+    def as_dict(self) -> dict:
+        with self.__lock:
+            return {
+                'connections_opened': self.__connects,
+                'checkouts': self.__checkouts,
+                'checkout_wait_total': self.__total_wait,
+                'checkout_wait_max': self.__max_wait,
+                'checkout_wait_average': self.__total_wait / self.__checkouts if self.__checkouts else 0.0,
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that times how long every checkout waits for a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        connection = super()._do_get()
+        self.stats.record_checkout(time.perf_counter() - start)
+        return connection
+
+    def _create_connection(self):
+        self.stats.record_connect()
+        return super()._create_connection()
+
+
+def create_database_engine(config):
+    """Create the engine for the SQL repository from the (Flask) configuration mapping.
+
+    In-memory SQLite databases keep SQLAlchemy's default pool, which holds the single connection the
+    database lives in; every other database gets an InstrumentedQueuePool.
+    """
+    database_uri = config['SQLALCHEMY_DATABASE_URI']
+    url = make_url(database_uri)
+    is_sqlite = url.get_backend_name() == 'sqlite'
+    options = {'echo': bool(config.get('SQLALCHEMY_ECHO', False))}
+    if is_sqlite:
+        # The connections are shared by the threads of the web server
+        options['connect_args'] = {'check_same_thread': False}
+    if not (is_sqlite and url.database in (None, '', ':memory:')):
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=int(config.get('SQLALCHEMY_POOL_SIZE', DEFAULT_POOL_SIZE)),
+            max_overflow=int(config.get('SQLALCHEMY_MAX_OVERFLOW', DEFAULT_MAX_OVERFLOW)),
+            pool_timeout=float(config.get('SQLALCHEMY_POOL_TIMEOUT', DEFAULT_POOL_TIMEOUT)),
+            pool_pre_ping=bool(config.get('SQLALCHEMY_POOL_PRE_PING', True)),
+            pool_recycle=int(config.get('SQLALCHEMY_POOL_RECYCLE', DEFAULT_POOL_RECYCLE)),
+        )
+    engine = create_engine(database_uri, **options)
+    if is_sqlite:
+        apply_sqlite_pragmas(engine, sqlite_pragmas(config))
+    return engine
+
+
+def sqlite_pragmas(config) -> dict:
+    return {
+        'journal_mode': _pragma_setting(config, 'SQLITE_JOURNAL_MODE', 'journal_mode'),
+        'synchronous': _pragma_setting(config, 'SQLITE_SYNCHRONOUS', 'synchronous'),
+        'mmap_size': int(_pragma_setting(config, 'SQLITE_MMAP_SIZE', 'mmap_size')),
+        'cache_size': int(_pragma_setting(config, 'SQLITE_CACHE_SIZE', 'cache_size')),
+    }
+
+
+def _pragma_setting(config, name: str, pragma: str):
+    # Only a missing or empty setting falls back to the default, 0 is a value of its own (mmap_size=0 turns
+    # memory-mapped I/O off)
+    value = config.get(name)
+    return DEFAULT_SQLITE_PRAGMAS[pragma] if value is None or value == '' else value
+
+
+def apply_sqlite_pragmas(engine, pragmas: dict):
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def pool_stats(engine) -> dict:
+    """Connection counts of the engine's pool, with the checkout counters when the pool keeps them."""
+    pool = engine.pool
+    stats = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(pool.stats.as_dict())
+    return stats
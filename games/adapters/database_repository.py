@@ -1,50 +1,158 @@
+import threading
+import time
 from datetime import date
 from typing import List
 
-from sqlalchemy import desc, asc
+from sqlalchemy import desc, asc, and_, exists, func, select, text, Integer, Float
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import scoped_session
+from sqlalchemy.orm import scoped_session, selectinload, joinedload
 
 from games.domainmodel.model import Game, Genre, Publisher, User, Review, Wishlist
-from games.adapters.repository import AbstractRepository, RepositoryException
+from games.adapters.repository import (
+    AbstractRepository, RepositoryException, DEFAULT_BULK_LOAD_BATCH_SIZE, bulk_load_stats,
+    initial_catalogue_version, LOAD_GENRES, LOAD_PUBLISHER, LOAD_REVIEW_USER, LOAD_REVIEW_GAME
+)
+from games.adapters.catalogue_cache import CatalogueCache
+from games.adapters.database_engine import pool_stats
+from games.adapters.orm import (
+    games_table, genres_table, publishers_table, users_table, game_genres_table, game_ratings_table, reviews_table,
+    catalogue_meta_table
+)
+from games.adapters.text_index import TITLE_WEIGHT, fts5_match_expression
+from games.adapters.write_behind import WriteBehindQueue, DEFAULT_WRITE_BEHIND_DELAY
+
+class SessionStats:
+    """How long sessions stayed open and how many objects their identity maps held when they were closed."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__opened = 0
+        self.__closed = 0
+        self.__lifetime_total = 0.0
+        self.__lifetime_max = 0.0
+        self.__objects_total = 0
+        self.__objects_max = 0
+
+    def record_open(self):
+        with self.__lock:
+            self.__opened += 1
+
+    def record_close(self, lifetime: float, objects: int):
+        with self.__lock:
+            self.__closed += 1
+            self.__lifetime_total += lifetime
+            self.__lifetime_max = max(self.__lifetime_max, lifetime)
+            self.__objects_total += objects
+            self.__objects_max = max(self.__objects_max, objects)
+
+    def as_dict(self) -> dict:
+        with self.__lock:
+            return {
+                'sessions_opened': self.__opened,
+                'sessions_closed': self.__closed,
+                'sessions_open': self.__opened - self.__closed,
+                'session_lifetime_average': self.__lifetime_total / self.__closed if self.__closed else 0.0,
+                'session_lifetime_max': self.__lifetime_max,
+                'objects_held_average': self.__objects_total / self.__closed if self.__closed else 0.0,
+                'objects_held_max': self.__objects_max,
+            }
+
 
 class SessionContextManager:
     def __init__(self, session_factory):
         self.__session_factory = session_factory
-        self.__session = scoped_session(self.__session_factory)
+        self.stats = SessionStats()
+        # One registry for the lifetime of the repository, holding a session per thread. The session is only
+        # opened when a repository method first uses it.
+        self.__session = scoped_session(self.__open_session)
+        self.__unit_of_work = threading.local()
 
     def __enter__(self):
         return self
 
-    def __exit__(self, *args):
-        self.rollback()
+    def __exit__(self, exc_type, *args):
+        # Inside a unit of work the changes are only flushed, they wait for its commit. A write that failed
+        # with a RepositoryException has already undone itself in its savepoint, the rest of the unit of work
+        # is left alone.
+        if not self.in_unit_of_work or (exc_type is not None and not issubclass(exc_type, RepositoryException)):
+            self.rollback()
 
     @property
     def session(self):
         return self.__session
 
+    @property
+    def in_unit_of_work(self) -> bool:
+        return getattr(self.__unit_of_work, 'active', False)
+
+    def begin_unit_of_work(self):
+        self.__unit_of_work.active = True
+
+    def end_unit_of_work(self):
+        """Commit everything the unit of work changed, in one transaction."""
+        self.__unit_of_work.active = False
+        if self.__session.registry.has():
+            self.__session.commit()
+
     def commit(self):
-        self.__session.commit()
+        if self.in_unit_of_work:
+            self.__session.flush()
+        else:
+            self.__session.commit()
 
     def rollback(self):
         self.__session.rollback()
 
+    def begin_savepoint(self):
+        """Begin a savepoint, so that a failing write can be undone without the rest of the transaction. The
+        changes made so far are flushed before it."""
+        session = self.__session()
+        session.flush()
+        connection = session.connection()
+        # pysqlite only begins a transaction at the first INSERT, UPDATE or DELETE. A SAVEPOINT before that
+        # would start a transaction of its own, which releasing the savepoint would commit.
+        if connection.dialect.name == 'sqlite' and not connection.connection.dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN")
+        return session.begin_nested()
+
+    def __open_session(self):
+        session = self.__session_factory()
+        session.info['opened_at'] = time.perf_counter()
+        self.stats.record_open()
+        return session
+
     def reset_session(self):
         # this method can be used e.g. to allow Flask to start a new session for each http request,
         # via the 'before_request' callback
         self.close_current_session()
-        self.__session = scoped_session(self.__session_factory)
 
     def close_current_session(self):
-        if not self.__session is None:
-            self.__session.close()
+        # Closes the session of the calling thread only, along with its identity map, so that nothing loaded
+        # by one request is kept alive for the next one. Changes of an unfinished unit of work are rolled back.
+        self.__unit_of_work.active = False
+        if not self.__session.registry.has():
+            return
+        session = self.__session()
+        self.stats.record_close(time.perf_counter() - session.info.get('opened_at', time.perf_counter()),
+                                len(session.identity_map))
+        self.__session.remove()
 
 
 class SqlAlchemyRepository(AbstractRepository):
 
-    def __init__(self, session_factory):
+    def __init__(self, session_factory, catalogue_cache: CatalogueCache = None, review_batch_size: int = 0,
+                 review_batch_delay: float = DEFAULT_WRITE_BEHIND_DELAY):
         self._session_cm = SessionContextManager(session_factory)
+        self._session_factory = session_factory
+        # Catalogue reads go through the cache, pass CatalogueCache(max_entries=0) to turn it off.
+        self._catalogue_cache = catalogue_cache if catalogue_cache is not None else CatalogueCache()
+        # With a review_batch_size, add_review queues reviews and a background thread inserts them in batches
+        # of up to that many. They show up on the game's page once their batch is written.
+        self._review_queue = None
+        if review_batch_size > 0:
+            self._review_queue = WriteBehindQueue(self._insert_reviews, review_batch_size, review_batch_delay)
 
     def close_session(self):
         self._session_cm.close_current_session()
@@ -52,76 +160,371 @@ class SqlAlchemyRepository(AbstractRepository):
     def reset_session(self):
         self._session_cm.reset_session()
 
+    def dispose_inherited_connections(self):
+        # A process forked from the one that created the engine must not use the parent's pooled connections,
+        # it opens its own.
+        self._session_factory.kw['bind'].dispose(close=False)
+
+    def begin_unit_of_work(self):
+        # From here on until commit_unit_of_work() the calling thread's changes are flushed, not committed,
+        # e.g. from Flask's 'before_request' to its 'after_request' callback.
+        self._session_cm.begin_unit_of_work()
+
+    def commit_unit_of_work(self):
+        self._session_cm.end_unit_of_work()
+
+    def catalogue_cache_stats(self) -> dict:
+        return self._catalogue_cache.stats()
+
+    def pool_stats(self) -> dict:
+        return pool_stats(self._session_factory.kw['bind'])
+
+    def session_stats(self) -> dict:
+        return self._session_cm.stats.as_dict()
+
+    def review_queue_stats(self) -> dict:
+        """Batches and reviews written behind, and the failed batches and lost reviews; empty without a queue."""
+        return self._review_queue.stats() if self._review_queue is not None else {}
+
+    def _load_catalogue(self, load):
+        # Cached objects are loaded in a session of their own, which is closed again right away, so they are
+        # detached and never tied to the session of the request that happened to load them.
+        session = self._session_factory()
+        try:
+            return load(session)
+        finally:
+            session.close()
+
+
+    def bulk_load(self, games, genres: list[Genre], publishers: list[Publisher], users: list[User],
+                  batch_size: int = DEFAULT_BULK_LOAD_BATCH_SIZE) -> dict:
+        # One transaction of executemany Core inserts instead of a merge() and commit() per object. Games are
+        # consumed as they come and written every batch_size rows, so a streamed input is never held in full.
+        start = time.perf_counter()
+        tables = (publishers_table, genres_table, games_table, game_genres_table, users_table)
+        pending = {table: [] for table in tables}
+        seen_publishers = set()
+        seen_genres = set()
+        seen_game_ids = set()
+        rows = 0
+
+        with self._session_cm as scm:
+            def queue(table, row):
+                nonlocal rows
+                pending[table].append(row)
+                rows += 1
+                if len(pending[table]) >= batch_size:
+                    flush()
+
+            def flush():
+                # Parents before children, so every batch is consistent on its own.
+                for table in tables:
+                    if pending[table]:
+                        scm.session.execute(table.insert(), pending[table])
+                        pending[table] = []
+
+            def queue_publisher(publisher: Publisher):
+                if publisher is not None and publisher.publisher_name is not None \
+                        and publisher.publisher_name not in seen_publishers:
+                    seen_publishers.add(publisher.publisher_name)
+                    queue(publishers_table, {'name': publisher.publisher_name})
+
+            def queue_genre(genre: Genre):
+                if genre.genre_name is not None and genre.genre_name not in seen_genres:
+                    seen_genres.add(genre.genre_name)
+                    queue(genres_table, {'genre_name': genre.genre_name})
+
+            for publisher in publishers:
+                queue_publisher(publisher)
+            for genre in genres:
+                queue_genre(genre)
+            for game in games:
+                if game.game_id in seen_game_ids:
+                    continue
+                seen_game_ids.add(game.game_id)
+                queue_publisher(game.publisher)
+                for genre in game.genres:
+                    queue_genre(genre)
+                queue(games_table, {
+                    'game_id': game.game_id,
+                    'game_title': game.title,
+                    'game_price': game.price,
+                    'release_date': game.release_date,
+                    'game_description': game.description,
+                    'game_image_url': game.image_url,
+                    'game_website_url': game.website_url,
+                    'publisher_name': game.publisher.publisher_name if game.publisher is not None else None
+                })
+                for genre in game.genres:
+                    if genre.genre_name is not None:
+                        queue(game_genres_table, {'game_id': game.game_id, 'genre_name': genre.genre_name})
+            for user in users:
+                queue(users_table, {'username': user.username, 'password': user.password})
+            flush()
+            self._raise_catalogue_version(scm.session)
+            scm.commit()
+        self._catalogue_cache.invalidate()
 
+        return bulk_load_stats(rows, start)
 
     # Game Related Methods
     def add_game(self, game: Game):
         with self._session_cm as scm:
             scm.session.merge(game)
+            self._raise_catalogue_version(scm.session)
             scm.commit()
+        # Merging the game may add its genres and publisher as well
+        self._catalogue_cache.invalidate(('game', game.game_id), 'games', 'genres', 'publishers', 'version')
+
+    def catalogue_version(self) -> int:
+        # Read from the database through the catalogue cache, like the games it versions: writes through this
+        # repository are seen at once, those of other processes once the cached version expires.
+        version = self._catalogue_cache.get('version', lambda: self._load_catalogue(
+            lambda session: session.execute(select(catalogue_meta_table.c.version)).scalar()))
+        return version if version is not None else 0
+
+    @staticmethod
+    def _raise_catalogue_version(session):
+        # Runs inside the transaction of the catalogue write, so the version never changes without the catalogue
+        session.execute(
+            sqlite_insert(catalogue_meta_table)
+            .values(id=1, version=initial_catalogue_version())
+            .on_conflict_do_update(index_elements=[catalogue_meta_table.c.id],
+                                   set_={'version': catalogue_meta_table.c.version + 1}))
 
     def getAllGames(self) -> list[Game]:
-        games = self._session_cm.session.query(Game).order_by(Game._Game__game_id).all()
-        return games
+        # The games are shared, detached instances with their genres and publisher loaded, for display only.
+        games = self._catalogue_cache.get('games', lambda: self._load_catalogue(
+            lambda session: session.query(Game)
+            .options(selectinload(Game._Game__genres), joinedload(Game._Game__publisher))
+            .order_by(Game._Game__game_id).all()))
+        return list(games)
 
     def getGameById(self, game_id: int):
-        game = None
-        try:
-            game = self._session_cm.session.query(
-                Game).filter(Game._Game__game_id == game_id).one()
-        except NoResultFound:
+        game = self._catalogue_cache.get(('game', game_id), lambda: self._load_catalogue(
+            lambda session: session.query(Game)
+            .options(selectinload(Game._Game__genres), joinedload(Game._Game__publisher))
+            .filter(Game._Game__game_id == game_id).one_or_none()))
+        if game is None:
             print(f'Game {game_id} was not found')
+            return None
+        # The game goes into reviews and wishlists, so it is handed out as an instance of the request's session.
+        # merge(load=False) copies the cached state in without querying the database.
+        return self._session_cm.session.merge(game, load=False)
 
-        return game
-
-    def getGamesByGenres(self, genres: list[Genre]) -> list[Game]:  # Similar to get_articles_by_date in COVID app??
-        games = set()
+    def getGamesByGenres(self, genres: list[Genre], load_plan=None) -> list[Game]:  # Similar to get_articles_by_date in COVID app??
         if genres is None or len(genres) == 0 or genres[0] == '':
             return self.getAllGames()
-        for game in self.getAllGames():
-            for genre in genres:
-                if genre in game.genres:
-                    games.add(game)
-        return list(games)
+        genre_names = [genre.genre_name for genre in genres]
+        games = self._session_cm.session.query(Game) \
+            .options(*self._game_load_options(load_plan)) \
+            .join(game_genres_table, game_genres_table.c.game_id == Game._Game__game_id) \
+            .filter(game_genres_table.c.genre_name.in_(genre_names)) \
+            .distinct() \
+            .order_by(Game._Game__game_id) \
+            .all()
+        return games
+
+    def search_games(self, title: str = None, genres: list[Genre] = None, genre_terms: list[str] = None,
+                     publisher: str = None, min_rating: float = None, sort_by_rating: bool = False,
+                     text: str = None, offset: int = 0, limit: int = None,
+                     load_plan=None) -> tuple[list[Game], int]:
+        query = self._session_cm.session.query(Game)
+        fts_matches = None
+        if text:
+            match = fts5_match_expression(text)
+            if match is None:
+                return [], 0
+            fts_matches = self._fts_matches(match)
+            query = query.join(fts_matches, fts_matches.c.game_id == Game._Game__game_id)
+        if genres:
+            query = query.filter(self._has_genre(game_genres_table.c.genre_name.in_(
+                [genre.genre_name for genre in genres])))
+        for term in genre_terms or []:
+            query = query.filter(self._has_genre(func.lower(game_genres_table.c.genre_name) == term.lower()))
+        if publisher:
+            query = query.filter(func.lower(games_table.c.publisher_name).contains(publisher.lower(), autoescape=True))
+        if title:
+            query = query.filter(func.lower(Game._Game__game_title).contains(title.lower(), autoescape=True))
+        if min_rating is not None or sort_by_rating:
+            query = query.outerjoin(game_ratings_table, game_ratings_table.c.game_id == Game._Game__game_id)
+        if min_rating is not None:
+            query = query.filter(game_ratings_table.c.review_count > 0,
+                                 game_ratings_table.c.rating_total >= min_rating * game_ratings_table.c.review_count)
+
+        total = query.count()
+
+        if sort_by_rating:
+            average_rating = game_ratings_table.c.rating_total * 1.0 / game_ratings_table.c.review_count
+            query = query.order_by(func.coalesce(average_rating, -1).desc(), Game._Game__game_id)
+        elif fts_matches is not None:
+            query = query.order_by(fts_matches.c.rank, Game._Game__game_id)
+        else:
+            query = query.order_by(Game._Game__game_id)
+        query = query.options(*self._game_load_options(load_plan)).offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all(), total
+
+    @staticmethod
+    def _game_load_options(load_plan, games=None) -> list:
+        # games is the relationship path to the games when they are not the queried entity, e.g. a wishlist's
+        load_plan = load_plan or ()
+        options = []
+        if LOAD_GENRES in load_plan:
+            options.append(games.selectinload(Game._Game__genres) if games is not None
+                           else selectinload(Game._Game__genres))
+        if LOAD_PUBLISHER in load_plan:
+            options.append(games.joinedload(Game._Game__publisher) if games is not None
+                           else joinedload(Game._Game__publisher))
+        return options
+
+    @staticmethod
+    def _fts_matches(match: str):
+        # bm25() is lower for better matches, title hits are weighted the same way as in the memory index
+        return text(f"SELECT rowid AS game_id, bm25(games_fts, {TITLE_WEIGHT}, 1.0) AS rank "
+                    "FROM games_fts WHERE games_fts MATCH :match") \
+            .bindparams(match=match) \
+            .columns(game_id=Integer, rank=Float) \
+            .subquery('fts_matches')
+
+    @staticmethod
+    def _has_genre(criterion):
+        return exists().where(and_(game_genres_table.c.game_id == Game._Game__game_id, criterion))
 
     # Genre Related Methods
     def add_genre(self, genre: Genre):
         with self._session_cm as scm:
             scm.session.merge(genre)
+            self._raise_catalogue_version(scm.session)
             scm.commit()
+        self._catalogue_cache.invalidate('genres', 'version')
 
     def getAllGenres(self) -> list[Genre]:
-        genres = self._session_cm.session.query(Genre).all()
-        return genres
+        genres = self._catalogue_cache.get('genres', lambda: self._load_catalogue(
+            lambda session: session.query(Genre).all()))
+        return list(genres)
 
     # Publisher Related Methods
     def add_publisher(self, publisher: Publisher):
         with self._session_cm as scm:
             scm.session.merge(publisher)
+            self._raise_catalogue_version(scm.session)
             scm.commit()
+        self._catalogue_cache.invalidate('publishers', 'version')
 
     def getAllPublishers(self) -> list[Publisher]:
-        publishers = self._session_cm.session.query(Publisher).all()
-        return publishers
+        publishers = self._catalogue_cache.get('publishers', lambda: self._load_catalogue(
+            lambda session: session.query(Publisher).all()))
+        return list(publishers)
 
     # Review Related Methods
     def add_review(self, review: Review):
+        if self._review_queue is not None:
+            self._review_queue.submit((review.game.game_id, review.user.username, review.rating, review.comment))
+            return
+        with self._session_cm as scm:
+            savepoint = scm.begin_savepoint()
+            try:
+                with savepoint:
+                    scm.session.merge(review)
+                    self._add_to_rating_summary(scm.session, review.game.game_id, review.rating)
+            except SQLAlchemyError as e:
+                raise RepositoryException(f"Could not add the review: {e}") from e
+            scm.commit()
+
+    def flush_reviews(self):
+        """Wait until the queued reviews have been written."""
+        if self._review_queue is not None:
+            self._review_queue.flush()
+
+    def _insert_reviews(self, rows: list[tuple]):
+        # Writes a batch of queued reviews in one transaction of its own, away from any request's session
+        session = self._session_factory()
         try:
-            with self._session_cm as scm:
-                scm.session.merge(review)
-                scm.commit()
-        except SQLAlchemyError as e:
-            print("Error occurred:", e)
-            scm.rollback()
+            session.execute(reviews_table.insert(), [
+                {'game_id': game_id, 'username': username, 'rating': rating, 'comment': comment}
+                for game_id, username, rating, comment in rows
+            ])
+            summaries = {}
+            for game_id, _, rating, _ in rows:
+                review_count, rating_total = summaries.get(game_id, (0, 0))
+                summaries[game_id] = (review_count + 1, rating_total + rating)
+            for game_id, (review_count, rating_total) in summaries.items():
+                self._add_to_rating_summary(session, game_id, rating_total, review_count)
+            session.commit()
+        except SQLAlchemyError:
+            # The queue tries the batch again
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    @staticmethod
+    def _add_to_rating_summary(session, game_id: int, rating_total: int, review_count: int = 1):
+        # Runs inside the transaction that adds the reviews so the summary can never drift from the reviews table.
+        # One upsert, so that two first reviews of a game never both try to insert its row.
+        session.execute(
+            sqlite_insert(game_ratings_table)
+            .values(game_id=game_id, review_count=review_count, rating_total=rating_total)
+            .on_conflict_do_update(index_elements=[game_ratings_table.c.game_id],
+                                   set_={'review_count': game_ratings_table.c.review_count + review_count,
+                                         'rating_total': game_ratings_table.c.rating_total + rating_total}))
 
     def getAllReviews(self) -> list[Review]:
         reviews = self._session_cm.session.query(Review).all()
         return reviews
 
+    def get_reviews_for_game(self, game_id: int, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        return self._query_reviews_newest_first(reviews_table.c.game_id == game_id, offset, limit, load_plan)
+
+    def count_reviews_for_game(self, game_id: int) -> int:
+        return self.get_rating_summary(game_id)[0]
+
+    def get_reviews_for_user(self, username: str, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        return self._query_reviews_newest_first(reviews_table.c.username == username, offset, limit, load_plan)
+
+    def count_reviews_for_user(self, username: str) -> int:
+        return self._session_cm.session.query(Review).filter(reviews_table.c.username == username).count()
+
+    def get_rating_summary(self, game_id: int) -> tuple[int, int]:
+        row = self._session_cm.session.execute(
+            game_ratings_table.select().where(game_ratings_table.c.game_id == game_id)).fetchone()
+        if row is None:
+            return 0, 0
+        return row.review_count, row.rating_total
+
+    def get_rating_summaries(self) -> dict[int, tuple[int, int]]:
+        rows = self._session_cm.session.execute(game_ratings_table.select())
+        return {row.game_id: (row.review_count, row.rating_total) for row in rows}
+
+    def _query_reviews_newest_first(self, criterion, offset: int, limit: int, load_plan=None) -> list[Review]:
+        load_plan = load_plan or ()
+        options = []
+        if LOAD_REVIEW_USER in load_plan:
+            options.append(joinedload(Review._Review__user))
+        if LOAD_REVIEW_GAME in load_plan:
+            options.append(joinedload(Review._Review__game))
+        query = self._session_cm.session.query(Review) \
+            .options(*options) \
+            .filter(criterion) \
+            .order_by(reviews_table.c.review_id.desc()) \
+            .offset(offset)
+        if limit is not None:
+            query = query.limit(limit)
+        return query.all()
+
     # Wishlist Related Methods
-    def get_wishlist(self, user: User):
+    def get_wishlist(self, user: User, load_plan=None):
+        options = []
+        if load_plan:
+            games = selectinload(Wishlist._Wishlist__list_of_games)
+            options = [games, *self._game_load_options(load_plan, games)]
         try:
-            wishlist = self._session_cm.session.query(Wishlist).filter(Wishlist._Wishlist__user == user).one()
+            wishlist = self._session_cm.session.query(Wishlist).options(*options) \
+                .filter(Wishlist._Wishlist__user == user).one()
         except NoResultFound:
             return None
         return wishlist
@@ -129,19 +532,27 @@ class SqlAlchemyRepository(AbstractRepository):
     def add_wishlist(self, user: User, wishlist: Wishlist):
         # wishlist.user = user
         self._session_cm.session.add(wishlist)
-        self._session_cm.session.commit()
+        self._session_cm.commit()
 
     def update_wishlist(self, user: User, wishlist: Wishlist):
         existing_wishlist = self.get_wishlist(user)
         if existing_wishlist is not None:
             existing_wishlist.games = wishlist.list_of_games()
-            self._session_cm.session.commit()
+            self._session_cm.commit()
+
+    def add_game_to_wishlist(self, user: User, game: Game):
+        wishlist = self.get_wishlist(user)
+        if wishlist is None:
+            wishlist = Wishlist(user)
+            self._session_cm.session.add(wishlist)
+        wishlist.add_game(game)
+        self._session_cm.commit()
 
     def remove_game_from_wishlist(self, user: User, game: Game):
         wishlist = self.get_wishlist(user)
-        if game in wishlist.list_of_games():
+        if wishlist is not None and game in wishlist.list_of_games():
             wishlist.remove_game(game)
-            self._session_cm.session.commit()
+            self._session_cm.commit()
 
     # User Related Methods
     def addUser(self, user: User):
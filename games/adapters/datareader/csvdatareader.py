@@ -1,12 +1,51 @@
 import csv
+import io
 import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 from pathlib import Path
 from games.domainmodel.model import Genre, Game, Publisher, User
-from werkzeug.security import generate_password_hash
+from games.adapters import password_hashing
+from games.adapters.password_hashing import PasswordHashCache, hash_passwords, is_password_hash
 from games.adapters.repository import AbstractRepository, RepositoryException
 
+class CatalogueFlyweights:
+    """One shared Genre and Publisher instance per name, with the names interned, for the games of a catalogue."""
+
+    def __init__(self):
+        self.__genres = dict()
+        self.__publishers = dict()
+
+    def genre(self, genre_name: str) -> Genre:
+        genre = self.__genres.get(genre_name)
+        if genre is None:
+            genre = self.__genres[genre_name] = Genre(sys.intern(genre_name.strip()))
+        return genre
+
+    def publisher(self, publisher_name: str) -> Publisher:
+        publisher = self.__publishers.get(publisher_name)
+        if publisher is None:
+            publisher = self.__publishers[publisher_name] = Publisher(sys.intern(publisher_name.strip()))
+        return publisher
+
+    def share(self, game: Game) -> Game:
+        """Swap the genres and publisher of a game parsed elsewhere (e.g. in a worker process) for the shared ones."""
+        if game.publisher is not None and game.publisher.publisher_name is not None:
+            game.publisher = self.publisher(game.publisher.publisher_name)
+        genres = game.genres
+        for i, genre in enumerate(genres):
+            if genre.genre_name is not None:
+                genres[i] = self.genre(genre.genre_name)
+        return game
+
+
 class GameFileCSVReader:
+    # Only these columns of the Steam CSV are mapped onto the domain model.
+    COLUMNS = ["AppID", "Name", "Release date", "Price", "About the game", "Header image",
+               "Windows", "Mac", "Linux", "Publishers", "Genres"]
+
     def __init__(self, filename):
         self.__filename = filename
         self.__dataset_of_games = []
@@ -14,41 +53,77 @@ class GameFileCSVReader:
         self.__dataset_of_genres = set()
 
     def read_csv_file(self):
+        for game in self.iter_games():
+            self.__dataset_of_games.append(game)
+            self.__dataset_of_publishers.add(game.publisher)
+            self.__dataset_of_genres.update(game.genres)
+
+    def iter_games(self):
+        """Yield the games of the file one at a time as its rows are read, without keeping them."""
         if not os.path.exists(self.__filename):
             print(f"path {self.__filename} does not exist!")
             return
         with open(self.__filename, 'r', encoding='utf-8-sig') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                try:
-                    game_id = int(row["AppID"])
-                    title = row["Name"]
-                    game = Game(game_id, title)
-                    game.release_date = row["Release date"]
-                    game.price = float(row["Price"])
-                    game.description = row["About the game"]
-                    game.image_url = row["Header image"]
-
-                    game.isWindows = row["Windows"] == "TRUE"
-                    game.isMac = row["Mac"] == "TRUE"
-                    game.isLinux = row["Linux"] == "TRUE"
-
-                    publisher = Publisher(row["Publishers"])
-                    self.__dataset_of_publishers.add(publisher)
-                    game.publisher = publisher
-
-                    genre_names = row["Genres"].split(",")
-                    for genre_name in genre_names:
-                        genre = Genre(genre_name.strip())
-                        self.__dataset_of_genres.add(genre)
-                        game.add_genre(genre)
-
-                    self.__dataset_of_games.append(game)
-
-                except ValueError as e:
-                    print(f"Skipping row due to invalid data: {e}")
-                except KeyError as e:
-                    print(f"Skipping row due to missing key: {e}")
+            reader = csv.reader(file)
+            positions = self.column_positions(next(reader, []))
+            if positions is None:
+                return
+            yield from self.parse_rows(reader, positions)
+
+    @classmethod
+    def column_positions(cls, header: list):
+        """Return where the COLUMNS are in a header row, or None if any of them is missing."""
+        missing = [column for column in cls.COLUMNS if column not in header]
+        if missing:
+            print(f"Skipping file due to missing key: {missing}")
+            return None
+        return [header.index(column) for column in cls.COLUMNS]
+
+    @classmethod
+    def parse_rows(cls, rows, positions: list, flyweights: CatalogueFlyweights = None):
+        flyweights = flyweights if flyweights is not None else CatalogueFlyweights()
+        for row in rows:
+            try:
+                yield cls.parse_row([row[position] for position in positions], flyweights)
+            except ValueError as e:
+                print(f"Skipping row due to invalid data: {e}")
+            except IndexError as e:
+                print(f"Skipping row due to missing key: {e}")
+
+    def iter_game_batches(self, batch_size: int):
+        """Yield the games of the file in lists of at most batch_size games."""
+        batch = []
+        for game in self.iter_games():
+            batch.append(game)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def parse_row(values: list, flyweights: CatalogueFlyweights = None) -> Game:
+        """Build a Game from the values of the COLUMNS of one row, in COLUMNS order. Genres and publishers
+        come from flyweights when given, so that games share them."""
+        (app_id, name, release_date, price, description, image_url,
+         windows, mac, linux, publisher_name, genre_names) = values
+        game = Game(int(app_id), name)
+        game.release_date = release_date
+        game.price = float(price)
+        game.description = description
+        game.image_url = image_url
+
+        game.isWindows = windows == "TRUE"
+        game.isMac = mac == "TRUE"
+        game.isLinux = linux == "TRUE"
+
+        if flyweights is None:
+            flyweights = CatalogueFlyweights()
+        game.publisher = flyweights.publisher(publisher_name)
+
+        for genre_name in genre_names.split(","):
+            game.add_genre(flyweights.genre(genre_name.strip()))
+        return game
 
     def get_unique_games_count(self):
         return len(self.__dataset_of_games)
@@ -72,31 +147,125 @@ class GameFileCSVReader:
         return self.__dataset_of_genres
 
 
+def _parse_game_chunk(filename: str, start: int, end: int, positions: list) -> list:
+    # Runs in a worker process. Chunks always end on a newline outside quotes, so each one is valid CSV.
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        text = file.read(end - start).decode('utf-8')
+    return list(GameFileCSVReader.parse_rows(csv.reader(io.StringIO(text, newline=None)), positions))
+
+
+class ParallelGameFileCSVReader(GameFileCSVReader):
+    """GameFileCSVReader that splits the file into chunks on record boundaries and parses the chunks in a
+    process pool. Games come out in file order, so the result is the same as with GameFileCSVReader."""
+
+    def __init__(self, filename, workers: int = None, chunk_size: int = 4 * 1024 * 1024):
+        super().__init__(filename)
+        self.__filename = filename
+        self.__workers = workers if workers is not None else os.cpu_count()
+        self.__chunk_size = chunk_size
+
+    def iter_games(self):
+        if self.__workers <= 1:
+            yield from super().iter_games()
+            return
+        if not os.path.exists(self.__filename):
+            print(f"path {self.__filename} does not exist!")
+            return
+        with open(self.__filename, 'rb') as file:
+            header_line = file.readline()
+        positions = self.column_positions(next(csv.reader([header_line.decode('utf-8-sig')]), []))
+        if positions is None:
+            return
+        chunks = self.record_chunks(self.__filename, len(header_line), self.__chunk_size)
+        # Every chunk comes back with its own genre and publisher instances, they are shared again here.
+        flyweights = CatalogueFlyweights()
+        with ProcessPoolExecutor(max_workers=self.__workers) as executor:
+            for games in executor.map(_parse_game_chunk, repeat(self.__filename), [start for start, _ in chunks],
+                                      [end for _, end in chunks], repeat(positions)):
+                for game in games:
+                    yield flyweights.share(game)
+
+    @staticmethod
+    def record_chunks(filename: str, start: int, chunk_size: int) -> list:
+        """Split the file from start into (start, end) byte ranges of roughly chunk_size bytes, each ending
+        just after a newline that is not inside a quoted field (the "About the game" text spans lines)."""
+        boundaries = [start]
+        position = start
+        in_quotes = False
+        target = start + chunk_size
+        with open(filename, 'rb') as file:
+            file.seek(start)
+            while True:
+                block = file.read(1024 * 1024)
+                if not block:
+                    break
+                # Quote parity is known up to block[counted]; a doubled "" escape flips it twice.
+                counted = 0
+                while position + len(block) > target:
+                    newline = block.find(b'\n', max(target - position, counted))
+                    if newline == -1:
+                        break
+                    in_quotes ^= block.count(b'"', counted, newline) % 2 == 1
+                    counted = newline
+                    target = position + newline + 1
+                    if not in_quotes:
+                        boundaries.append(target)
+                        target += chunk_size
+                in_quotes ^= block.count(b'"', counted) % 2 == 1
+                position += len(block)
+        if boundaries[-1] < position:
+            boundaries.append(position)
+        return list(zip(boundaries, boundaries[1:]))
+
+
 class UserFileCSVReader:
-    def __init__(self, filename):
+    def __init__(self, filename, hash_cache_filename=None, workers: int = 1):
         self.__filename = filename
+        self.__hash_cache_filename = hash_cache_filename
+        self.__workers = workers
         self.__dataset_of_users = []
 
     def read_csv_file(self):
         if not os.path.exists(self.__filename):
             print(f"path {self.__filename} does not exist!")
             return
+        # Passwords are taken as they are when already hashed (a password_hash column, or a hash in the
+        # password column), then from the hash cache, and only the rest is hashed, all in one go.
+        cache = PasswordHashCache(self.__hash_cache_filename)
+        method = password_hashing.password_hash_method
+        rows = []
+        to_hash = []
         with open(self.__filename, 'r', encoding='utf-8-sig') as file:
             reader = csv.DictReader(file)
             for row in reader:
                 try:
                     username = row["username"]
-                    password = generate_password_hash(row["password"])
+                    password_hash = row.get("password_hash") or None
+                    if password_hash is None and is_password_hash(row["password"]):
+                        password_hash = row["password"]
+                    if password_hash is None:
+                        key = PasswordHashCache.key(username, row["password"], method)
+                        password_hash = cache.get(key)
+                        if password_hash is None:
+                            to_hash.append((len(rows), key, row["password"]))
+                    rows.append([username, password_hash])
 
-                    user = User(username, password)
-
-                    self.__dataset_of_users.append(user)
-
-                except ValueError as e:
-                    print(f"Skipping row due to invalid data: {e}")
                 except KeyError as e:
                     print(f"Skipping row due to missing key: {e}")
 
+        hashes = hash_passwords([password for _, _, password in to_hash], self.__workers, method)
+        for (position, key, _), password_hash in zip(to_hash, hashes):
+            rows[position][1] = password_hash
+            cache.put(key, password_hash)
+        cache.save()
+
+        for username, password_hash in rows:
+            try:
+                self.__dataset_of_users.append(User(username, password_hash))
+            except ValueError as e:
+                print(f"Skipping row due to invalid data: {e}")
+
     def get_unique_users_count(self):
         return len(self.__dataset_of_users)
 
@@ -104,21 +273,23 @@ class UserFileCSVReader:
     def dataset_of_users(self) -> list:
         return self.__dataset_of_users
 
-def load_gamedata(data_path: Path, repo: AbstractRepository):
-    data_path = str(Path(data_path) / "games.csv")
-    reader = GameFileCSVReader(data_path)
+def stream_gamedata(data_path: Path, workers: int = 1):
+    filename = str(Path(data_path) / "games.csv")
+    if workers > 1:
+        return ParallelGameFileCSVReader(filename, workers).iter_games()
+    return GameFileCSVReader(filename).iter_games()
+
+
+def read_users(data_path: Path, hash_cache_filename=None, workers: int = 1) -> UserFileCSVReader:
+    reader = UserFileCSVReader(str(Path(data_path) / "users.csv"), hash_cache_filename, workers)
     reader.read_csv_file()
-    for game in reader.dataset_of_games:
-        repo.add_game(game)
-    for genre in reader.dataset_of_genres:
-        repo.add_genre(genre)
-    for publisher in reader.dataset_of_publishers:
-        repo.add_publisher(publisher)
+    return reader
+
+
+def load_gamedata(data_path: Path, repo: AbstractRepository):
+    return repo.bulk_load(stream_gamedata(data_path), [], [], [])
 
 
 def load_users(data_path: Path, repo: AbstractRepository):
-    users_filename = str(Path(data_path) / "users.csv")
-    reader = UserFileCSVReader(users_filename)
-    reader.read_csv_file()
-    for user in reader.dataset_of_users:
-        repo.addUser(user)
+    reader = read_users(data_path)
+    return repo.bulk_load([], [], [], reader.dataset_of_users)
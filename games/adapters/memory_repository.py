@@ -1,101 +1,351 @@
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
 
 import random
 
 from werkzeug.security import generate_password_hash
 
-from games.adapters.repository import AbstractRepository, RepositoryException
+from games.adapters.catalogue import Catalogue
+from games.adapters.datareader.csvdatareader import stream_gamedata
+from games.adapters.repository import AbstractRepository, RepositoryException, initial_catalogue_version
 from games.domainmodel.model import Genre, Game, Publisher, Review, User, Wishlist
 
+# Games added to a reloaded catalogue between two chances for other threads to run
+RELOAD_YIELD_EVERY = 200
+
+
+class StripedLock:
+    """A fixed number of locks shared by any number of keys, so that writes to different keys rarely wait for
+    each other without keeping a lock per key."""
+
+    def __init__(self, stripes: int = 64):
+        self.__locks = [threading.Lock() for _ in range(stripes)]
+
+    def for_key(self, key) -> threading.Lock:
+        return self.__locks[hash(key) % len(self.__locks)]
+
+    @contextmanager
+    def all_keys(self):
+        """Hold every stripe, for the rare change that spans all keys. Always taken in the same order."""
+        for lock in self.__locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self.__locks):
+                lock.release()
+
+
 class MemoryRepository(AbstractRepository):
+    """Repository keeping everything in memory, safe to use from many threads.
+
+    The catalogue is an immutable Catalogue that reads use without locking; catalogue writes go to a copy
+    that replaces it. Reviews, wishlists and users are written under striped locks keyed by game or user.
+    """
+
     def __init__(self):
+        self.__catalogue = Catalogue()
+        # Versions key page ETags, which browsers keep across restarts of the app
+        self.__catalogue.version = initial_catalogue_version()
+        self.__pending_catalogue = None
+        self.__catalogue_lock = threading.Lock()
+        # Catalogue writes made while a reload builds its catalogue from games.csv, applied again to that one
+        self.__reload_writes = None
+        self.__reload_lock = threading.Lock()
+        # Reads of the user data are single lookups, slices or copies, which the writers below never leave
+        # half done. The review indexes are only appended to.
         self.__reviews = list()
-        self.__games = list()
-        self.__genres = list()
-        self.__publishers = list()
+        self.__review_keys = set()
+        self.__reviews_by_game = dict()
+        self.__reviews_by_user = dict()
+        self.__rating_summaries = dict()
+        self.__review_locks = StripedLock()
         self.__wishlists = dict()
+        self.__wishlist_locks = StripedLock()
         self.__users = list()
+        self.__users_by_username = dict()
+        self.__users_lock = threading.Lock()
 
+    def __read_catalogue(self) -> Catalogue:
+        # Catalogue writes collect in a pending copy, which the first read after them publishes. A burst of
+        # writes, like a bulk load, so copies the catalogue once rather than once per game.
+        if self.__pending_catalogue is not None:
+            with self.__catalogue_lock:
+                if self.__pending_catalogue is not None:
+                    self.__publish_catalogue(self.__pending_catalogue)
+        return self.__catalogue
+
+    def __publish_catalogue(self, catalogue: Catalogue):
+        # Only called with the catalogue lock held
+        catalogue.version = self.__catalogue.version + 1
+        self.__catalogue = catalogue
+        self.__pending_catalogue = None
+
+    def __write_catalogue(self, write, item):
+        # Only called with the catalogue lock held
+        if self.__pending_catalogue is None:
+            self.__pending_catalogue = self.__catalogue.copy()
+        write(self.__pending_catalogue, item)
+        if self.__reload_writes is not None:
+            self.__reload_writes.append((write, item))
 
     # Game Related Methods
     def add_game(self, game: Game):
-        if game not in self.__games:
-            self.__games.append(game)
+        with self.__catalogue_lock:
+            self.__write_catalogue(Catalogue.add_game, game)
 
     def getAllGames(self) -> list[Game]:
-        return self.__games
+        return self.__read_catalogue().games
 
     def getGameById(self, id: int):
-        for game in self.__games:
-            if game.game_id == id:
-                return game
-        return None
+        return self.__read_catalogue().games_by_id.get(id)
 
-    def getGamesByGenres(self, genres: list[Genre]) -> list[Game]:  # Similar to get_articles_by_date in COVID app??
-        games = set()
+    def getGamesByGenres(self, genres: list[Genre], load_plan=None) -> list[Game]:  # Similar to get_articles_by_date in COVID app??
+        catalogue = self.__read_catalogue()
         if genres is None or len(genres) == 0 or genres[0] == '':
-            return self.__games
-        for game in self.__games:
-            # print(game.genres)
+            return catalogue.games
+        # Union of the genre posting sets, ordered by game id so repeated queries paginate the same way.
+        game_ids = set()
+        for genre in genres:
+            game_ids |= catalogue.game_ids_by_genre.get(genre.genre_name, set())
+        return [catalogue.games_by_id[game_id] for game_id in sorted(game_ids)]
+
+    def search_games(self, title: str = None, genres: list[Genre] = None, genre_terms: list[str] = None,
+                     publisher: str = None, min_rating: float = None, sort_by_rating: bool = False,
+                     text: str = None, offset: int = 0, limit: int = None,
+                     load_plan=None) -> tuple[list[Game], int]:
+        # Narrow the candidates with the genre and publisher posting sets first, only the
+        # remaining games are looked at for the title and rating conditions.
+        catalogue = self.__read_catalogue()
+        game_ids = None
+        ranked_ids = None
+        if text:
+            ranked_ids = catalogue.text_index.search(text)
+            game_ids = set(ranked_ids)
+        if genres:
+            game_ids = set()
             for genre in genres:
-                if genre in game.genres:
-                    games.add(game)
-        return list(games)
+                game_ids |= catalogue.game_ids_by_genre.get(genre.genre_name, set())
+        for term in genre_terms or []:
+            term_ids = set()
+            for genre_name, ids in catalogue.game_ids_by_genre.items():
+                if genre_name is not None and genre_name.lower() == term.lower():
+                    term_ids |= ids
+            game_ids = term_ids if game_ids is None else game_ids & term_ids
+        if publisher:
+            publisher_ids = set()
+            for publisher_name, ids in catalogue.game_ids_by_publisher.items():
+                if publisher_name is not None and publisher.lower() in publisher_name.lower():
+                    publisher_ids |= ids
+            game_ids = publisher_ids if game_ids is None else game_ids & publisher_ids
+
+        if ranked_ids is not None:
+            # Full-text matches keep their relevance order
+            games = [catalogue.games_by_id[game_id] for game_id in ranked_ids if game_id in game_ids]
+        elif game_ids is None:
+            games = [catalogue.games_by_id[game_id] for game_id in catalogue.game_ids_sorted()]
+        else:
+            games = [catalogue.games_by_id[game_id] for game_id in sorted(game_ids)]
+
+        if title:
+            games = [game for game in games if game.title is not None and title.lower() in game.title.lower()]
+        if min_rating is not None:
+            games = [game for game in games if self.__average_rating(game.game_id) >= min_rating]
+        if sort_by_rating:
+            games.sort(key=lambda game: self.__average_rating(game.game_id), reverse=True)
+
+        end = None if limit is None else offset + limit
+        return games[offset:end], len(games)
+
+    def __average_rating(self, game_id: int) -> float:
+        review_count, rating_total = self.__rating_summaries.get(game_id, (0, 0))
+        return rating_total / review_count if review_count > 0 else -1
+
+    # Catalogue Snapshot Methods
+    def export_catalogue(self) -> dict:
+        """The games, genres and publishers together with their indexes, as kept in a catalogue snapshot."""
+        return self.__read_catalogue().to_dict()
+
+    def import_catalogue(self, catalogue: dict):
+        """Replace the catalogue with one from export_catalogue, without rebuilding any of the indexes."""
+        with self.__catalogue_lock:
+            self.__publish_catalogue(Catalogue.from_dict(catalogue))
+
+    def reload_catalogue(self, data_path: Path, workers: int = 1) -> Catalogue:
+        """Build a new catalogue from games.csv and swap it in, keeping users, reviews and wishlists.
+
+        Requests that are reading the current catalogue keep it until they finish. The replaced catalogue is
+        returned, so that the caller decides where and when its memory is freed. Games, genres and publishers
+        added while the reload runs are added to the new catalogue too, unless games.csv already has them.
+        Reviews and wishlists are pointed at the reloaded games; those of games games.csv no longer has are
+        dropped.
+        """
+        with self.__reload_lock:
+            with self.__catalogue_lock:
+                # Writes from before the reload are published now and replaced with games.csv like the rest of
+                # the catalogue, the ones from here on are recorded
+                if self.__pending_catalogue is not None:
+                    self.__publish_catalogue(self.__pending_catalogue)
+                self.__reload_writes = list()
+            try:
+                catalogue = Catalogue()
+                for number, game in enumerate(stream_gamedata(data_path, workers)):
+                    catalogue.add_game(game)
+                    if game.publisher is not None:
+                        catalogue.add_publisher(game.publisher)
+                    for genre in game.genres:
+                        catalogue.add_genre(genre)
+                    if number % RELOAD_YIELD_EVERY == 0:
+                        # Let the request threads run while a large catalogue is built
+                        time.sleep(0)
+                catalogue.prepare()
+                with self.__catalogue_lock:
+                    if self.__reload_writes:
+                        for write, item in self.__reload_writes:
+                            write(catalogue, item)
+                        catalogue.prepare()
+                    previous = self.__catalogue
+                    self.__publish_catalogue(catalogue)
+            finally:
+                with self.__catalogue_lock:
+                    self.__reload_writes = None
+            self.__rebind_user_data(catalogue.games_by_id)
+        return previous
+
+    def __rebind_user_data(self, games_by_id: dict):
+        # Reviews and wishlists otherwise keep showing the replaced games, and keep them in memory. Writes to
+        # them wait meanwhile; the ones that started before the reload resolve their game again themselves.
+        with self.__review_locks.all_keys():
+            kept_reviews = [review for review in self.__reviews if review.game.game_id in games_by_id]
+            for review in kept_reviews:
+                review.game = games_by_id[review.game.game_id]
+            self.__review_keys = {(review.user, review.game, review.comment) for review in kept_reviews}
+            if len(kept_reviews) < len(self.__reviews):
+                self.__reviews = kept_reviews
+                self.__reviews_by_game = {game_id: reviews for game_id, reviews in self.__reviews_by_game.items()
+                                          if game_id in games_by_id}
+                self.__rating_summaries = {game_id: summary for game_id, summary in self.__rating_summaries.items()
+                                           if game_id in games_by_id}
+                self.__reviews_by_user = {
+                    username: [review for review in reviews if review.game.game_id in games_by_id]
+                    for username, reviews in self.__reviews_by_user.items()
+                }
+        with self.__wishlist_locks.all_keys():
+            for wishlist in self.__wishlists.values():
+                games = wishlist.list_of_games()
+                games[:] = [games_by_id[game.game_id] for game in games if game.game_id in games_by_id]
+
+    def __current_game(self, game: Game) -> Game:
+        # The catalogue's instance of a game that a request may have read before a reload
+        return self.__read_catalogue().games_by_id.get(game.game_id, game)
+
+    def catalogue_version(self) -> int:
+        return self.__read_catalogue().version
 
     # Genre Related Methods
     def add_genre(self, genre: Genre):
-        if genre not in self.__genres:
-            self.__genres.append(genre)
+        with self.__catalogue_lock:
+            self.__write_catalogue(Catalogue.add_genre, genre)
 
     def getAllGenres(self) -> list[Genre]:
-        return self.__genres
+        return self.__read_catalogue().genres
 
     # Publisher Related Methods
     def add_publisher(self, publisher: Publisher):
-        if publisher not in self.__publishers:
-            self.__publishers.append(publisher)
+        with self.__catalogue_lock:
+            self.__write_catalogue(Catalogue.add_publisher, publisher)
 
     def getAllPublishers(self) -> list[Publisher]:
-        return list(self.__publishers)
+        return list(self.__read_catalogue().publishers)
 
     # Review Related Methods
     def add_review(self, review: Review):
-        if review not in self.__reviews:
+        game_id = review.game.game_id
+        with self.__review_locks.for_key(game_id):
+            review.game = self.__current_game(review.game)
+            # Review has no __hash__, so the index is keyed on the same fields Review.__eq__ compares.
+            review_key = (review.user, review.game, review.comment)
+            if review_key in self.__review_keys:
+                return
+            self.__review_keys.add(review_key)
             self.__reviews.append(review)
+            self.__reviews_by_game.setdefault(game_id, []).append(review)
+            self.__reviews_by_user.setdefault(review.user.username, []).append(review)
+            review_count, rating_total = self.__rating_summaries.get(game_id, (0, 0))
+            self.__rating_summaries[game_id] = (review_count + 1, rating_total + review.rating)
 
     def getAllReviews(self) -> list[Review]:
         return self.__reviews
 
+    def get_reviews_for_game(self, game_id: int, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        return self.__newest_first(self.__reviews_by_game.get(game_id, []), offset, limit)
+
+    def count_reviews_for_game(self, game_id: int) -> int:
+        return len(self.__reviews_by_game.get(game_id, []))
+
+    def get_reviews_for_user(self, username: str, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        return self.__newest_first(self.__reviews_by_user.get(username, []), offset, limit)
+
+    def count_reviews_for_user(self, username: str) -> int:
+        return len(self.__reviews_by_user.get(username, []))
+
+    def get_rating_summary(self, game_id: int) -> tuple[int, int]:
+        return self.__rating_summaries.get(game_id, (0, 0))
+
+    def get_rating_summaries(self) -> dict[int, tuple[int, int]]:
+        # A copy, so that callers can iterate it while reviews are being added
+        return dict(self.__rating_summaries)
+
+    @staticmethod
+    def __newest_first(reviews: list[Review], offset: int, limit: int) -> list[Review]:
+        # The index lists are in insertion order, so slice from the end instead of reversing the whole list.
+        end = max(len(reviews) - offset, 0)
+        start = 0 if limit is None else max(end - limit, 0)
+        return reviews[start:end][::-1]
+
     # Wishlist Related Methods
-    def get_wishlist(self, user: User):
-        # if user not in self.__wishlists:
-        #     self.__wishlists[user] = Wishlist(user)
-        if user not in self.__wishlists:
-            return None
-        return self.__wishlists[user]
+    def get_wishlist(self, user: User, load_plan=None):
+        return self.__wishlists.get(user)
 
     def add_wishlist(self, user: User, wishlist: Wishlist):
-        self.__wishlists[user] = wishlist
+        with self.__wishlist_locks.for_key(user):
+            self.__store_wishlist(user, wishlist)
 
     def update_wishlist(self, user: User, wishlist: Wishlist):
+        with self.__wishlist_locks.for_key(user):
+            self.__store_wishlist(user, wishlist)
+
+    def __store_wishlist(self, user: User, wishlist: Wishlist):
+        # Only called with the user's wishlist lock held
+        games = wishlist.list_of_games()
+        games[:] = [self.__current_game(game) for game in games]
         self.__wishlists[user] = wishlist
 
+    def add_game_to_wishlist(self, user: User, game: Game):
+        with self.__wishlist_locks.for_key(user):
+            wishlist = self.__wishlists.get(user)
+            if wishlist is None:
+                wishlist = self.__wishlists[user] = Wishlist(user)
+            wishlist.add_game(self.__current_game(game))
+
     def remove_game_from_wishlist(self, user: User, game: Game):
-        wishlist = self.get_wishlist(user)
-        print(user)
-        if game in wishlist.list_of_games():
-            wishlist.remove_game(game)
-            self.update_wishlist(user, wishlist)  # Save changes back to repository
+        with self.__wishlist_locks.for_key(user):
+            wishlist = self.get_wishlist(user)
+            if wishlist is not None and game in wishlist.list_of_games():
+                wishlist.remove_game(game)
 
     # User Related Methods
     def addUser(self, user: User):
-        self.__users.append(user)
+        with self.__users_lock:
+            self.__users.append(user)
+            self.__users_by_username.setdefault(user.username, user)
 
     def getUser(self, user_name: str) -> User:
-        for user in self.__users:
-            if user.username == user_name:
-                return user
-        return None
+        return self.__users_by_username.get(user_name)
 
     def getAllUsers(self) -> list[User]:
-        return self.__users
\ No newline at end of file
+        return self.__users
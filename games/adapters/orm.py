@@ -1,8 +1,10 @@
 from sqlalchemy import (
-    Table, MetaData, Column, Integer, String, Text, Float, ForeignKey
+    Table, MetaData, Column, Integer, String, Text, Float, ForeignKey, Index, DDL, event, inspect, select, func
 )
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import mapper, relationship
 
+from games.adapters.repository import initial_catalogue_version
 from games.domainmodel.model import Game, Publisher, Genre, User, Review, Wishlist
 
 # global variable giving access to the MetaData (schema) information of the database
@@ -30,7 +32,37 @@ games_table = Table(
     Column('game_description', String(255), nullable=True),
     Column('game_image_url', String(255), nullable=True),
     Column('game_website_url', String(255), nullable=True),
-    Column('publisher_name', ForeignKey('publishers.name'))
+    Column('publisher_name', ForeignKey('publishers.name')),
+    Index('ix_games_publisher_name', 'publisher_name')
+)
+
+# Full-text index over game titles and descriptions (SQLite FTS5). It is an external content table reading
+# from 'games', kept in sync by triggers so every insert/update path (add_game, bulk loads) is covered.
+games_fts_ddl = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS games_fts "
+    "USING fts5(game_title, game_description, content='games', content_rowid='game_id')",
+    "CREATE TRIGGER IF NOT EXISTS games_fts_insert AFTER INSERT ON games BEGIN "
+    "INSERT INTO games_fts(rowid, game_title, game_description) "
+    "VALUES (new.game_id, new.game_title, new.game_description); END",
+    "CREATE TRIGGER IF NOT EXISTS games_fts_delete AFTER DELETE ON games BEGIN "
+    "INSERT INTO games_fts(games_fts, rowid, game_title, game_description) "
+    "VALUES ('delete', old.game_id, old.game_title, old.game_description); END",
+    "CREATE TRIGGER IF NOT EXISTS games_fts_update AFTER UPDATE ON games BEGIN "
+    "INSERT INTO games_fts(games_fts, rowid, game_title, game_description) "
+    "VALUES ('delete', old.game_id, old.game_title, old.game_description); "
+    "INSERT INTO games_fts(rowid, game_title, game_description) "
+    "VALUES (new.game_id, new.game_title, new.game_description); END",
+]
+for statement in games_fts_ddl:
+    event.listen(games_table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+event.listen(games_table, 'before_drop', DDL("DROP TABLE IF EXISTS games_fts").execute_if(dialect='sqlite'))
+
+# A single row whose version is raised in the transaction of every catalogue write, so that all processes
+# using the database agree on it (see SqlAlchemyRepository.catalogue_version).
+catalogue_meta_table = Table(
+    'catalogue_meta', metadata,
+    Column('id', Integer, primary_key=True),
+    Column('version', Integer, nullable=False)
 )
 
 users_table = Table(
@@ -45,14 +77,30 @@ reviews_table = Table(
     Column('game_id', ForeignKey('games.game_id')),
     Column('username', ForeignKey('users.username')),
     Column('rating', Integer, nullable=False),
-    Column('comment', Text, nullable=True)
+    Column('comment', Text, nullable=True),
+    # Per-game and per-user review pages are read newest first.
+    Index('ix_reviews_game_id_review_id', 'game_id', 'review_id'),
+    Index('ix_reviews_username_review_id', 'username', 'review_id')
+)
+
+game_ratings_table = Table(
+    'game_ratings', metadata,
+    # Running review count and rating total per game, maintained by add_review so that
+    # average ratings never need the reviews themselves.
+    Column('game_id', ForeignKey('games.game_id'), primary_key=True),
+    Column('review_count', Integer, nullable=False, default=0),
+    Column('rating_total', Integer, nullable=False, default=0)
 )
 
 game_genres_table = Table(
     'game_genres', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('game_id', ForeignKey('games.game_id')),
-    Column('genre_name', ForeignKey('genres.genre_name'))
+    Column('genre_name', ForeignKey('genres.genre_name')),
+    # Posting index for genre lookups: genre -> game ids, without touching the base table.
+    Index('ix_game_genres_genre_name_game_id', 'genre_name', 'game_id'),
+    # And the other way round for loading the genres of a page of games.
+    Index('ix_game_genres_game_id_genre_name', 'game_id', 'genre_name')
 )
 
 user_reviews_table = Table(
@@ -60,6 +108,7 @@ user_reviews_table = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('username', ForeignKey('users.username')),
     Column('review_id', ForeignKey('reviews.review_id')),
+    Index('ix_user_reviews_username', 'username')
 )
 
 game_reviews_table = Table(
@@ -67,22 +116,61 @@ game_reviews_table = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('game_id', ForeignKey('games.game_id')),
     Column('review_id', ForeignKey('reviews.review_id')),
+    Index('ix_game_reviews_game_id', 'game_id')
 )
 
+# The unique constraints are unique indexes rather than table constraints, so that create_schema can add
+# them to a database that was created before they existed.
 wishlist_table = Table(
     'wishlists', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
-    Column('username', ForeignKey('users.username'))
+    Column('username', ForeignKey('users.username')),
+    # One wishlist per user
+    Index('ux_wishlists_username', 'username', unique=True)
 )
 
 wishlist_game_table = Table(
     'wishlist_games', metadata,
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('wishlist_id', ForeignKey('wishlists.id')),
-    Column('game_id', ForeignKey('games.game_id'))
+    Column('game_id', ForeignKey('games.game_id')),
+    # A game is on a wishlist at most once; also the index for loading the games of a wishlist.
+    Index('ux_wishlist_games_wishlist_id_game_id', 'wishlist_id', 'game_id', unique=True)
 )
 
 
+def create_schema(engine):
+    """Create the tables that are missing, and the indexes that are missing on tables that already exist.
+
+    A database created before the rating summary or the full-text index existed gets them filled from its
+    reviews and games, and one without a catalogue version gets a new one.
+    """
+    existing_tables = set(inspect(engine).get_table_names())
+    metadata.create_all(engine)
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        for index in table.indexes:
+            try:
+                index.create(engine, checkfirst=True)
+            except SQLAlchemyError as e:
+                # e.g. a unique index over rows that are already duplicated
+                print(f"Could not create index {index.name}: {e}")
+
+    with engine.begin() as connection:
+        if 'reviews' in existing_tables and 'game_ratings' not in existing_tables:
+            connection.execute(game_ratings_table.insert().from_select(
+                ['game_id', 'review_count', 'rating_total'],
+                select(reviews_table.c.game_id, func.count(), func.sum(reviews_table.c.rating))
+                .where(reviews_table.c.game_id.isnot(None))
+                .group_by(reviews_table.c.game_id)))
+        # The full-text table is only created along with the games table, see games_fts_ddl
+        if engine.dialect.name == 'sqlite' and 'games' in existing_tables and 'games_fts' not in existing_tables:
+            for statement in games_fts_ddl:
+                connection.exec_driver_sql(statement)
+            connection.exec_driver_sql("INSERT INTO games_fts(games_fts) VALUES ('rebuild')")
+        if connection.execute(select(func.count()).select_from(catalogue_meta_table)).scalar() == 0:
+            connection.execute(catalogue_meta_table.insert().values(id=1, version=initial_catalogue_version()))
 
 
 def map_model_to_tables():
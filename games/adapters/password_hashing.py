@@ -0,0 +1,73 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from werkzeug.security import generate_password_hash
+
+# werkzeug's own default (pbkdf2:sha256 with 600000 iterations). Tests and development can switch to a cheap
+# profile such as 'pbkdf2:sha256:1000' through the PASSWORD_HASH_METHOD setting.
+DEFAULT_PASSWORD_HASH_METHOD = 'pbkdf2'
+
+# global variable holding the hash method used for new password hashes, set by create_app
+password_hash_method = DEFAULT_PASSWORD_HASH_METHOD
+
+PASSWORD_HASH_PREFIXES = ('pbkdf2:', 'scrypt:')
+
+
+def hash_password(password: str, method: str = None) -> str:
+    return generate_password_hash(password, method or password_hash_method)
+
+
+def is_password_hash(value: str) -> bool:
+    """Check if a value already is a werkzeug password hash rather than a plaintext password."""
+    return isinstance(value, str) and value.startswith(PASSWORD_HASH_PREFIXES) and value.count('$') == 2
+
+
+def hash_passwords(passwords: list[str], workers: int = 1, method: str = None) -> list[str]:
+    """Hash many passwords, spread over a process pool when workers > 1."""
+    method = method or password_hash_method
+    if workers <= 1 or len(passwords) <= 1:
+        return [generate_password_hash(password, method) for password in passwords]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_password_hash, passwords, repeat(method), chunksize=16))
+
+
+class PasswordHashCache:
+    """Password hashes kept in a JSON file between runs, keyed by a digest of the user row and hash method.
+
+    The cache sits next to the CSV of plaintext passwords it is built from, so it reveals nothing the CSV
+    does not. Entries that were not looked up during a run are dropped when the cache is saved.
+    """
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__hashes = dict()
+        self.__used = dict()
+        if filename is not None and os.path.exists(filename):
+            try:
+                with open(filename, 'r', encoding='utf-8') as file:
+                    self.__hashes = json.load(file)
+            except (ValueError, OSError) as e:
+                print(f"Ignoring password hash cache {filename}: {e}")
+
+    @staticmethod
+    def key(username: str, password: str, method: str) -> str:
+        return hashlib.sha256("\0".join((method, username, password)).encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        password_hash = self.__hashes.get(key)
+        if password_hash is not None:
+            self.__used[key] = password_hash
+        return password_hash
+
+    def put(self, key: str, password_hash: str):
+        self.__hashes[key] = password_hash
+        self.__used[key] = password_hash
+
+    def save(self):
+        if self.__filename is None:
+            return
+        with open(self.__filename, 'w', encoding='utf-8') as file:
+            json.dump(self.__used, file)
@@ -1,8 +1,23 @@
 import abc
+import time
+
 from games.domainmodel.model import Genre, Game, Publisher, Review, User, Wishlist
 
 repo_instance = None
 
+DEFAULT_BULK_LOAD_BATCH_SIZE = 1000
+
+# A load plan names the related objects a caller is about to use, so that the database repository loads them
+# together with the rows (selectinload/joinedload) instead of with one more query per row. The memory
+# repository always has everything loaded and ignores load plans.
+LOAD_GENRES = 'genres'
+LOAD_PUBLISHER = 'publisher'
+LOAD_REVIEW_USER = 'review_user'
+LOAD_REVIEW_GAME = 'review_game'
+
+# What the game listings (browse, wishlist) show of every game
+GAME_LISTING_PLAN = frozenset({LOAD_GENRES, LOAD_PUBLISHER})
+
 
 class RepositoryException(Exception):
     def __init__(self, message=None):
@@ -17,6 +32,31 @@ class AbstractRepository(abc.ABC):
         """Adds a game to the repository."""
         raise NotImplementedError
 
+    def bulk_load(self, games, genres: list[Genre], publishers: list[Publisher], users: list[User],
+                  batch_size: int = DEFAULT_BULK_LOAD_BATCH_SIZE) -> dict:
+        """Adds many games (any iterable, consumed once), genres, publishers and users at once. The genres and
+        publishers of the games are added as well. Returns the number of rows loaded, the seconds it took and
+        the resulting rows per second."""
+        start = time.perf_counter()
+        rows = 0
+        for genre in genres:
+            self.add_genre(genre)
+            rows += 1
+        for publisher in publishers:
+            self.add_publisher(publisher)
+            rows += 1
+        for game in games:
+            self.add_game(game)
+            if game.publisher is not None:
+                self.add_publisher(game.publisher)
+            for genre in game.genres:
+                self.add_genre(genre)
+            rows += 1
+        for user in users:
+            self.addUser(user)
+            rows += 1
+        return bulk_load_stats(rows, start)
+
     @abc.abstractmethod
     def add_genre(self, genre: Genre):
         """Adds a browse to the repository."""
@@ -37,6 +77,38 @@ class AbstractRepository(abc.ABC):
         """Retrieve all reviews stored in the repository."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_reviews_for_game(self, game_id: int, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        """Retrieve the reviews of a game, newest first, skipping offset reviews and returning at most limit."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_reviews_for_game(self, game_id: int) -> int:
+        """Retrieve the number of reviews of a game."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_reviews_for_user(self, username: str, offset: int = 0, limit: int = None,
+                             load_plan=None) -> list[Review]:
+        """Retrieve the reviews written by a user, newest first, skipping offset reviews and returning at most limit."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def count_reviews_for_user(self, username: str) -> int:
+        """Retrieve the number of reviews written by a user."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_rating_summary(self, game_id: int) -> tuple[int, int]:
+        """Retrieve the (review count, rating total) of a game, kept up to date by add_review."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_rating_summaries(self) -> dict[int, tuple[int, int]]:
+        """Retrieve the (review count, rating total) of every reviewed game, keyed by game id."""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def getAllGames(self):
         """Retrieve all games stored in the repository."""
@@ -53,14 +125,35 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def getGamesByGenres(self, genres: list[Genre]):
+    def getGamesByGenres(self, genres: list[Genre], load_plan=None):
         """Retrieve all games that are associated with the given genres."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def search_games(self, title: str = None, genres: list[Genre] = None, genre_terms: list[str] = None,
+                     publisher: str = None, min_rating: float = None, sort_by_rating: bool = False,
+                     text: str = None, offset: int = 0, limit: int = None,
+                     load_plan=None) -> tuple[list[Game], int]:
+        """Retrieve one page of the games matching every given condition, ordered by game id (by relevance
+        when text is given, by average rating when sort_by_rating is set), together with the total number of
+        matching games.
+
+        title and publisher match case-insensitive substrings, genres matches games in any of the genres,
+        genre_terms matches games having every one of the (case-insensitive) genre names and text is a
+        full-text query over titles and descriptions where every word matches as a prefix."""
+        raise NotImplementedError
+
     def getGameById(self, id: int):
         """Retrieve a game by its id."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def catalogue_version(self) -> int:
+        """A number that changes whenever games, genres or publishers change. Games read after it are at least
+        as new as that version, so it can key anything derived from them. A version is never reused for other
+        content, also not after a restart."""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def getUser(self, user_name: str) -> User:
         """Retrieve a user by its username. If no User with the given username exists, this method returns None."""
@@ -77,8 +170,8 @@ class AbstractRepository(abc.ABC):
         raise NotImplementedError
 
     @abc.abstractmethod
-    def get_wishlist(self, user: User):
-        """Retrieve a user's wishlist."""
+    def get_wishlist(self, user: User, load_plan=None):
+        """Retrieve a user's wishlist, load_plan applies to its games."""
         raise NotImplementedError
 
     @abc.abstractmethod
@@ -86,6 +179,11 @@ class AbstractRepository(abc.ABC):
         """Add a wishlist to the repository."""
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def add_game_to_wishlist(self, user: User, game: Game):
+        """Add a game to a user's wishlist, creating the wishlist if the user has none yet."""
+        raise NotImplementedError
+
     @abc.abstractmethod
     def remove_game_from_wishlist(self, user: User, game: Game):
         """Remove a game from a user's wishlist."""
@@ -94,4 +192,19 @@ class AbstractRepository(abc.ABC):
     @abc.abstractmethod
     def update_wishlist(self, user: User, wishlist: Wishlist):
         """Update a user's wishlist."""
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+
+def initial_catalogue_version() -> int:
+    """The version a catalogue starts at: the current time in milliseconds, so that a store that is created
+    again, or a process that is started again, never reuses a version an earlier one had for other content."""
+    return time.time_ns() // 1000000
+
+
+def bulk_load_stats(rows: int, start: float) -> dict:
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'seconds': seconds,
+        'rows_per_second': rows / seconds if seconds > 0 else float(rows)
+    }
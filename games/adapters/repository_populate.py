@@ -1,10 +1,45 @@
+import time
 from pathlib import Path
 
-from games.adapters.repository import AbstractRepository, RepositoryException
-from games.adapters.datareader.csvdatareader import load_gamedata, load_users
+from games.adapters.repository import AbstractRepository, RepositoryException, DEFAULT_BULK_LOAD_BATCH_SIZE, \
+    bulk_load_stats
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.columnar_repository import ColumnarMemoryRepository
+from games.adapters.datareader.csvdatareader import stream_gamedata, read_users
+from games.adapters.snapshot import read_snapshot, write_snapshot
 
-def populate(data_path: Path, repo: AbstractRepository, database_mode: bool):
-    # Load game data into the repository
-    load_gamedata(data_path, repo)
-    # Load users into the repository
-    load_users(data_path, repo)
\ No newline at end of file
+def populate(data_path: Path, repo: AbstractRepository, database_mode: bool,
+             batch_size: int = DEFAULT_BULK_LOAD_BATCH_SIZE, workers: int = 1, password_hash_cache=None,
+             snapshot_path=None):
+    # Games are streamed from the CSV straight into the repository, genres and publishers are taken from them.
+    # With workers > 1 the CSVs are parsed and the passwords hashed in that many processes.
+    user_reader = read_users(data_path, password_hash_cache, workers)
+    users = user_reader.dataset_of_users
+
+    # A columnar repository maps its catalogue from the store file, which is only rebuilt when games.csv changes.
+    if isinstance(repo, ColumnarMemoryRepository):
+        start = time.perf_counter()
+        game_count = repo.load_catalogue(data_path, workers)
+        repo.bulk_load([], [], [], users)
+        stats = bulk_load_stats(game_count + len(users), start)
+        print(f"Mapped {stats['rows']} rows in {stats['seconds']:.2f}s")
+        return stats
+
+    # A memory repository can skip the CSV and the index building by loading a catalogue snapshot instead,
+    # the snapshot is (re)written whenever it is missing or games.csv has changed since it was taken.
+    games_filename = Path(data_path) / "games.csv"
+    use_snapshot = snapshot_path is not None and isinstance(repo, MemoryRepository)
+    catalogue = read_snapshot(snapshot_path, games_filename) if use_snapshot else None
+    if catalogue is not None:
+        start = time.perf_counter()
+        repo.import_catalogue(catalogue)
+        repo.bulk_load([], [], [], users)
+        stats = bulk_load_stats(len(catalogue['games']) + len(users), start)
+        print(f"Loaded {stats['rows']} rows from snapshot in {stats['seconds']:.2f}s")
+        return stats
+
+    stats = repo.bulk_load(stream_gamedata(data_path, workers), [], [], users, batch_size)
+    print(f"Loaded {stats['rows']} rows in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/sec)")
+    if use_snapshot:
+        write_snapshot(snapshot_path, games_filename, repo.export_catalogue())
+    return stats
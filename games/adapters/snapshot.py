@@ -0,0 +1,69 @@
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+# Bump whenever the layout of the snapshot or of the pickled domain objects changes, older snapshots are then
+# ignored and rebuilt from the CSV.
+SNAPSHOT_FORMAT = 2
+
+
+def source_fingerprint(filename) -> dict:
+    stat = os.stat(filename)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': file_digest(filename)}
+
+
+def file_digest(filename) -> str:
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def is_current(fingerprint: dict, filename) -> bool:
+    """Check if a snapshot built from filename with this fingerprint is still up to date."""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return False
+    if stat.st_mtime_ns == fingerprint.get('mtime_ns') and stat.st_size == fingerprint.get('size'):
+        return True
+    # The file was touched or copied, it only counts as changed when its content is different.
+    return stat.st_size == fingerprint.get('size') and file_digest(filename) == fingerprint.get('sha256')
+
+
+def write_snapshot(snapshot_filename, source_filename, catalogue: dict):
+    """Write the catalogue to a snapshot keyed by the source CSV's mtime, size and hash.
+
+    The header is pickled separately in front of the catalogue so that a stale snapshot is detected without
+    loading it. The file is written next to the snapshot first and then moved in place, so that workers
+    starting at the same time never read a half written snapshot.
+    """
+    snapshot_filename = Path(snapshot_filename)
+    header = {'format': SNAPSHOT_FORMAT, 'source': source_fingerprint(source_filename)}
+    temporary_filename = snapshot_filename.with_name(f"{snapshot_filename.name}.{os.getpid()}.tmp")
+    try:
+        with open(temporary_filename, 'wb') as file:
+            pickle.dump(header, file, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(catalogue, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_filename, snapshot_filename)
+    except OSError as e:
+        print(f"Could not write catalogue snapshot {snapshot_filename}: {e}")
+        if temporary_filename.exists():
+            temporary_filename.unlink()
+
+
+def read_snapshot(snapshot_filename, source_filename):
+    """Return the catalogue stored in the snapshot, or None when there is none or the source CSV has changed."""
+    if not os.path.exists(snapshot_filename):
+        return None
+    try:
+        with open(snapshot_filename, 'rb') as file:
+            header = pickle.load(file)
+            if header.get('format') != SNAPSHOT_FORMAT or not is_current(header.get('source', {}), source_filename):
+                return None
+            return pickle.load(file)
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError) as e:
+        print(f"Ignoring catalogue snapshot {snapshot_filename}: {e}")
+        return None
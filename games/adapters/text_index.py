@@ -0,0 +1,107 @@
+import bisect
+import math
+import re
+from collections import Counter
+
+from games.domainmodel.model import Game
+
+# Same word boundaries as SQLite's unicode61 FTS5 tokenizer: runs of letters and digits.
+TOKEN_PATTERN = re.compile(r'[^\W_]+')
+
+# A word in the title counts as much as this many occurrences in the description.
+TITLE_WEIGHT = 10.0
+
+
+def tokenize(text: str) -> list[str]:
+    if not isinstance(text, str):
+        return []
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def fts5_match_expression(query: str):
+    """Turn a user query into an FTS5 MATCH expression where every word is a quoted prefix term."""
+    terms = tokenize(query)
+    if len(terms) == 0:
+        return None
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+class GameTextIndex:
+    """Inverted index over game titles and descriptions.
+
+    Every query word is treated as a prefix and all of them have to match (like FTS5). Games are ranked by
+    the sum of tf-idf scores of the matching words, with title words weighted by TITLE_WEIGHT.
+    """
+
+    def __init__(self):
+        self.__postings = dict()
+        self.__sorted_tokens = []
+        self.__new_tokens = False
+        self.__document_count = 0
+
+    def add_game(self, game: Game):
+        weights = Counter()
+        for token in tokenize(game.title):
+            weights[token] += TITLE_WEIGHT
+        for token in tokenize(game.description):
+            weights[token] += 1
+        for token, weight in weights.items():
+            postings = self.__postings.get(token)
+            if postings is None:
+                postings = self.__postings[token] = dict()
+                self.__new_tokens = True
+            postings[game.game_id] = 1 + math.log(weight)
+        self.__document_count += 1
+
+    def copy(self) -> 'GameTextIndex':
+        index = GameTextIndex()
+        index.__postings = {token: dict(postings) for token, postings in self.__postings.items()}
+        index.__sorted_tokens = self.__sorted_tokens
+        index.__new_tokens = self.__new_tokens
+        index.__document_count = self.__document_count
+        return index
+
+    def prepare(self):
+        """Sort the tokens now rather than in the first search."""
+        self.__tokens_with_prefix('')
+
+    def search(self, query: str) -> list[int]:
+        """Return the ids of the games matching every word of the query, best match first."""
+        term_postings = []
+        for term in tokenize(query):
+            postings = [self.__postings[token] for token in self.__tokens_with_prefix(term)]
+            term_postings.append((sum(len(p) for p in postings), postings))
+        if len(term_postings) == 0:
+            return []
+        # Start from the rarest word so later words only have to score the games still in the running.
+        term_postings.sort(key=lambda entry: entry[0])
+
+        scores = None
+        for _, postings in term_postings:
+            term_scores = dict()
+            for token_postings in postings:
+                idf = math.log(1 + self.__document_count / len(token_postings))
+                if scores is None or len(token_postings) <= len(scores):
+                    matches = token_postings.items()
+                else:
+                    matches = ((game_id, token_postings[game_id]) for game_id in scores if game_id in token_postings)
+                for game_id, weight in matches:
+                    term_scores[game_id] = term_scores.get(game_id, 0) + weight * idf
+            if scores is not None:
+                term_scores = {game_id: score + scores[game_id] for game_id, score in term_scores.items()
+                               if game_id in scores}
+            scores = term_scores
+            if len(scores) == 0:
+                break
+        return sorted(scores, key=lambda game_id: (-scores[game_id], game_id))
+
+    def __tokens_with_prefix(self, prefix: str) -> list[str]:
+        if self.__new_tokens:
+            # Re-sorted lazily so that loading many games does not re-sort after every one of them.
+            self.__sorted_tokens = sorted(self.__postings)
+            self.__new_tokens = False
+        start = bisect.bisect_left(self.__sorted_tokens, prefix)
+        end = start
+        while end < len(self.__sorted_tokens) and self.__sorted_tokens[end].startswith(prefix):
+            end += 1
+        return self.__sorted_tokens[start:end]
@@ -0,0 +1,107 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+DEFAULT_WRITE_BEHIND_DELAY = 0.05
+DEFAULT_WRITE_BEHIND_ATTEMPTS = 3
+DEFAULT_WRITE_BEHIND_RETRY_DELAY = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Collects items from many threads and hands them to write_batch in batches, from one background thread.
+
+    A batch is written as soon as it has batch_size items, or max_delay seconds after its first item arrived,
+    so under a burst of writes one transaction stores many items. Items still queued when the process exits
+    are written before it does. A batch that fails is tried again up to max_attempts times, retry_delay
+    seconds more apart every time; one that never succeeds is logged with its items and counted as lost.
+    """
+
+    def __init__(self, write_batch, batch_size: int, max_delay: float = DEFAULT_WRITE_BEHIND_DELAY,
+                 max_attempts: int = DEFAULT_WRITE_BEHIND_ATTEMPTS,
+                 retry_delay: float = DEFAULT_WRITE_BEHIND_RETRY_DELAY):
+        self.__write_batch = write_batch
+        self.__batch_size = batch_size
+        self.__max_delay = max_delay
+        self.__max_attempts = max_attempts
+        self.__retry_delay = retry_delay
+        self.__queue = queue.Queue()
+        self.__thread = None
+        self.__thread_lock = threading.Lock()
+        self.__batches = 0
+        self.__items = 0
+        self.__failed_batches = 0
+        self.__lost_items = 0
+        atexit.register(self.close)
+
+    def submit(self, item):
+        if self.__thread is None:
+            with self.__thread_lock:
+                if self.__thread is None:
+                    self.__thread = threading.Thread(target=self.__run, name='write-behind', daemon=True)
+                    self.__thread.start()
+        self.__queue.put(item)
+
+    def flush(self):
+        """Wait until every item submitted so far has been written."""
+        if self.__thread is not None:
+            self.__queue.join()
+
+    def close(self):
+        if self.__thread is not None and self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+
+    def stats(self) -> dict:
+        return {'batches': self.__batches, 'items': self.__items, 'queued': self.__queue.qsize(),
+                'failed_batches': self.__failed_batches, 'lost_items': self.__lost_items}
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            if item is None:
+                self.__queue.task_done()
+                return
+            batch = [item]
+            closing = False
+            deadline = time.monotonic() + self.__max_delay
+            while len(batch) < self.__batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.__queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self.__write(batch)
+            for _ in range(len(batch) + closing):
+                self.__queue.task_done()
+            if closing:
+                return
+
+    def __write(self, batch: list):
+        for attempt in range(1, self.__max_attempts + 1):
+            try:
+                self.__write_batch(batch)
+            except Exception:
+                # Counts failed attempts, a batch that is retried successfully is counted once per failure
+                self.__failed_batches += 1
+                if attempt == self.__max_attempts:
+                    self.__lost_items += len(batch)
+                    logger.exception("Could not write %d queued items in %d attempts, they are lost: %r",
+                                     len(batch), attempt, batch)
+                    return
+                logger.warning("Could not write %d queued items (attempt %d of %d), trying again",
+                               len(batch), attempt, self.__max_attempts, exc_info=True)
+                time.sleep(self.__retry_delay * attempt)
+            else:
+                self.__batches += 1
+                self.__items += len(batch)
+                return
@@ -0,0 +1,28 @@
+from flask import Blueprint, request, jsonify
+
+import games.api.services as services
+import games.adapters.repository as repo
+from games.utilities import fragment_cache
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+MAX_SUGGESTIONS = 50
+
+
+@api.route('/suggest', methods=['GET'])
+def suggest():
+    suggestion_type = request.args.get('type', "title", type=str)
+    prefix = request.args.get('q', "", type=str)
+    limit = min(max(request.args.get('limit', 10, type=int), 0), MAX_SUGGESTIONS)
+
+    try:
+        suggestions = services.get_suggestions(repo.repo_instance, suggestion_type, prefix, limit)
+    except services.UnknownSuggestionTypeException:
+        return jsonify({'error': 'type must be one of title, publisher or genre'}), 400
+
+    return jsonify(suggestions)
+
+
+@api.route('/stats', methods=['GET'])
+def stats():
+    return jsonify(services.get_stats(repo.repo_instance, fragment_cache.cache_instance))
@@ -0,0 +1,108 @@
+import bisect
+import threading
+
+from games.adapters.repository import AbstractRepository
+from games.utilities.fragment_cache import FragmentCache
+
+
+class UnknownSuggestionTypeException(Exception):
+    pass
+
+
+class PrefixIndex:
+    """Sorted arrays of lowercased names for prefix lookups.
+
+    A name matches when the prefix starts the name or any word in it. Matches at the start of the name
+    come first, the rest follow in alphabetical order.
+    """
+
+    def __init__(self, names):
+        names = sorted({name for name in names if name})
+        self.__names = sorted((name.lower(), name) for name in names)
+        self.__words = []
+        for name in names:
+            lowered = name.lower()
+            for position in range(1, len(lowered)):
+                if lowered[position - 1] in " -:;,.(/&" and lowered[position] != " ":
+                    self.__words.append((lowered[position:], name))
+        self.__words.sort()
+
+    def __len__(self):
+        return len(self.__names)
+
+    def suggest(self, prefix: str, limit: int) -> list[str]:
+        prefix = prefix.strip().lower()
+        if limit <= 0:
+            return []
+        result = []
+        seen = set()
+        for entries in (self.__names, self.__words):
+            for name in self.__matches(entries, prefix):
+                if len(result) == limit:
+                    return result
+                if name not in seen:
+                    seen.add(name)
+                    result.append(name)
+        return result
+
+    @staticmethod
+    def __matches(entries, prefix: str):
+        position = bisect.bisect_left(entries, (prefix,))
+        while position < len(entries) and entries[position][0].startswith(prefix):
+            yield entries[position][1]
+            position += 1
+
+
+# Indexes are built on first use, keyed by suggestion type, and built again once the repository or its
+# catalogue version changes. Building happens under the lock, so concurrent requests build an index only once.
+_indexes = dict()
+_indexes_lock = threading.Lock()
+
+
+def get_suggestions(repo: AbstractRepository, suggestion_type: str, prefix: str, limit: int) -> list[str]:
+    return _get_index(repo, suggestion_type).suggest(prefix, limit)
+
+
+def reset_suggestions():
+    with _indexes_lock:
+        _indexes.clear()
+
+
+def _get_index(repo: AbstractRepository, suggestion_type: str) -> PrefixIndex:
+    if suggestion_type not in ("title", "publisher", "genre"):
+        raise UnknownSuggestionTypeException
+    # Taken before the names are read, so that an index is never older than the version it is kept for
+    version = repo.catalogue_version()
+    entry = _indexes.get(suggestion_type)
+    if entry is None or entry[0] is not repo or entry[1] != version:
+        with _indexes_lock:
+            entry = _indexes.get(suggestion_type)
+            if entry is None or entry[0] is not repo or entry[1] != version:
+                entry = (repo, version, PrefixIndex(_suggestion_names(repo, suggestion_type)))
+                _indexes[suggestion_type] = entry
+    return entry[2]
+
+
+def _suggestion_names(repo: AbstractRepository, suggestion_type: str) -> list[str]:
+    if suggestion_type == "title":
+        return [game.title for game in repo.getAllGames()]
+    if suggestion_type == "publisher":
+        return [publisher.publisher_name for publisher in repo.getAllPublishers()]
+    return [genre.genre_name for genre in repo.getAllGenres()]
+
+
+def get_stats(repo: AbstractRepository, fragment_cache: FragmentCache = None) -> dict:
+    """Runtime counters of the repository, for the parts it has (connection pool, sessions, catalogue cache,
+    review queue), and of the fragment cache when there is one."""
+    stats = dict()
+    if hasattr(repo, 'pool_stats'):
+        stats['pool'] = repo.pool_stats()
+    if hasattr(repo, 'session_stats'):
+        stats['sessions'] = repo.session_stats()
+    if hasattr(repo, 'catalogue_cache_stats'):
+        stats['catalogue_cache'] = repo.catalogue_cache_stats()
+    if hasattr(repo, 'review_queue_stats'):
+        stats['review_queue'] = repo.review_queue_stats()
+    if fragment_cache is not None:
+        stats['fragment_cache'] = fragment_cache.stats()
+    return stats
@@ -1,5 +1,6 @@
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import check_password_hash
 
+from games.adapters.password_hashing import hash_password
 from games.adapters.repository import AbstractRepository
 from games.domainmodel.model import User
 
@@ -21,7 +22,7 @@ def addUser(username: str, password: str, repo: AbstractRepository):
     if user is not None:
         raise NameNotUniqueException
 
-    password_hash = generate_password_hash(password)
+    password_hash = hash_password(password)
     user = User(username, password_hash)
     repo.addUser(user)
 
@@ -1,7 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from games.domainmodel.model import Review, User, Wishlist
 import games.browse.services as services
-from games.utilities import utilities
+from games.utilities import utilities, fragment_cache, http_caching
 import games.adapters.repository as repo
 
 browse = Blueprint('browse', __name__, url_prefix='/browse', static_folder='static', template_folder='templates')
@@ -9,30 +9,58 @@ browse = Blueprint('browse', __name__, url_prefix='/browse', static_folder='stat
 
 @browse.route('/', methods=['GET'])
 def browse_home():
-    genres = utilities.getAllGenresSorted(repo.repo_instance)
-    title_suggestions = utilities.getAllGames(repo.repo_instance)
-    publisher_suggestions = utilities.getPublishers(repo.repo_instance)
-
     checked_genres = request.args.get('genres', "", type=str).split(',')
 
     search_type = request.args.get('search', "Title", type=str)
     search_term = request.args.get('searchterm', "", type=str)
+    sort = request.args.get('sort', "", type=str)
+    min_rating = request.args.get('minrating', None, type=float)
 
-    games = services.getGamesByGenres(repo.repo_instance, checked_genres)
+    per_page = 10
+    page = max(request.args.get('page', 1, type=int), 1)
 
-    if search_term != "":
-        if search_type == "Title":
-            games = services.searchGameByTitle(games, search_term)
-        elif search_type == "Genre":
-            games = services.searchGameByGenre(games, search_term)
-        elif search_type == "Publisher":
-            games = services.searchGameByPublisher(games, search_term)
+    # Listings filtered or sorted by rating can change with any review, they get no validators
+    catalogue_version = repo.repo_instance.catalogue_version()
+    rating_dependent = sort == "rating" or min_rating is not None
+    etag = None if rating_dependent else http_caching.page_etag(catalogue_version)
+    not_modified = http_caching.not_modified(etag)
+    if not_modified is not None:
+        return not_modified
 
-    per_page = 10
-    total_page = (len(games) // per_page) + 1 if len(games) % per_page != 0 else len(games) // per_page
-    page = min(max(request.args.get('page', 1, type=int), 1), total_page)
+    genres = utilities.getAllGenresSorted(repo.repo_instance)
 
-    paginated_games = utilities.paginateLists(games, page, per_page)
+    def render_game_browser():
+        return render_game_page(checked_genres, search_type, search_term, min_rating, sort, page, per_page)
+
+    # The listing only depends on the query and the catalogue, unless it is filtered or sorted by rating,
+    # which any review can change.
+    if rating_dependent:
+        key = None
+    else:
+        key = ('browse', tuple(checked_genres), search_type, search_term, sort, page, catalogue_version)
+    game_browser = fragment_cache.get_fragment(key, render_game_browser)
+
+    return http_caching.with_validators(render_template('browse/browse.html',
+                                                        genres=genres,
+                                                        checked_genres=checked_genres,
+                                                        search_term=search_term,
+                                                        search=search_type,
+                                                        sort=sort,
+                                                        min_rating=min_rating,
+                                                        game_browser=game_browser), etag)
+
+
+def render_game_page(checked_genres, search_type, search_term, min_rating, sort, page, per_page):
+    paginated_games, game_count = services.searchGames(repo.repo_instance, checked_genres, search_type, search_term,
+                                                       min_rating, sort, (page - 1) * per_page, per_page)
+    total_page = (game_count // per_page) + 1 if game_count % per_page != 0 else game_count // per_page
+    if 0 < total_page < page:
+        # Requested past the last page, show the last page instead
+        page = total_page
+        paginated_games, game_count = services.searchGames(repo.repo_instance, checked_genres, search_type,
+                                                           search_term, min_rating, sort, (page - 1) * per_page,
+                                                           per_page)
+    page = min(page, total_page)
 
     attributes = []
     if checked_genres != ['']:
@@ -41,6 +69,10 @@ def browse_home():
         attributes.append("search=" + search_type)
     if search_term != "":
         attributes.append("searchterm=" + search_term)
+    if sort != "":
+        attributes.append("sort=" + sort)
+    if min_rating is not None:
+        attributes.append("minrating=" + str(min_rating))
 
     if page < total_page:
         next_page = "?" + "&".join(attributes) + "&page=" + str(page + 1)
@@ -55,14 +87,8 @@ def browse_home():
     first_page = "?" + "&".join(attributes) + "&page=" + "1"
     last_page = "?" + "&".join(attributes) + "&page=" + str(total_page)
 
-    return render_template('browse/browse.html',
-                           genres=genres,
-                           checked_genres=checked_genres,
-                           search_term=search_term,
-                           search=search_type,
+    return render_template('browse/game_browser.html',
                            games=paginated_games,
-                           title_suggestions=title_suggestions,
-                           publisher_suggestions=publisher_suggestions,
                            page=page,
                            total_page=total_page,
                            first_page=first_page,
@@ -74,6 +100,8 @@ def browse_home():
 @browse.route('/details')
 def browse_detail():
     game_id = request.args.get('id', 0, type=int)
+    # Taken before the game is read, so that the game is never older than the version its fragment is kept as
+    catalogue_version = repo.repo_instance.catalogue_version()
     game = utilities.getGameById(repo.repo_instance, game_id)
 
     if game is None:
@@ -87,23 +115,31 @@ def browse_detail():
         username = session['username']
         user = utilities.getUser(username, repo.repo_instance)
         wishlist = utilities.get_wishlist(repo.repo_instance, user).list_of_games()
-        in_wishlist = utilities.is_game_in_wishlist(repo.repo_instance, user, game)
+        in_wishlist = game in wishlist
     else:
         wishlist = []
         in_wishlist = False
 
-    # Retrieve all reviews from the database using the repository
-    all_reviews = repo.repo_instance.getAllReviews()
-
-    # Filter reviews for the specific game
-    reviews = [review for review in all_reviews if review.game == game]
-    reviews = reviews[::-1]
+    # The review count is the game's review version, reviews are only ever added
+    review_count = repo.repo_instance.count_reviews_for_game(game_id)
+    etag = http_caching.page_etag(catalogue_version, review_count, in_wishlist)
+    not_modified = http_caching.not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+
+    # Average and count come from the running rating summary, only the shown page of reviews is loaded
+    average_rating = utilities.get_average_rating(repo.repo_instance, game_id)
+    # The wishlist button and the reviews stay outside of the cached fragment
+    game_details = fragment_cache.get_fragment(
+        ('details', game_id, catalogue_version, review_count),
+        lambda: render_template('browse/game_details.html', game=game, average_rating=average_rating),
+        game_ids=(game_id,))
 
-    average_rating = utilities.calculate_average_rating(reviews)
     per_page = 5
-    total_page = (len(reviews) // per_page) + 1 if len(reviews) % per_page != 0 else len(reviews) // per_page
+    total_page = (review_count // per_page) + 1 if review_count % per_page != 0 else review_count // per_page
     page = min(max(request.args.get('page', 1, type=int), 1), total_page)
-    paginated_reviews = utilities.paginateLists(reviews, page, per_page)
+    paginated_reviews = repo.repo_instance.get_reviews_for_game(game_id, max(page - 1, 0) * per_page, per_page,
+                                                                {repo.LOAD_REVIEW_USER})
     attributes = []
     if page < total_page:
         next_page = "?" + "&".join(attributes) + "&id=" + str(game_id) + "&page=" + str(page + 1)
@@ -118,15 +154,15 @@ def browse_detail():
     first_page = "?" + "&".join(attributes) + "&id=" + str(game_id) + "&page=" + "1"
     last_page = "?" + "&".join(attributes) + "&id=" + str(game_id) + "&page=" + str(total_page)
 
-    return render_template('browse/gameDescription.html',
-                           game=game,
-                           wishlist=wishlist,
-                           in_wishlist=in_wishlist,
-                           average_rating=average_rating,
-                           page=page,
-                           total_page=total_page,
-                           first_page=first_page,
-                           last_page=last_page,
-                           next_page=next_page,
-                           prev_page=prev_page,
-                           reviews=paginated_reviews)
+    return http_caching.with_validators(render_template('browse/gameDescription.html',
+                                                        game=game,
+                                                        game_details=game_details,
+                                                        wishlist=wishlist,
+                                                        in_wishlist=in_wishlist,
+                                                        page=page,
+                                                        total_page=total_page,
+                                                        first_page=first_page,
+                                                        last_page=last_page,
+                                                        next_page=next_page,
+                                                        prev_page=prev_page,
+                                                        reviews=paginated_reviews), etag)
@@ -1,4 +1,4 @@
-from games.adapters.repository import AbstractRepository
+from games.adapters.repository import AbstractRepository, GAME_LISTING_PLAN
 from games.domainmodel.model import Game, Genre, User, Wishlist
 
 class UnknownUserException(Exception):
@@ -11,7 +11,25 @@ def getGamesByGenres(repo: AbstractRepository, genre_names: list[str]):
         return repo.getAllGames()
     for genre_name in genre_names:
         genres.add(Genre(genre_name))
-    return repo.getGamesByGenres(list(genres))
+    return repo.getGamesByGenres(list(genres), GAME_LISTING_PLAN)
+
+
+def searchGames(repo: AbstractRepository, genre_names: list[str], search_type: str, search_term: str,
+                min_rating: float, sort: str, offset: int, limit: int):
+    genres = [Genre(genre_name) for genre_name in genre_names if genre_name != ""] if genre_names else []
+    title = genre_terms = publisher = text = None
+    if search_term != "":
+        if search_type == "Title":
+            title = search_term
+        elif search_type == "Search":
+            text = search_term
+        elif search_type == "Genre":
+            genre_terms = search_term.rstrip(";").split(";")
+        elif search_type == "Publisher":
+            publisher = search_term
+    return repo.search_games(title=title, genres=genres, genre_terms=genre_terms, publisher=publisher,
+                             min_rating=min_rating, sort_by_rating=sort == "rating", text=text,
+                             offset=offset, limit=limit, load_plan=GAME_LISTING_PLAN)
 
 
 def searchGameByTitle(games: list[Game], search_term: str):
@@ -1,7 +1,14 @@
 from datetime import datetime
 
+# The domain classes keep their attributes in __slots__, so that objects of the in-memory catalogue do not carry
+# a __dict__ each. '__dict__' is still listed because the SQLAlchemy mapping in orm.py keeps its instance state
+# and the mapped attributes there; Python only creates the dict once something is stored in it.
+MAPPABLE_SLOTS = ('__dict__', '__weakref__')
+
 
 class Publisher:
+    __slots__ = ('__publisher_name',) + MAPPABLE_SLOTS
+
     def __init__(self, publisher_name: str):
         if publisher_name == "" or type(publisher_name) is not str:
             self.__publisher_name = None
@@ -37,6 +44,8 @@ class Publisher:
 
 
 class Genre:
+    __slots__ = ('__genre_name',) + MAPPABLE_SLOTS
+
     def __init__(self, genre_name: str):
         if genre_name == "" or type(genre_name) is not str:
             self.__genre_name = None
@@ -65,6 +74,9 @@ class Genre:
 
 
 class Game:
+    __slots__ = ('__game_id', '__game_title', '__price', '__release_date', '__description', '__image_url',
+                 '__website_url', '__genres', '__reviews', '__publisher', '__isWindows', '__isMac', '__isLinux') + MAPPABLE_SLOTS
+
     def __init__(self, game_id: int, game_title: str):
         if type(game_id) is not int or game_id < 0:
             raise ValueError("Game ID should be a positive integer!")
@@ -244,6 +256,8 @@ class Game:
 
 
 class User:
+    __slots__ = ('__username', '__password', '__reviews', '__favourite_games') + MAPPABLE_SLOTS
+
     def __init__(self, username: str, password: str):
         if not isinstance(username, str) or username.strip() == "":
             raise ValueError('Username cannot be empty or non-string!')
@@ -313,6 +327,8 @@ class User:
 
 
 class Review:
+    __slots__ = ('__user', '__game', '__rating', '__comment') + MAPPABLE_SLOTS
+
     def __init__(self, user: User, game: Game, rating: int, comment: str):
 
         if not isinstance(user, User):
@@ -335,6 +351,13 @@ class Review:
     def game(self) -> Game:
         return self.__game
 
+    @game.setter
+    def game(self, new_game: Game):
+        if isinstance(new_game, Game):
+            self.__game = new_game
+        else:
+            raise ValueError("Game must be an instance of Game class")
+
     @property
     def comment(self) -> str:
         return self.__comment
@@ -372,6 +395,8 @@ class Review:
 
 
 class Wishlist:
+    __slots__ = ('__user', '__list_of_games', '__current') + MAPPABLE_SLOTS
+
     def __init__(self, user: User):
         if not isinstance(user, User):
             raise ValueError("User must be an instance of User class")
@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template
+import time
+
+from flask import Blueprint, render_template, current_app
 
 from games.home import services
-from games.utilities import utilities
+from games.utilities import http_caching
 import games.adapters.repository as repo
 
 
@@ -10,16 +12,16 @@ home = Blueprint('home', __name__, static_folder='static', template_folder='temp
 
 @home.route('/', methods=['GET'])
 def home_home():
-    featuredGames = services.getFeaturedGames(repo.repo_instance)
-    genres = utilities.getAllGenresSorted(repo.repo_instance)
-    title_suggestions = utilities.getAllGames(repo.repo_instance)
-    publisher_suggestions = utilities.getPublishers(repo.repo_instance)
-
+    # The featured games are picked at random, a new window lets caches pick up a new selection
+    max_age = int(current_app.config.get('PAGE_CACHE_MAX_AGE', http_caching.DEFAULT_PAGE_MAX_AGE))
+    featured_window = int(time.time() // max(max_age, 1))
+    etag = http_caching.page_etag(repo.repo_instance.catalogue_version(), featured_window)
+    not_modified = http_caching.not_modified(etag)
+    if not_modified is not None:
+        return not_modified
 
+    featuredGames = services.getFeaturedGames(repo.repo_instance)
 
-    return render_template('home/home.html',
-                           featuredGames=featuredGames,
-                           genres=genres,
-                           title_suggestions=title_suggestions,
-                           publisher_suggestions=publisher_suggestions
-                           )
+    return http_caching.with_validators(render_template('home/home.html',
+                                                        featuredGames=featuredGames
+                                                        ), etag)
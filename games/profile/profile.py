@@ -1,5 +1,5 @@
 from games.authentication.authentication import login_required
-from games.utilities.utilities import paginateLists, getUser
+from games.utilities.utilities import getUser
 from flask import Blueprint, render_template, session, request
 import games.adapters.repository as repo
 
@@ -11,17 +11,15 @@ profile = Blueprint('profile', __name__, url_prefix='/profile', static_folder='s
 def profile_detail():
     username = session['username']
     user = repo.repo_instance.getUser(username)
-    reviews = repo.repo_instance.getAllReviews()
-    user_reviews = [review for review in reviews if review.user == user]
-    user_reviews = user_reviews[::-1]
+    review_count = repo.repo_instance.count_reviews_for_user(user.username)
     wishlist = repo.repo_instance.get_wishlist(user)
 
     per_page = 10
-    total_page = (len(user_reviews) // per_page) + 1 if len(user_reviews) % per_page != 0 else len(
-        user_reviews) // per_page
+    total_page = (review_count // per_page) + 1 if review_count % per_page != 0 else review_count // per_page
     page = min(max(request.args.get('page', 1, type=int), 1), total_page)
 
-    paginated_reviews = paginateLists(user_reviews, page, per_page)
+    paginated_reviews = repo.repo_instance.get_reviews_for_user(user.username, max(page - 1, 0) * per_page, per_page,
+                                                                {repo.LOAD_REVIEW_GAME})
 
     attributes = []
     if page < total_page:
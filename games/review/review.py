@@ -2,7 +2,7 @@ from flask import Blueprint, render_template, request, redirect, url_for, flash,
 
 from games.authentication.authentication import login_required
 from games.domainmodel.model import Review, User, Wishlist
-from games.utilities import utilities
+from games.utilities import utilities, fragment_cache
 import games.adapters.repository as repo
 from sqlalchemy.orm import sessionmaker
 
@@ -34,6 +34,8 @@ def submit_review():
         try:
             # Add the review to the repository
             repo.repo_instance.add_review(review)
+            # The game's cached details show its average rating
+            fragment_cache.invalidate_game(game_id)
 
             return render_template('review/review_confirmation.html',
                                    game_id=game_id,
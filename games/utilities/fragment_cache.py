@@ -0,0 +1,110 @@
+import sys
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+DEFAULT_FRAGMENT_CACHE_SIZE = 16 * 1024 * 1024
+
+# The process' fragment cache, set up by create_app. Fragments are rendered every time while it is None.
+cache_instance = None
+
+
+class FragmentCache:
+    """Rendered HTML fragments, shared by all threads of a process.
+
+    Entries are evicted least recently used first once together they take more than max_bytes of memory.
+    Every entry can be tagged with the ids of the games it shows, so that a write to one game drops only the
+    fragments of that game. Fragments are rendered outside the lock, like CatalogueCache loads its values.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_FRAGMENT_CACHE_SIZE):
+        self.__max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__keys_by_game = dict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+        self.__generation = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    def get(self, key, render, game_ids=()) -> str:
+        """Return the cached HTML for key, calling render() to fill it on a miss."""
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[0]
+            self.__misses += 1
+            generation = self.__generation
+
+        html = render()
+        size = sys.getsizeof(html)
+
+        with self.__lock:
+            # An invalidation while rendering means the fragment may already be stale, so it is not kept.
+            if generation == self.__generation and size <= self.__max_bytes and key not in self.__entries:
+                self.__entries[key] = (html, size, tuple(game_ids))
+                self.__bytes += size
+                for game_id in game_ids:
+                    self.__keys_by_game.setdefault(game_id, set()).add(key)
+                while self.__bytes > self.__max_bytes:
+                    self.__remove(next(iter(self.__entries)))
+                    self.__evictions += 1
+        return html
+
+    def invalidate_game(self, game_id: int):
+        """Drop the fragments tagged with the game."""
+        with self.__lock:
+            self.__generation += 1
+            for key in self.__keys_by_game.pop(game_id, ()):
+                self.__remove(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__generation += 1
+            self.__entries.clear()
+            self.__keys_by_game.clear()
+            self.__bytes = 0
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {
+                'hits': self.__hits,
+                'misses': self.__misses,
+                'evictions': self.__evictions,
+                'entries': len(self.__entries),
+                'bytes': self.__bytes,
+            }
+
+    def __remove(self, key):
+        # Only called with the lock held
+        entry = self.__entries.pop(key, None)
+        if entry is None:
+            return
+        html, size, game_ids = entry
+        self.__bytes -= size
+        for game_id in game_ids:
+            keys = self.__keys_by_game.get(game_id)
+            if keys is not None:
+                keys.discard(key)
+                if len(keys) == 0:
+                    del self.__keys_by_game[game_id]
+
+
+def get_fragment(key, render, game_ids=()) -> Markup:
+    """The HTML returned by render(), from the fragment cache when there is one and key is not None.
+
+    The key has to hold everything the fragment depends on, fragments must not show anything of the user
+    that is logged in.
+    """
+    if cache_instance is None or key is None:
+        return Markup(render())
+    return Markup(cache_instance.get(key, render, game_ids))
+
+
+def invalidate_game(game_id: int):
+    if cache_instance is not None:
+        cache_instance.invalidate_game(game_id)
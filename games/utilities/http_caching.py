@@ -0,0 +1,97 @@
+import hashlib
+import os
+from pathlib import Path
+
+from flask import current_app, make_response, request, session, url_for
+
+from games.adapters.snapshot import file_digest
+
+# Fingerprinted static URLs change whenever the file does, so they can be kept for a year
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+DEFAULT_PAGE_MAX_AGE = 60
+
+GAMES_PATH = Path(__file__).parent.parent
+
+_static_fingerprints = dict()
+_deploy_version = None
+
+
+def static_fingerprint(filename: str) -> str:
+    """Short hash of a file under games/static, worked out again only when the file's mtime or size change."""
+    path = Path(current_app.static_folder) / filename
+    stat = os.stat(path)
+    fingerprint = _static_fingerprints.get(filename)
+    if fingerprint is None or fingerprint[0] != (stat.st_mtime_ns, stat.st_size):
+        fingerprint = _static_fingerprints[filename] = ((stat.st_mtime_ns, stat.st_size), file_digest(path)[:12])
+    return fingerprint[1]
+
+
+def static_url(filename: str) -> str:
+    """URL of a static file carrying its fingerprint, for use in templates."""
+    return url_for('static', filename=filename, v=static_fingerprint(filename))
+
+
+def cache_static_files(response):
+    """after_request callback letting browsers and CDNs keep static files requested by their current fingerprint."""
+    if request.endpoint == 'static' and response.status_code in (200, 304) and 'v' in request.args:
+        try:
+            current = static_fingerprint(request.view_args['filename'])
+        except OSError:
+            return response
+        if request.args['v'] == current:
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+    return response
+
+
+def deploy_version() -> str:
+    """Hash of the templates and static files this process serves, so that a deploy changes every page ETag."""
+    global _deploy_version
+    if _deploy_version is None:
+        digest = hashlib.sha1()
+        for folder in (GAMES_PATH / 'templates', GAMES_PATH / 'static'):
+            for path in sorted(folder.rglob('*')):
+                if path.is_file():
+                    stat = path.stat()
+                    digest.update(f"{path.relative_to(GAMES_PATH)}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        _deploy_version = digest.hexdigest()
+    return _deploy_version
+
+
+def page_etag(*versions):
+    """ETag of a page from the versions of the data it shows and from who is looking at it.
+
+    None for a page with flashed messages waiting, those are shown once and must always be rendered.
+    """
+    if session.get('_flashes'):
+        return None
+    parts = (deploy_version(), session.get('username'), versions)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:20]
+
+
+def not_modified(etag):
+    """A 304 response when the request's If-None-Match holds etag, else None. Checked before any rendering."""
+    if etag is None or not request.if_none_match.contains_weak(etag):
+        return None
+    return with_validators(current_app.response_class(status=304), etag)
+
+
+def with_validators(response, etag):
+    """Add the ETag and Cache-Control to a page. Anonymous pages are the same for everyone and may be shared
+    by caches for PAGE_CACHE_MAX_AGE seconds, pages of a logged-in user are private and revalidated."""
+    response = make_response(response)
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    # Flask only adds this for non-empty sessions, but a shared cache must never hand an anonymous page to a
+    # logged-in user
+    response.vary.add('Cookie')
+    if 'username' in session:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = int(current_app.config.get('PAGE_CACHE_MAX_AGE', DEFAULT_PAGE_MAX_AGE))
+    return response
@@ -43,14 +43,22 @@ def calculate_average_rating(reviews):
     return round(average_rating, 1)
 
 
-def get_wishlist(repo: AbstractRepository, user: User):
-    if repo.get_wishlist(user) is None:
-        repo.add_wishlist(user, Wishlist(user))
-    return repo.get_wishlist(user)
+def get_average_rating(repo: AbstractRepository, game_id: int):
+    review_count, rating_total = repo.get_rating_summary(game_id)
+    if review_count == 0:
+        return "No Reviews Yet"
+    return round(rating_total / review_count, 1)
+
+
+def get_wishlist(repo: AbstractRepository, user: User, load_plan=None):
+    # A user without a wishlist gets an empty one that is not stored, it is only added to the repository
+    # when the first game is added to it.
+    wishlist = repo.get_wishlist(user, load_plan)
+    if wishlist is None:
+        return Wishlist(user)
+    return wishlist
 
 
 def is_game_in_wishlist(repo: AbstractRepository, user: User, game: Game):
-    if repo.get_wishlist(user) is None:
-        repo.add_wishlist(user, Wishlist(user))
     wishlist = repo.get_wishlist(user)
-    return game in wishlist.list_of_games()
+    return wishlist is not None and game in wishlist.list_of_games()
@@ -6,6 +6,10 @@ def add_wishlist(repo: AbstractRepository, user: User, wishlist: Wishlist):
     return repo.add_wishlist(user, wishlist)
 
 
+def add_game_to_wishlist(repo: AbstractRepository, user: User, game: Game):
+    return repo.add_game_to_wishlist(user, game)
+
+
 def remove_game_from_wishlist(repo: AbstractRepository, user: User, game: Game):
     return repo.remove_game_from_wishlist(user, game)
 
@@ -18,7 +18,7 @@ def view_wishlist():
     username = session['username']
     user = getUser(username, repo.repo_instance)
 
-    wishlist = get_wishlist(repo.repo_instance, user)
+    wishlist = get_wishlist(repo.repo_instance, user, repo.GAME_LISTING_PLAN)
     return render_template('wishlist/wishlist.html',
                            wishlist=wishlist.list_of_games())
 
@@ -36,14 +36,7 @@ def add_to_wishlist():
 
     game = getGameById(repo.repo_instance, game_id)
     if game is not None:
-        wishlist = get_wishlist(repo.repo_instance, user)
-        if not wishlist:
-            wishlist = Wishlist(user)
-        
-        if game not in wishlist.list_of_games():
-            wishlist.add_game(game)
-        
-        wishlist_services.add_wishlist(repo.repo_instance, user, wishlist)
+        wishlist_services.add_game_to_wishlist(repo.repo_instance, user, game)
 
     return jsonify({'result': 'success'})
 
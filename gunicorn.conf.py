@@ -0,0 +1,41 @@
+"""gunicorn configuration for serving the app in production: gunicorn -c gunicorn.conf.py wsgi:app"""
+import gc
+import multiprocessing
+from os import environ
+
+from config import Config
+
+bind = environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+
+# The memory repository keeps users, reviews and wishlists in the process that received the write, so every
+# worker would have its own copy of them. It is served by a single worker unless WEB_CONCURRENCY says otherwise.
+MEMORY_REPOSITORY = Config.REPOSITORY == 'memory'
+
+# Worker processes, each serving requests from several threads
+workers = int(environ.get('WEB_CONCURRENCY', 1 if MEMORY_REPOSITORY else multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(environ.get('GUNICORN_THREADS', 4))
+
+# create_app runs once, in the master process, and the workers are forked from it. With the memory repository
+# they share the loaded catalogue through copy-on-write instead of each reading the CSVs again. Only the
+# catalogue is shared: user data written after the fork stays in the worker that wrote it.
+preload_app = True
+
+
+def when_ready(server):
+    if MEMORY_REPOSITORY and workers > 1:
+        server.log.warning("%d workers serve the memory repository, each keeps its own users, reviews and "
+                           "wishlists. Use REPOSITORY = 'database' to share them between workers.", workers)
+
+
+def pre_fork(server, worker):
+    # Move everything loaded so far out of the garbage collector's generations, so that collections in the
+    # workers do not write to (and thereby copy) the pages holding the catalogue.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from games.adapters import repository
+    from games.adapters.database_repository import SqlAlchemyRepository
+    if isinstance(repository.repo_instance, SqlAlchemyRepository):
+        repository.repo_instance.dispose_inherited_connections()
@@ -1,12 +1,15 @@
 import pytest
 
 from games import create_app
-from games.adapters import memory_repository
+from games.adapters import memory_repository, password_hashing
 from games.adapters.memory_repository import MemoryRepository
 from games.adapters.repository_populate import populate
 
 from utils import get_project_root
 
+# cheap password hashes so that loading the test users does not dominate the test run
+password_hashing.password_hash_method = 'pbkdf2:sha256:1000'
+
 # the csv files in the test folder are different from the csv files in the covid/adapters/data folder!
 # tests are written against the csv files in tests, this data path is used to override default path for testing
 TEST_DATA_PATH = get_project_root() / "tests" / "data"
@@ -25,7 +28,10 @@ def client():
         'TESTING': True,                                # Set to True during testing.
         'TEST_DATA_PATH': TEST_DATA_PATH,               # Path for loading test data into the repository.
         'WTF_CSRF_ENABLED': False,                      # test_client will not send a CSRF token, so disable validation.
-        'REPOSITORY': 'memory'
+        'REPOSITORY': 'memory',
+        'CATALOGUE_SNAPSHOT': None,                     # Always read the test CSVs, and leave no files behind.
+        'PASSWORD_HASH_CACHE': None,
+        'COLUMNAR_STORE': None
     })
 
     return my_app.test_client()
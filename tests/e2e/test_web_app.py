@@ -73,6 +73,22 @@ def test_browse(client):
     assert b'Available Games' in response.data
 
 
+def test_suggest(client):
+    # Check that search suggestions are served as JSON instead of being inlined into every page.
+    response = client.get('/api/suggest?type=title&q=call%20of')
+    assert response.status_code == 200
+    assert response.json[0] == 'Call of Duty® 4: Modern Warfare®'
+    assert client.get('/api/suggest?type=developer&q=a').status_code == 400
+
+
+def test_stats(client):
+    # The memory repository has no connection pool or catalogue cache to report on, only the fragment cache
+    response = client.get('/api/stats')
+    assert response.status_code == 200
+    assert list(response.json) == ['fragment_cache']
+    assert b'Call of Duty' not in client.get('/').data
+
+
 def test_login_required_to_view_wishlist(client):
     # Check that we cannot retrieve the wishlist page as a guest user.
     # Should automatically redirect to the login page.
@@ -183,3 +199,80 @@ def test_e2e_remove_from_wishlist(client, auth):
     assert response.status_code == 200
     assert b'Call of Duty' not in response.data
 
+
+
+def test_game_details_are_rendered_once_per_review(client, auth):
+    client.get('/browse/details?id=7940')
+    client.get('/browse/details?id=7940')
+    stats = client.get('/api/stats').json['fragment_cache']
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+    auth.login()
+    client.post('/review/submit_review', data={'game_id': 7940, 'rating': 2, 'comment': 'Too short'})
+    response = client.get('/browse/details?id=7940')
+    assert b'2.0' in response.data
+    assert client.get('/api/stats').json['fragment_cache']['misses'] == 2
+
+
+def test_cached_game_details_keep_the_wishlist_button_per_user(client, auth):
+    assert b'Add to Wishlist' in client.get('/browse/details?id=7940').data
+    auth.login()
+    client.post('/wishlist/add_to_wishlist', data={'game_id': 7940})
+    response = client.get('/browse/details?id=7940')
+    assert b'Remove from Wishlist' in response.data
+    assert client.get('/api/stats').json['fragment_cache']['hits'] >= 1
+
+
+def test_browse_listing_is_cached_per_query_and_page(client):
+    first = client.get('/browse/?page=1')
+    assert client.get('/browse/?page=1').data == first.data
+    assert client.get('/browse/?page=2').data != first.data
+    # Rating filters depend on every review and are rendered each time
+    client.get('/browse/?minrating=3')
+    client.get('/browse/?minrating=3')
+    stats = client.get('/api/stats').json['fragment_cache']
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 2, 2)
+
+
+def test_game_details_answer_a_matching_etag_with_not_modified(client, auth):
+    response = client.get('/browse/details?id=7940')
+    etag = response.headers['ETag']
+    assert response.cache_control.public and response.cache_control.max_age == 60
+    assert 'Cookie' in response.vary
+
+    fragments = client.get('/api/stats').json['fragment_cache']
+    response = client.get('/browse/details?id=7940', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    # Nothing was rendered for the 304
+    assert client.get('/api/stats').json['fragment_cache'] == fragments
+
+    # A new review is a new version of the page, for a logged-in user it is private
+    auth.login()
+    client.post('/review/submit_review', data={'game_id': 7940, 'rating': 3, 'comment': 'Fine'})
+    response = client.get('/browse/details?id=7940', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.cache_control.private and response.cache_control.no_cache
+
+
+def test_home_and_browse_pages_have_validators(client):
+    for url in ['/', '/browse/?page=2']:
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    # Rating filters depend on every review and carry no ETag
+    assert 'ETag' not in client.get('/browse/?sort=rating').headers
+
+
+def test_static_files_are_fingerprinted_and_cached_long(client):
+    page = client.get('/').data.decode()
+    url = page[page.index('/static/css/styles.css?v='):].split('"')[0]
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.max_age == 365 * 24 * 60 * 60
+    assert response.cache_control.immutable
+    response.close()
+    # Without the current fingerprint the file is not kept
+    response = client.get('/static/css/styles.css?v=outdated')
+    assert response.cache_control.max_age != 365 * 24 * 60 * 60
+    response.close()
@@ -0,0 +1,68 @@
+import pytest
+
+from games.adapters.catalogue_cache import CatalogueCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_reads_through_and_counts_hits_and_misses():
+    cache = CatalogueCache()
+    loads = []
+    for _ in range(3):
+        assert cache.get('key', lambda: loads.append(1) or 'value') == 'value'
+    assert len(loads) == 1
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 0, 'entries': 1}
+
+
+def test_cache_does_not_keep_none():
+    cache = CatalogueCache()
+    assert cache.get('missing', lambda: None) is None
+    assert cache.get('missing', lambda: 'found') == 'found'
+
+
+def test_cache_evicts_least_recently_used():
+    cache = CatalogueCache(max_entries=2)
+    cache.get('a', lambda: 1)
+    cache.get('b', lambda: 2)
+    cache.get('a', lambda: 1)
+    cache.get('c', lambda: 3)
+    assert cache.get('a', lambda: 'reloaded') == 1
+    assert cache.get('b', lambda: 'reloaded') == 'reloaded'
+    assert cache.stats()['evictions'] == 2
+
+
+def test_cache_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = CatalogueCache(ttl=10, clock=clock)
+    cache.get('key', lambda: 'old')
+    clock.now = 9
+    assert cache.get('key', lambda: 'new') == 'old'
+    clock.now = 11
+    assert cache.get('key', lambda: 'new') == 'new'
+
+
+def test_cache_invalidation():
+    cache = CatalogueCache()
+    cache.get('a', lambda: 1)
+    cache.get('b', lambda: 2)
+    cache.invalidate('a')
+    assert cache.get('a', lambda: 'reloaded') == 'reloaded'
+    assert cache.get('b', lambda: 'reloaded') == 2
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0
+
+
+def test_cache_does_not_keep_values_loaded_across_an_invalidation():
+    cache = CatalogueCache()
+
+    def load_while_invalidated():
+        cache.invalidate()
+        return 'stale'
+    assert cache.get('key', load_while_invalidated) == 'stale'
+    assert cache.get('key', lambda: 'fresh') == 'fresh'
@@ -0,0 +1,116 @@
+import pytest
+import csv
+import shutil
+
+from games.adapters.columnar_repository import ColumnarMemoryRepository
+from games.adapters.columnar_store import ColumnarGameStore, is_store_current
+from games.adapters.memory_repository import MemoryRepository
+from games.adapters.repository import RepositoryException
+from games.adapters.repository_populate import populate
+from games.domainmodel.model import Genre, Game, Review, User
+
+from utils import get_project_root
+
+TEST_DATA_PATH = get_project_root() / "tests" / "data"
+
+
+@pytest.fixture
+def columnar_repo(tmp_path):
+    repo = ColumnarMemoryRepository(tmp_path / "catalogue.columns")
+    populate(TEST_DATA_PATH, repo, False)
+    return repo
+
+
+def game_fields(game):
+    return (game.game_id, game.title, game.price, game.release_date, game.description, game.image_url,
+            game.website_url, game.isWindows, game.isMac, game.isLinux, game.publisher, game.genres)
+
+
+def test_columnar_repository_matches_memory_repository(repo, columnar_repo):
+    assert [game_fields(game) for game in columnar_repo.getAllGames()] == \
+           [game_fields(game) for game in repo.getAllGames()]
+    assert sorted(columnar_repo.getAllGenres()) == sorted(repo.getAllGenres())
+    assert sorted(columnar_repo.getAllPublishers()) == sorted(repo.getAllPublishers())
+    assert game_fields(columnar_repo.getGameById(7940)) == game_fields(repo.getGameById(7940))
+    assert columnar_repo.getGameById(1) is None
+    genres = [Genre("Action"), Genre("Indie")]
+    assert list(columnar_repo.getGamesByGenres(genres)) == repo.getGamesByGenres(genres)
+    assert len(columnar_repo.getAllUsers()) == len(repo.getAllUsers())
+
+
+@pytest.mark.parametrize("arguments", [
+    dict(),
+    dict(title="of", offset=5, limit=10),
+    dict(genres=[Genre("Adventure")], publisher="a"),
+    dict(genre_terms=["action", "indie"]),
+    dict(text="zombie"),
+    dict(text="space", genre_terms=["action"]),
+    dict(min_rating=3, sort_by_rating=True),
+])
+def test_columnar_search_games_matches_memory_repository(repo, columnar_repo, arguments):
+    for repository in (repo, columnar_repo):
+        user = repository.getUser("thorke")
+        repository.add_review(Review(user, repository.getGameById(7940), 5, "Great"))
+        repository.add_review(Review(user, repository.getGameById(435790), 2, "Meh"))
+    games, total = columnar_repo.search_games(**arguments)
+    expected_games, expected_total = repo.search_games(**arguments)
+    assert total == expected_total
+    assert games == expected_games
+
+
+def test_columnar_catalogue_is_read_only(columnar_repo):
+    with pytest.raises(RepositoryException):
+        columnar_repo.add_game(Game(1, "Domino Game"))
+    with pytest.raises(RepositoryException):
+        columnar_repo.add_genre(Genre("Domino"))
+
+
+def test_columnar_store_is_rebuilt_when_csv_changes(tmp_path):
+    data_path = tmp_path / "data"
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    store_path = tmp_path / "catalogue.columns"
+    repo = ColumnarMemoryRepository(store_path)
+    populate(data_path, repo, False)
+    game_count = len(repo.getAllGames())
+    assert is_store_current(store_path, data_path / "games.csv")
+
+    with open(data_path / "games.csv", "r", encoding="utf-8-sig", newline="") as file:
+        rows = list(csv.reader(file))
+    with open(data_path / "games.csv", "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(rows[:-1])
+    assert not is_store_current(store_path, data_path / "games.csv")
+    repo = ColumnarMemoryRepository(store_path)
+    populate(data_path, repo, False)
+    assert len(repo.getAllGames()) == game_count - 1
+
+
+def test_columnar_store_builds_games_lazily(columnar_repo, tmp_path):
+    store = ColumnarGameStore(tmp_path / "catalogue.columns")
+    games = store.games()
+    assert games[0] is not games[0]
+    assert games[0] == games[0]
+    assert store.genres[0] is store.genres[0]
+    del games
+    store.close()
+
+
+def test_columnar_reload_catalogue_keeps_the_previous_store_readable(tmp_path):
+    data_path = tmp_path / "data"
+    shutil.copytree(TEST_DATA_PATH, data_path)
+    repo = ColumnarMemoryRepository(tmp_path / "catalogue.columns")
+    populate(data_path, repo, False)
+    games_before = repo.getAllGames()
+    assert repo.search_games(text="dominoquest")[1] == 0
+
+    with open(data_path / "games.csv", "r", encoding="utf-8-sig", newline="") as file:
+        rows = list(csv.reader(file))
+    rows[1][1] = "Dominoquest Deluxe"
+    with open(data_path / "games.csv", "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(rows[:-1])
+    previous = repo.reload_catalogue(data_path)
+
+    assert len(repo.getAllGames()) == len(games_before) - 1
+    assert repo.search_games(text="dominoquest")[0][0].title == "Dominoquest Deluxe"
+    # The old mapping still reads the games as they were
+    assert games_before[0].title != "Dominoquest Deluxe"
+    assert len(games_before) == len(previous)
@@ -1,14 +1,21 @@
 import pytest
 import os
 
-from games.adapters.datareader.csvdatareader import GameFileCSVReader
+from werkzeug.security import check_password_hash
+
+from games.adapters.datareader import csvdatareader
+from games.adapters.datareader.csvdatareader import GameFileCSVReader, ParallelGameFileCSVReader, UserFileCSVReader
+from games.adapters.password_hashing import hash_password, hash_passwords
 from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
 
 # Unit tests for CSVReader
-def create_csv_reader():
+def reader_file_name():
     dir_name = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    games_file_name = os.path.join(dir_name, "games/adapters/data/games.csv")
-    reader = GameFileCSVReader(games_file_name)
+    return os.path.join(dir_name, "games/adapters/data/games.csv")
+
+
+def create_csv_reader():
+    reader = GameFileCSVReader(reader_file_name())
     reader.read_csv_file()
     return reader
 
@@ -52,3 +59,113 @@ def test_genres_dataset():
     sorted_genres = sorted(genres_set)
     sorted_genre_sample = str(sorted_genres[:3])
     assert sorted_genre_sample == "[<Genre Action>, <Genre Adventure>, <Genre Animation & Modeling>]"
+
+
+def test_iter_games_matches_read_csv_file():
+    reader = create_csv_reader()
+    streamed = list(GameFileCSVReader(reader_file_name()).iter_games())
+    assert [game.game_id for game in streamed] == [game.game_id for game in reader.dataset_of_games]
+    assert streamed[0].genres == reader.dataset_of_games[0].genres
+    assert streamed[0].publisher == reader.dataset_of_games[0].publisher
+    assert streamed[0].description == reader.dataset_of_games[0].description
+
+
+def test_iter_game_batches():
+    batches = list(GameFileCSVReader(reader_file_name()).iter_game_batches(100))
+    assert [len(batch) for batch in batches] == [100] * 8 + [77]
+
+
+def test_iter_games_memory_stays_flat(tmp_path):
+    import csv
+    import tracemalloc
+
+    def peak_memory(row_count):
+        file_name = tmp_path / f"games_{row_count}.csv"
+        with open(file_name, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(GameFileCSVReader.COLUMNS)
+            for game_id in range(row_count):
+                writer.writerow([game_id, f"Game {game_id}", "Oct 21, 2008", "9.99", "About " * 50, "",
+                                 "TRUE", "FALSE", "FALSE", f"Publisher {game_id % 50}", "Action,Indie"])
+        tracemalloc.start()
+        count = sum(1 for _ in GameFileCSVReader(str(file_name)).iter_games())
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        assert count == row_count
+        return peak
+
+    small = peak_memory(1000)
+    large = peak_memory(20000)
+    assert large < small * 2
+
+
+def test_parallel_reader_matches_serial_reader():
+    reader = create_csv_reader()
+    parallel_reader = ParallelGameFileCSVReader(reader_file_name(), workers=2, chunk_size=64 * 1024)
+    parallel_reader.read_csv_file()
+    assert len(ParallelGameFileCSVReader.record_chunks(reader_file_name(), 0, 64 * 1024)) > 2
+    assert [game.game_id for game in parallel_reader.dataset_of_games] == \
+           [game.game_id for game in reader.dataset_of_games]
+    assert [game.description for game in parallel_reader.dataset_of_games] == \
+           [game.description for game in reader.dataset_of_games]
+    assert parallel_reader.dataset_of_genres == reader.dataset_of_genres
+    assert parallel_reader.dataset_of_publishers == reader.dataset_of_publishers
+
+
+def write_users_csv(path, rows):
+    path.write_text("user_id,username,password\n" + "".join(f"{i},{u},{p}\n" for i, (u, p) in enumerate(rows, 1)),
+                    encoding="utf-8")
+    return str(path)
+
+
+def test_user_reader_keeps_prehashed_passwords(tmp_path):
+    password_hash = hash_password("Password123")
+    reader = UserFileCSVReader(write_users_csv(tmp_path / "users.csv", [("alice", password_hash)]))
+    reader.read_csv_file()
+    assert reader.dataset_of_users[0].password == password_hash
+    assert check_password_hash(reader.dataset_of_users[0].password, "Password123")
+
+
+def test_user_reader_reuses_hash_cache(tmp_path, monkeypatch):
+    filename = write_users_csv(tmp_path / "users.csv", [("alice", "Password123"), ("bob", "Secret4567")])
+    cache_filename = str(tmp_path / "password_hashes.json")
+    first = UserFileCSVReader(filename, cache_filename)
+    first.read_csv_file()
+
+    # the second read has every hash in the cache, so nothing is hashed again
+    monkeypatch.setattr(csvdatareader, "hash_passwords", lambda passwords, *args: [None for _ in passwords])
+    second = UserFileCSVReader(filename, cache_filename)
+    second.read_csv_file()
+    assert [user.password for user in second.dataset_of_users] == [user.password for user in first.dataset_of_users]
+    assert check_password_hash(second.dataset_of_users[1].password, "Secret4567")
+
+
+def test_hash_passwords_in_parallel():
+    passwords = [f"Password{i}" for i in range(20)]
+    hashes = hash_passwords(passwords, workers=2)
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+
+
+def test_games_share_genre_and_publisher_instances():
+    games = list(GameFileCSVReader(reader_file_name()).iter_games())
+    genres = {}
+    publishers = {}
+    for game in games:
+        for genre in game.genres:
+            assert genres.setdefault(genre.genre_name, genre) is genre
+        assert publishers.setdefault(game.publisher.publisher_name, game.publisher) is game.publisher
+    assert len(genres) == 24
+
+
+def test_parallel_games_share_genre_instances():
+    games = list(ParallelGameFileCSVReader(reader_file_name(), workers=2, chunk_size=64 * 1024).iter_games())
+    genres = {}
+    for game in games:
+        for genre in game.genres:
+            assert genres.setdefault(genre.genre_name, genre) is genre
+
+
+def test_games_read_from_csv_have_no_instance_dict():
+    game = next(GameFileCSVReader(reader_file_name()).iter_games())
+    assert game.__dict__ == {}
+    assert game.publisher.__dict__ == {}
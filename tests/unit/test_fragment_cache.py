@@ -0,0 +1,55 @@
+import sys
+
+from games.utilities.fragment_cache import FragmentCache
+
+
+def test_fragment_cache_renders_once_and_counts_bytes():
+    cache = FragmentCache()
+    renders = []
+    for _ in range(3):
+        assert cache.get('key', lambda: renders.append(1) or '<p>game</p>') == '<p>game</p>'
+    assert len(renders) == 1
+    assert cache.stats() == {'hits': 2, 'misses': 1, 'evictions': 0, 'entries': 1,
+                             'bytes': sys.getsizeof('<p>game</p>')}
+
+
+def test_fragment_cache_evicts_least_recently_used_over_its_memory_cap():
+    html = 'x' * 1000
+    cache = FragmentCache(max_bytes=2 * sys.getsizeof(html))
+    cache.get('a', lambda: html)
+    cache.get('b', lambda: html)
+    cache.get('a', lambda: html)
+    cache.get('c', lambda: html)
+    assert cache.get('a', lambda: 'rendered again') == html
+    assert cache.get('b', lambda: 'rendered again') == 'rendered again'
+    assert cache.stats()['bytes'] <= 2 * sys.getsizeof(html)
+
+
+def test_fragment_cache_does_not_keep_fragments_over_its_memory_cap():
+    cache = FragmentCache(max_bytes=100)
+    cache.get('small', lambda: 'small')
+    assert cache.get('large', lambda: 'x' * 1000) == 'x' * 1000
+    assert cache.stats()['entries'] == 1
+
+
+def test_fragment_cache_invalidates_only_the_given_game():
+    cache = FragmentCache()
+    cache.get(('details', 1), lambda: 'game 1', game_ids=(1,))
+    cache.get(('details', 2), lambda: 'game 2', game_ids=(2,))
+    cache.get(('listing', 1), lambda: 'games 1 and 2', game_ids=(1, 2))
+    cache.invalidate_game(1)
+    assert cache.get(('details', 1), lambda: 'rendered again') == 'rendered again'
+    assert cache.get(('listing', 1), lambda: 'rendered again') == 'rendered again'
+    assert cache.get(('details', 2), lambda: 'rendered again') == 'game 2'
+    cache.clear()
+    assert cache.stats()['entries'] == 0 and cache.stats()['bytes'] == 0
+
+
+def test_fragment_cache_does_not_keep_fragments_rendered_across_an_invalidation():
+    cache = FragmentCache()
+
+    def render_while_invalidated():
+        cache.invalidate_game(1)
+        return 'stale'
+    assert cache.get('key', render_while_invalidated, game_ids=(1,)) == 'stale'
+    assert cache.get('key', lambda: 'fresh') == 'fresh'
@@ -1,12 +1,24 @@
 import pytest
+import csv
+import gc
 import os
+import shutil
+import threading
+import time
+import weakref
 from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
 
 from pathlib import Path
+from games.adapters.catalogue_reload import CatalogueReloader
+from games.adapters import memory_repository
 from games.adapters.memory_repository import MemoryRepository
+from games.adapters import repository_populate
 from games.adapters.repository_populate import populate
+from games.adapters.snapshot import read_snapshot
 import games.adapters.repository as rp
 
+from utils import get_project_root
+
 
 @pytest.fixture
 def user():
@@ -33,6 +45,17 @@ def test_repository_can_populate():
     assert len(rp.repo_instance.getAllGames()) == 877
 
 
+def test_repository_can_bulk_load(game, user):
+    # Check if games, genres, publishers and users can be added in one call
+    repo = MemoryRepository()
+    stats = repo.bulk_load([game], [Genre("Action")], [Publisher("Activision")], [user])
+    assert stats['rows'] == 4
+    assert repo.getGameById(1) == game
+    assert repo.getAllGenres() == [Genre("Action")]
+    assert repo.getAllPublishers() == [Publisher("Activision")]
+    assert repo.getUser("shyamli") == user
+
+
 def test_repository_can_add_a_game(game):
     # Check if the game can be added to the repository
     rp.repo_instance = MemoryRepository()
@@ -61,6 +84,79 @@ def test_repository_can_get_games_by_genres(repo):
         assert Genre("Action") in game.genres
 
 
+def test_repository_get_games_by_genres_is_a_stable_union(repo):
+    # Check that a multi-genre query returns every game in any of the genres, ordered by game id
+    games = repo.getGamesByGenres([Genre("Action"), Genre("Indie")])
+    assert len(games) == len(set(games))
+    for game in games:
+        assert Genre("Action") in game.genres or Genre("Indie") in game.genres
+    expected = [game for game in repo.getAllGames() if Genre("Action") in game.genres or Genre("Indie") in game.genres]
+    assert games == sorted(expected)
+    assert games == repo.getGamesByGenres([Genre("Indie"), Genre("Action")])
+
+
+def test_repository_search_games(repo):
+    # Check if the repository can filter, count and paginate games in one call
+    games, total = repo.search_games(title="z")
+    assert total == 56
+    assert [game.game_id for game in games] == sorted(game.game_id for game in games)
+    games, total = repo.search_games(genre_terms=["action", "adventure"], offset=10, limit=10)
+    assert total == 170
+    assert len(games) == 10
+    for game in games:
+        assert Genre("Action") in game.genres and Genre("Adventure") in game.genres
+    games, total = repo.search_games(genres=[Genre("Action"), Genre("Adventure")], limit=10)
+    assert total == 554
+    games, total = repo.search_games(publisher="valve", title="half")
+    for game in games:
+        assert "valve" in game.publisher.publisher_name.lower() and "half" in game.title.lower()
+    assert repo.search_games(title="no such game") == ([], 0)
+
+
+def test_repository_full_text_search(repo):
+    # Check if games can be found by prefixes of words in their title or description, best match first
+    games, total = repo.search_games(text="call of dut")
+    assert total == 1
+    assert games[0].game_id == 7940
+    games, total = repo.search_games(text="zombie")
+    assert total == 22
+    assert "zombie" in games[0].title.lower()
+    games, total = repo.search_games(text="zombie", genres=[Genre("Action")], limit=5)
+    assert len(games) == 5
+    for game in games:
+        assert Genre("Action") in game.genres
+    assert repo.search_games(text="zzzzqqq") == ([], 0)
+
+
+def test_repository_full_text_search_indexes_new_games():
+    # Check if games added after loading are searchable straight away
+    repo = MemoryRepository()
+    game = Game(1, "Domino Game")
+    game.description = "Knock over thousands of dominoes"
+    repo.add_game(game)
+    assert repo.search_games(text="domin") == ([game], 1)
+    assert repo.search_games(text="thousand domino") == ([game], 1)
+
+
+def test_repository_catalogue_version_changes_with_the_catalogue(game, user):
+    repo = MemoryRepository()
+    version = repo.catalogue_version()
+    repo.add_game(game)
+    assert repo.catalogue_version() > version
+    version = repo.catalogue_version()
+    repo.addUser(user)
+    repo.add_review(Review(user, game, 4, "Great"))
+    assert repo.catalogue_version() == version
+
+
+def test_repository_catalogue_version_is_not_reused_after_a_restart(game):
+    repo = MemoryRepository()
+    repo.add_game(game)
+    time.sleep(0.01)
+    # The app started again, e.g. with a different games.csv
+    assert MemoryRepository().catalogue_version() > repo.catalogue_version()
+
+
 def test_repository_can_add_a_genre():
     # Check if the genre can be added to the repository
     rp.repo_instance = MemoryRepository()
@@ -112,6 +208,33 @@ def test_repository_get_all_reviews(user):
     assert rp.repo_instance.getAllReviews()[0].comment == "This is a review1"
 
 
+def test_repository_get_reviews_for_a_game_and_a_user(repo, user):
+    # Check if the repository can page through the reviews of one game and of one user, newest first
+    game = repo.getGameById(7940)
+    other_game = repo.getGameById(1436990)
+    for i in range(3):
+        repo.add_review(Review(user, game, i, f"Review {i}"))
+    repo.add_review(Review(user, other_game, 5, "Other Review"))
+
+    assert repo.count_reviews_for_game(7940) == 3
+    assert [review.comment for review in repo.get_reviews_for_game(7940)] == ["Review 2", "Review 1", "Review 0"]
+    assert [review.comment for review in repo.get_reviews_for_game(7940, 1, 1)] == ["Review 1"]
+    assert repo.get_reviews_for_game(7940, 3, 5) == []
+    assert repo.count_reviews_for_user("shyamli") == 4
+    assert [review.comment for review in repo.get_reviews_for_user("shyamli", 0, 2)] == ["Other Review", "Review 2"]
+    assert repo.get_reviews_for_user("nobody") == []
+
+
+def test_repository_maintains_rating_summaries(repo, user):
+    # Check if the review count and rating total of a game are kept up to date by add_review
+    assert repo.get_rating_summary(7940) == (0, 0)
+    repo.add_review(Review(user, repo.getGameById(7940), 5, "Review 1"))
+    repo.add_review(Review(user, repo.getGameById(7940), 2, "Review 2"))
+    repo.add_review(Review(user, repo.getGameById(7940), 2, "Review 2"))
+    assert repo.get_rating_summary(7940) == (2, 7)
+    assert repo.get_rating_summaries() == {7940: (2, 7)}
+
+
 def test_repository_get_wishlist_of_a_user(user, wishlist):
     # Check if the repository can retrieve the wishlist of a user
     rp.repo_instance = MemoryRepository()
@@ -181,3 +304,284 @@ def test_repository_get_all_users(repo, user):
     repo.addUser(User("AaronChiam", "password"))
     assert len(repo.getAllUsers()) == 4
     assert repo.getAllUsers()[2].username == "shyamli"
+
+
+def test_repository_lookups_stay_flat_as_catalogue_grows():
+    # Check that game and user lookups do not slow down with the number of games in the repository
+    import time
+
+    def time_lookups(game_count):
+        repo = MemoryRepository()
+        for game_id in range(game_count):
+            repo.add_game(Game(game_id, f"Game {game_id}"))
+            repo.add_genre(Genre(f"Genre {game_id % 50}"))
+            repo.add_publisher(Publisher(f"Publisher {game_id % 1000}"))
+        repo.addUser(User("Shyamli", "pw12345"))
+        assert len(repo.getAllGames()) == game_count
+        start = time.perf_counter()
+        for _ in range(20):
+            for game_id in range(game_count - 1000, game_count):
+                assert repo.getGameById(game_id).game_id == game_id
+            assert repo.getUser("shyamli") is not None
+        return time.perf_counter() - start
+
+    small = time_lookups(1000)
+    large = time_lookups(100000)
+    # A linear scan would be ~100 times slower on the large repository, leave plenty of room for timing noise.
+    assert large < small * 10
+
+
+def test_populate_loads_catalogue_from_snapshot(tmp_path, monkeypatch):
+    data_path = get_project_root() / "tests" / "data"
+    snapshot_path = tmp_path / "catalogue.snapshot"
+    cold = MemoryRepository()
+    populate(data_path, cold, False, snapshot_path=snapshot_path)
+    assert snapshot_path.exists()
+
+    # the second start never parses games.csv
+    monkeypatch.setattr(repository_populate, "stream_gamedata", lambda *args: pytest.fail("games.csv was parsed"))
+    warm = MemoryRepository()
+    populate(data_path, warm, False, snapshot_path=snapshot_path)
+    assert [game.game_id for game in warm.getAllGames()] == [game.game_id for game in cold.getAllGames()]
+    assert len(warm.getAllGenres()) == len(cold.getAllGenres())
+    assert len(warm.getAllUsers()) == len(cold.getAllUsers())
+    assert warm.search_games(text="modern warf")[1] == cold.search_games(text="modern warf")[1]
+    assert warm.getGamesByGenres([Genre("Action")]) == cold.getGamesByGenres([Genre("Action")])
+
+
+def test_snapshot_is_rebuilt_when_csv_changes(tmp_path):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    snapshot_path = tmp_path / "catalogue.snapshot"
+    original = MemoryRepository()
+    populate(data_path, original, False, snapshot_path=snapshot_path)
+
+    with open(data_path / "games.csv", "r", encoding="utf-8-sig", newline="") as file:
+        rows = list(csv.reader(file))
+    with open(data_path / "games.csv", "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(rows[:-1])
+    repo = MemoryRepository()
+    populate(data_path, repo, False, snapshot_path=snapshot_path)
+    assert len(repo.getAllGames()) == len(original.getAllGames()) - 1
+    assert read_snapshot(snapshot_path, data_path / "games.csv")['games'][-1] == repo.getAllGames()[-1]
+
+
+def test_repository_adds_a_game_to_a_new_wishlist(user):
+    repo = MemoryRepository()
+    game = Game(1, "Domino Game")
+    repo.add_game_to_wishlist(user, game)
+    repo.add_game_to_wishlist(user, game)
+    assert repo.get_wishlist(user).list_of_games() == [game]
+
+
+class YieldingUser(User):
+    # Hands the GIL to another thread on every hash, i.e. in the middle of every dict and lock lookup by user
+    def __hash__(self):
+        time.sleep(0)
+        return super().__hash__()
+
+
+class YieldingReview(Review):
+    # Hands the GIL to another thread in the middle of adding the rating to the game's summary
+    @property
+    def rating(self) -> int:
+        time.sleep(0)
+        return super().rating
+
+
+def test_repository_concurrent_writes_lose_no_updates():
+    repo = MemoryRepository()
+    games = [Game(game_id, f"Game {game_id}") for game_id in range(10)]
+    users = [YieldingUser(f"user{number}", "pw12345") for number in range(8)]
+    shared_user = YieldingUser("shared", "pw12345")
+    repo.bulk_load(games, [], [], users + [shared_user])
+    reviews_per_thread = 500
+    start = threading.Barrier(len(users))
+
+    def write(user: User):
+        start.wait()
+        # Everyone adds a game of their own to the shared wishlist, which none of them has created yet
+        repo.add_game_to_wishlist(shared_user, games[users.index(user)])
+        for number in range(reviews_per_thread):
+            game = games[number % len(games)]
+            repo.add_review(YieldingReview(user, game, number % 6, f"{user.username} {number}"))
+            # Their own wishlist gets every game added and the odd ones removed again
+            repo.add_game_to_wishlist(user, game)
+            if game.game_id % 2 == 1:
+                repo.remove_game_from_wishlist(user, game)
+            if number % 10 == 0:
+                repo.addUser(User(f"{user.username}new{number}", "pw12345"))
+        # Games the catalogue gains while the others are reading and writing
+        repo.add_game(Game(1000 + users.index(user), "Late Game"))
+
+    threads = [threading.Thread(target=write, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    review_count = len(users) * reviews_per_thread
+    assert len(repo.getAllReviews()) == review_count
+    for game in games:
+        ratings = [review.rating for review in repo.getAllReviews() if review.game == game]
+        assert repo.count_reviews_for_game(game.game_id) == review_count // len(games)
+        assert repo.get_rating_summary(game.game_id) == (len(ratings), sum(ratings))
+    for user in users:
+        assert repo.count_reviews_for_user(user.username) == reviews_per_thread
+        assert repo.get_wishlist(user).list_of_games() == [game for game in games if game.game_id % 2 == 0]
+    assert sorted(repo.get_wishlist(shared_user).list_of_games(), key=lambda game: game.game_id) == games[:len(users)]
+    assert len(repo.getAllUsers()) == len(users) + 1 + len(users) * reviews_per_thread // 10
+    assert len(repo.getAllGames()) == len(games) + len(users)
+
+
+
+def retitle_first_game_and_drop_last(games_filename, title):
+    with open(games_filename, "r", encoding="utf-8-sig", newline="") as file:
+        rows = list(csv.reader(file))
+    rows[1][1] = title
+    with open(games_filename, "w", encoding="utf-8", newline="") as file:
+        csv.writer(file).writerows(rows[:-1])
+
+
+def test_repository_reload_catalogue_keeps_user_data(tmp_path, user):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    repo = MemoryRepository()
+    populate(data_path, repo, False)
+    repo.addUser(user)
+    first_game, last_game = repo.getAllGames()[0], repo.getAllGames()[-1]
+    repo.add_review(Review(user, first_game, 4, "Great"))
+    repo.add_review(Review(user, last_game, 2, "Gone soon"))
+    repo.add_game_to_wishlist(user, first_game)
+    repo.add_game_to_wishlist(user, last_game)
+    # A request that is in the middle of reading the catalogue
+    games_before = repo.getAllGames()
+
+    retitle_first_game_and_drop_last(data_path / "games.csv", "Dominoquest Deluxe")
+    repo.reload_catalogue(data_path)
+
+    assert repo.getGameById(first_game.game_id).title == "Dominoquest Deluxe"
+    assert repo.getGameById(last_game.game_id) is None
+    assert len(repo.getAllGames()) == len(games_before) - 1
+    assert repo.search_games(text="dominoquest")[0][0].game_id == first_game.game_id
+    assert games_before[0].title != "Dominoquest Deluxe" and games_before[-1] == last_game
+    assert repo.getUser(user.username) is user
+    assert repo.count_reviews_for_game(first_game.game_id) == 1
+    assert repo.get_rating_summary(first_game.game_id) == (1, 4)
+    # Reviews and wishlists show the reloaded games, those of the game that is gone are dropped
+    reviews = repo.get_reviews_for_user(user.username)
+    assert [review.game.title for review in reviews] == ["Dominoquest Deluxe"]
+    assert reviews[0].game is repo.getGameById(first_game.game_id)
+    assert [review.game.title for review in repo.getAllReviews()] == ["Dominoquest Deluxe"]
+    assert repo.count_reviews_for_game(last_game.game_id) == 0
+    assert repo.get_rating_summary(last_game.game_id) == (0, 0)
+    assert [game.title for game in repo.get_wishlist(user).list_of_games()] == ["Dominoquest Deluxe"]
+    assert repo.get_wishlist(user).list_of_games()[0] is repo.getGameById(first_game.game_id)
+
+
+def test_repository_points_late_user_writes_at_the_reloaded_games(tmp_path, user):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    repo = MemoryRepository()
+    populate(data_path, repo, False)
+    repo.addUser(user)
+    # Read by a request before the reload, written after it
+    first_game = repo.getAllGames()[0]
+    retitle_first_game_and_drop_last(data_path / "games.csv", "Dominoquest Deluxe")
+    repo.reload_catalogue(data_path)
+
+    repo.add_review(Review(user, first_game, 5, "Late"))
+    repo.add_game_to_wishlist(user, first_game)
+    assert repo.get_reviews_for_game(first_game.game_id)[0].game.title == "Dominoquest Deluxe"
+    assert repo.get_wishlist(user).list_of_games()[0].title == "Dominoquest Deluxe"
+
+    # Nothing of the user data keeps the replaced games alive
+    replaced_game = weakref.ref(first_game)
+    del first_game
+    gc.collect()
+    assert replaced_game() is None
+
+
+def test_repository_serves_reads_during_a_reload(tmp_path):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    repo = MemoryRepository()
+    populate(data_path, repo, False)
+    game_count = len(repo.getAllGames())
+    retitle_first_game_and_drop_last(data_path / "games.csv", "Dominoquest Deluxe")
+    reloading = True
+    failures = []
+
+    def read():
+        while reloading:
+            try:
+                # Every read sees either the whole old or the whole new catalogue
+                games, total = repo.search_games(limit=5)
+                assert total in (game_count, game_count - 1) and len(repo.getAllGames()) in (game_count, game_count - 1)
+                assert repo.getGameById(games[0].game_id) is not None
+            except Exception as e:
+                failures.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    repo.reload_catalogue(data_path)
+    reloading = False
+    for reader in readers:
+        reader.join()
+    assert failures == []
+    assert len(repo.getAllGames()) == game_count - 1
+
+
+def test_repository_reload_keeps_games_added_during_it(tmp_path, monkeypatch):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    repo = MemoryRepository()
+    populate(data_path, repo, False)
+    retitle_first_game_and_drop_last(data_path / "games.csv", "Dominoquest Deluxe")
+    late_game = Game(99999999, "Zyxquor Arrival")
+    late_game.add_genre(Genre("Late Genre"))
+    read_games = memory_repository.stream_gamedata
+
+    def stream_gamedata(*args):
+        for number, game in enumerate(read_games(*args)):
+            if number == 2:
+                # A write from a request while the new catalogue is being built, not yet published
+                repo.add_game(late_game)
+                repo.add_genre(Genre("Late Genre"))
+                repo.add_publisher(Publisher("Late Publisher"))
+            yield game
+
+    monkeypatch.setattr(memory_repository, "stream_gamedata", stream_gamedata)
+    repo.reload_catalogue(data_path)
+
+    assert repo.getAllGames()[0].title == "Dominoquest Deluxe"
+    assert repo.getGameById(late_game.game_id) is late_game
+    assert repo.search_games(text="zyxquor")[0] == [late_game]
+    assert repo.getGamesByGenres([Genre("Late Genre")]) == [late_game]
+    assert Genre("Late Genre") in repo.getAllGenres()
+    assert Publisher("Late Publisher") in repo.getAllPublishers()
+
+    # Only the writes made during a reload are carried over to it
+    monkeypatch.setattr(memory_repository, "stream_gamedata", read_games)
+    repo.reload_catalogue(data_path)
+    assert repo.getGameById(late_game.game_id) is None
+
+
+def test_catalogue_reloader_picks_up_a_changed_csv(tmp_path):
+    data_path = tmp_path / "data"
+    shutil.copytree(get_project_root() / "tests" / "data", data_path)
+    snapshot_path = tmp_path / "catalogue.snapshot"
+    repo = MemoryRepository()
+    populate(data_path, repo, False, snapshot_path=snapshot_path)
+    reloader = CatalogueReloader(repo, data_path, interval=60, snapshot_path=snapshot_path)
+    assert not reloader.check()
+
+    retitle_first_game_and_drop_last(data_path / "games.csv", "Dominoquest Deluxe")
+    # Only reloaded once the file has stopped changing
+    assert not reloader.check()
+    assert reloader.check()
+    assert not reloader.check()
+    assert reloader.reloads == 1
+    assert repo.getAllGames()[0].title == "Dominoquest Deluxe"
+    assert read_snapshot(snapshot_path, data_path / "games.csv")['games'][0].title == "Dominoquest Deluxe"
@@ -8,6 +8,7 @@ from games.home import services as home_services
 from games.browse import services as browse_services
 from games.authentication import services as auth_services
 from games.wishlist import services as wishlist_services
+from games.api import services as api_services
 from games.utilities import utilities as utilities
 
 
@@ -33,6 +34,44 @@ def test_get_games_by_genre(repo):
         assert Genre("Action") in game.genres or Genre("Adventure") in game.genres
 
 
+def test_search_games(repo):
+    # Check if the browse page search parameters are translated into one repository search
+    games, total = browse_services.searchGames(repo, ["Action", "Adventure"], "Genre", "Action;Adventure;",
+                                               None, "", 0, 10)
+    assert total == 170
+    assert len(games) == 10
+    games, total = browse_services.searchGames(repo, [""], "Title", "Honkai Impact 3rd", None, "", 0, 10)
+    assert total == 1
+    assert games[0].title == "Honkai Impact 3rd"
+    games, total = browse_services.searchGames(repo, [""], "Search", "modern warf", None, "", 0, 10)
+    assert total == 2
+    assert games[0].game_id == 7940
+    games, total = browse_services.searchGames(repo, [""], "Title", "", None, "", 870, 10)
+    assert total == 877
+    assert len(games) == 7
+
+
+def test_get_suggestions(repo):
+    # Check if suggestions match the start of a name or of a word in it, names starting with the prefix first
+    titles = api_services.get_suggestions(repo, "title", "call of", 10)
+    assert titles[0] == "Call of Duty® 4: Modern Warfare®"
+    assert len(api_services.get_suggestions(repo, "title", "z", 5)) == 5
+    for title in api_services.get_suggestions(repo, "title", "zom", 10):
+        assert any(word.startswith("zom") for word in title.lower().split())
+    assert api_services.get_suggestions(repo, "genre", "act", 10) == ["Action"]
+    assert api_services.get_suggestions(repo, "publisher", "activ", 10) == ["Activision"]
+    assert api_services.get_suggestions(repo, "title", "zzzzqqq", 10) == []
+    with pytest.raises(api_services.UnknownSuggestionTypeException):
+        api_services.get_suggestions(repo, "developer", "a", 10)
+
+
+def test_suggestions_follow_catalogue_changes(repo):
+    # Check if games added after the index was built are suggested, without restarting
+    assert api_services.get_suggestions(repo, "title", "dominoquest", 10) == []
+    repo.add_game(Game(1, "Dominoquest Deluxe"))
+    assert api_services.get_suggestions(repo, "title", "dominoquest", 10) == ["Dominoquest Deluxe"]
+
+
 def test_search_game_by_title(repo):
     # Check if the games by title are retrieved correctly
     games = repo.getAllGames()
@@ -219,6 +258,16 @@ def test_calculate_average_rating(repo):
     assert utilities.calculate_average_rating(reviews) == 4.5
 
 
+def test_get_average_rating(repo):
+    # Check if the average rating is read from the repository's rating summary
+    user = utilities.getUser("thorke", repo)
+    game = utilities.getGameById(repo, 7940)
+    assert utilities.get_average_rating(repo, 7940) == "No Reviews Yet"
+    repo.add_review(Review(user, game, 5, "Test Review"))
+    repo.add_review(Review(user, game, 4, "Test Review2"))
+    assert utilities.get_average_rating(repo, 7940) == 4.5
+
+
 def test_get_wishlist(repo):
     # Check if the wishlist can be retrieved from the repository
     user = utilities.getUser("thorke", repo)
@@ -236,3 +285,17 @@ def test_is_game_in_wishlist(repo):
     assert utilities.is_game_in_wishlist(repo, user, game) == False
     wishlist.add_game(game)
     assert utilities.is_game_in_wishlist(repo, user, game) == True
+
+
+def test_reading_a_wishlist_does_not_create_one(repo):
+    # A user without a wishlist sees an empty one, it is only stored once a game is added
+    user = utilities.getUser("thorke", repo)
+    game = repo.getGameById(7940)
+    assert utilities.get_wishlist(repo, user).list_of_games() == []
+    assert utilities.is_game_in_wishlist(repo, user, game) == False
+    assert repo.get_wishlist(user) is None
+
+    wishlist = utilities.get_wishlist(repo, user)
+    wishlist.add_game(game)
+    wishlist_services.add_wishlist(repo, user, wishlist)
+    assert utilities.is_game_in_wishlist(repo, user, game) == True
@@ -0,0 +1,48 @@
+import logging
+
+from games.adapters.write_behind import WriteBehindQueue
+
+
+def test_queue_writes_items_in_batches():
+    batches = []
+    queue = WriteBehindQueue(batches.append, batch_size=3, max_delay=1.0)
+    for item in range(7):
+        queue.submit(item)
+    queue.flush()
+    assert sorted(item for batch in batches for item in batch) == list(range(7))
+    assert queue.stats()['items'] == 7
+    assert queue.stats()['failed_batches'] == 0
+    queue.close()
+
+
+def test_queue_tries_a_failed_batch_again():
+    written = []
+    failures = [RuntimeError("database is locked")]
+
+    def write_batch(batch):
+        if failures:
+            raise failures.pop()
+        written.extend(batch)
+    queue = WriteBehindQueue(write_batch, batch_size=2, max_delay=1.0, retry_delay=0)
+    queue.submit('a')
+    queue.submit('b')
+    queue.flush()
+    assert written == ['a', 'b']
+    stats = queue.stats()
+    assert (stats['batches'], stats['items'], stats['failed_batches'], stats['lost_items']) == (1, 2, 1, 0)
+    queue.close()
+
+
+def test_queue_logs_a_batch_that_keeps_failing(caplog):
+    def write_batch(batch):
+        raise RuntimeError("disk full")
+    queue = WriteBehindQueue(write_batch, batch_size=2, max_delay=1.0, max_attempts=3, retry_delay=0)
+    with caplog.at_level(logging.WARNING, logger='games.adapters.write_behind'):
+        queue.submit('a')
+        queue.submit('b')
+        queue.flush()
+    stats = queue.stats()
+    assert (stats['batches'], stats['items'], stats['failed_batches'], stats['lost_items']) == (0, 0, 3, 2)
+    assert [record.levelname for record in caplog.records] == ['WARNING', 'WARNING', 'ERROR']
+    assert "['a', 'b']" in caplog.records[-1].getMessage()
+    queue.close()
@@ -1,13 +1,17 @@
 import pytest
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, clear_mappers
 
-from games.adapters import database_repository, repository_populate
+from games import create_app
+from games.adapters import database_repository, repository_populate, password_hashing, repository
 from games.adapters.orm import metadata, map_model_to_tables
 
 from utils import get_project_root
 
+# cheap password hashes so that loading the test users does not dominate the test run
+password_hashing.password_hash_method = 'pbkdf2:sha256:1000'
+
 TEST_DATA_PATH_DATABASE_FULL = get_project_root() / "games" / "adapters" / "data"
 TEST_DATA_PATH_DATABASE_LIMITED = get_project_root() / "tests" / "data"
 
@@ -58,4 +62,54 @@ def empty_session():
     map_model_to_tables()
     session_factory = sessionmaker(bind=engine)
     yield session_factory()
-    metadata.drop_all(engine)
\ No newline at end of file
+    metadata.drop_all(engine)
+
+class QueryCounter:
+    """Counts the SQL statements an engine runs inside a with block, keeping them with their parameters."""
+
+    def __init__(self, engine):
+        self.__engine = engine
+        self.statements = []
+        self.parameters = []
+
+    def __enter__(self):
+        event.listen(self.__engine, "before_cursor_execute", self.__count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.__engine, "before_cursor_execute", self.__count)
+
+    def __count(self, conn, cursor, statement, parameters, *args):
+        self.statements.append(statement)
+        self.parameters.append(parameters)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def query_counter(session_factory):
+    return QueryCounter(session_factory.kw['bind'])
+
+
+@pytest.fixture
+def database_client():
+    # The web app on the SQL repository, in an in-memory database filled with the full data. The fragment
+    # cache is off, so that every page runs its queries and the statement counts see them.
+    my_app = create_app({
+        'TESTING': True,
+        'TEST_DATA_PATH': TEST_DATA_PATH_DATABASE_FULL,
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': TEST_DATABASE_URI_IN_MEMORY,
+        'PASSWORD_HASH_CACHE': None,
+        'FRAGMENT_CACHE_SIZE': 0
+    })
+    return my_app.test_client()
+
+
+@pytest.fixture
+def database_client_query_counter(database_client):
+    # Counts the statements of the database_client's engine
+    return QueryCounter(repository.repo_instance._session_factory.kw['bind'])
@@ -0,0 +1,127 @@
+import pytest
+from sqlalchemy import event
+
+from games import create_app
+from games.adapters import repository
+from games.domainmodel.model import Game
+from utils import get_project_root
+
+# Statements a page may run once the catalogue cache is warm. Without eager loading every listed game would
+# add a query for its genres (and its publisher), so these limits fail as soon as a listing goes N+1.
+MAX_BROWSE_STATEMENTS = 3
+MAX_WISHLIST_STATEMENTS = 5
+
+
+def login(client):
+    return client.post('/auth/login', data={'username': 'thorke', 'password': 'cLQ^C#oFXloS'})
+
+
+@pytest.mark.parametrize('url', [
+    '/browse/',
+    '/browse/?page=3',
+    '/browse/?genres=Action%2CIndie',
+    '/browse/?search=Title&searchterm=the',
+    '/browse/?search=Search&searchterm=space',
+    '/browse/?sort=rating&minrating=0',
+])
+def test_browse_page_statement_count(database_client, database_client_query_counter, url):
+    database_client.get(url)
+    with database_client_query_counter as query_counter:
+        response = database_client.get(url)
+    assert response.status_code == 200
+    assert 0 < query_counter.count <= MAX_BROWSE_STATEMENTS, query_counter.statements
+
+
+def test_wishlist_page_statement_count(database_client, database_client_query_counter):
+    login(database_client)
+    for game_id in (7940, 435790, 1228870, 311120):
+        database_client.post('/wishlist/add_to_wishlist', data={'game_id': game_id})
+    database_client.get('/wishlist/')
+    with database_client_query_counter as query_counter:
+        response = database_client.get('/wishlist/')
+    assert response.status_code == 200
+    assert b'Call of Duty' in response.data
+    assert query_counter.count <= MAX_WISHLIST_STATEMENTS, query_counter.statements
+
+
+def test_stats_endpoint(database_client):
+    database_client.get('/browse/details?id=7940')
+    stats = database_client.get('/api/stats').json
+    assert stats['pool']['pool'] == 'SingletonThreadPool'
+    assert stats['catalogue_cache']['misses'] >= 1
+    # Every request's session was closed on teardown
+    assert stats['sessions']['sessions_open'] == 0
+    assert stats['sessions']['sessions_closed'] >= 1
+
+
+def test_pages_do_not_write(database_client, database_client_query_counter):
+    login(database_client)
+    with database_client_query_counter as query_counter:
+        for url in ('/browse/details?id=7940', '/wishlist/', '/profile/'):
+            assert database_client.get(url).status_code == 200
+    writes = [statement for statement in query_counter.statements
+              if statement.split()[0].upper() in ('INSERT', 'UPDATE', 'DELETE')]
+    assert writes == []
+
+
+def test_request_mutations_are_committed_once(database_client):
+    login(database_client)
+    commits = []
+    engine = repository.repo_instance._session_factory.kw['bind']
+
+    def count_commit(connection):
+        commits.append(connection)
+    event.listen(engine, "commit", count_commit)
+    database_client.post('/wishlist/add_to_wishlist', data={'game_id': 7940})
+    database_client.post('/review/submit_review', data={'game_id': 7940, 'rating': 4, 'comment': 'Good'})
+    event.remove(engine, "commit", count_commit)
+    # The wishlist and its first game are stored by one commit, as are the review and the rating summary
+    assert len(commits) == 2
+    assert b'Call of Duty' in database_client.get('/wishlist/').data
+
+
+def test_app_keeps_an_existing_database(tmp_path):
+    config = {
+        'TESTING': True,
+        'TEST_DATA_PATH': get_project_root() / "tests" / "data",
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'games.db'}",
+        'PASSWORD_HASH_CACHE': None
+    }
+    client = create_app(config).test_client()
+    login(client)
+    client.post('/review/submit_review', data={'game_id': 7940, 'rating': 5, 'comment': 'Kept'})
+
+    # Started again outside of testing the app uses the database as it is
+    client = create_app({**config, 'TESTING': False}).test_client()
+    assert b'Kept' in client.get('/browse/details?id=7940').data
+
+
+def test_page_etags_come_from_the_database(tmp_path):
+    config = {
+        'TESTING': True,
+        'TEST_DATA_PATH': get_project_root() / "tests" / "data",
+        'WTF_CSRF_ENABLED': False,
+        'REPOSITORY': 'database',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'games.db'}",
+        'PASSWORD_HASH_CACHE': None
+    }
+    client = create_app(config).test_client()
+    etag = client.get('/browse/').headers['ETag']
+
+    # Another process on the same database, e.g. the next gunicorn worker, gives the same page the same ETag
+    client = create_app({**config, 'TESTING': False}).test_client()
+    assert client.get('/browse/').headers['ETag'] == etag
+    assert client.get('/browse/', headers={'If-None-Match': etag}).status_code == 304
+
+    # After that process changed the catalogue, the app started again never answers the old ETag with 304
+    game = Game(1, "Added Before The Restart")
+    game.price = 1.0
+    game.release_date = 'Oct 21, 2008'
+    repository.repo_instance.add_game(game)
+    client = create_app({**config, 'TESTING': False}).test_client()
+    response = client.get('/browse/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b'Added Before The Restart' in response.data
@@ -0,0 +1,74 @@
+import threading
+
+from sqlalchemy.pool import SingletonThreadPool
+
+from games.adapters.database_engine import create_database_engine, pool_stats, sqlite_pragmas, InstrumentedQueuePool
+
+
+def test_sqlite_pragmas_are_applied_on_connect(tmp_path):
+    engine = create_database_engine({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'games.db'}",
+        'SQLITE_CACHE_SIZE': -2000,
+    })
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == 'wal'
+        assert connection.exec_driver_sql("PRAGMA synchronous").scalar() == 1  # NORMAL
+        assert connection.exec_driver_sql("PRAGMA cache_size").scalar() == -2000
+        assert connection.exec_driver_sql("PRAGMA mmap_size").scalar() == 256 * 1024 * 1024
+    engine.dispose()
+
+
+def test_sqlite_pragmas_can_be_set_to_zero(tmp_path):
+    engine = create_database_engine({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'games.db'}",
+        'SQLITE_MMAP_SIZE': 0,
+        'SQLITE_CACHE_SIZE': '0',
+    })
+    assert sqlite_pragmas({'SQLITE_MMAP_SIZE': 0})['mmap_size'] == 0
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("PRAGMA mmap_size").scalar() == 0
+        assert connection.exec_driver_sql("PRAGMA cache_size").scalar() == 0
+    engine.dispose()
+
+
+def test_pool_settings_and_stats(tmp_path):
+    engine = create_database_engine({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'games.db'}",
+        'SQLALCHEMY_POOL_SIZE': 2,
+        'SQLALCHEMY_MAX_OVERFLOW': 1,
+        'SQLALCHEMY_POOL_RECYCLE': 60,
+    })
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert engine.pool.size() == 2
+    assert engine.pool._recycle == 60
+
+    connections = [engine.connect() for _ in range(3)]
+    stats = pool_stats(engine)
+    assert stats['checked_out'] == 3
+    assert stats['overflow'] == 1
+    for connection in connections:
+        connection.close()
+
+    # A fourth checkout has to wait until another thread gives a connection back
+    connections = [engine.connect() for _ in range(3)]
+    releaser = threading.Timer(0.2, connections[0].close)
+    releaser.start()
+    with engine.connect():
+        pass
+    releaser.join()
+    for connection in connections[1:]:
+        connection.close()
+
+    stats = pool_stats(engine)
+    assert stats['checked_out'] == 0
+    # The overflow connection is closed when it is given back, so the second round opens it again
+    assert stats['connections_opened'] == 4
+    assert stats['checkouts'] == 7
+    assert stats['checkout_wait_max'] >= 0.15
+    engine.dispose()
+
+
+def test_in_memory_sqlite_keeps_its_single_connection_pool():
+    engine = create_database_engine({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+    assert isinstance(engine.pool, SingletonThreadPool)
+    assert pool_stats(engine) == {'pool': 'SingletonThreadPool'}
@@ -1,9 +1,16 @@
+import threading
+import time
 from datetime import date, datetime
 
 import pytest
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
 
 import games.adapters.repository as repo
+from games.adapters.catalogue_cache import CatalogueCache
 from games.adapters.database_repository import SqlAlchemyRepository
+from games.adapters.orm import metadata, catalogue_meta_table, create_schema
 from games.domainmodel.model import Publisher, Genre, Game, Review, User, Wishlist
 from games.adapters.repository import RepositoryException
 
@@ -20,6 +27,31 @@ def test_repository_can_add_a_game(session_factory):
 
     assert repo.getGameById(1) == game
 
+def test_repository_can_bulk_load(session_factory):
+    # Check if games, genres, publishers and users can be loaded in batches within one transaction
+    repo = SqlAlchemyRepository(session_factory)
+
+    publisher = Publisher("Bulk Publisher")
+    genres = [Genre("Bulk Genre"), Genre("Other Bulk Genre")]
+    games = []
+    for game_id in range(1, 26):
+        game = Game(game_id, f"Bulk Game {game_id}")
+        game.price = 1.0
+        game.release_date = 'Oct 21, 2008'
+        game.publisher = publisher
+        game.add_genre(genres[game_id % 2])
+        games.append(game)
+    users = [User("Bulk User", "Bulk Password")]
+
+    stats = repo.bulk_load(games, genres, [publisher], users, batch_size=10)
+
+    assert stats['rows'] == 1 + 2 + 25 + 25 + 1
+    assert stats['rows_per_second'] > 0
+    assert repo.getGameById(25).genres == [Genre("Other Bulk Genre")]
+    assert repo.getGameById(25).publisher == publisher
+    assert len(repo.getGamesByGenres([Genre("Bulk Genre")])) == 12
+    assert repo.getUser("bulk user") == users[0]
+
 def test_repository_can_get_all_games(session_factory):
     # Check if the repository can retrieve all games
     repo = SqlAlchemyRepository(session_factory)
@@ -58,6 +90,53 @@ def test_repository_can_get_games_by_genre(session_factory):
 
     assert len(games) == 1
 
+def test_repository_get_games_by_genres_is_a_stable_union(session_factory):
+    # Check that a multi-genre query returns every game in any of the genres, ordered by game id
+    repo = SqlAlchemyRepository(session_factory)
+
+    games = repo.getGamesByGenres([Genre("Action"), Genre("Indie")])
+
+    assert len(games) == len(set(games))
+    for game in games:
+        assert Genre("Action") in game.genres or Genre("Indie") in game.genres
+    assert [game.game_id for game in games] == sorted(game.game_id for game in games)
+    assert games == repo.getGamesByGenres([Genre("Indie"), Genre("Action")])
+
+def test_repository_search_games(session_factory):
+    # Check if the repository can filter, count and paginate games in one query
+    repo = SqlAlchemyRepository(session_factory)
+
+    games, total = repo.search_games(genre_terms=["action", "adventure"], offset=10, limit=10)
+
+    assert total > 10
+    assert len(games) == 10
+    for game in games:
+        assert Genre("Action") in game.genres and Genre("Adventure") in game.genres
+    games, total = repo.search_games(title="z", limit=5)
+    assert len(games) == 5
+    for game in games:
+        assert "z" in game.title.lower()
+    assert [game.game_id for game in games] == sorted(game.game_id for game in games)
+    assert repo.search_games(title="no such game") == ([], 0)
+
+def test_repository_full_text_search(session_factory):
+    # Check if games can be found through the FTS5 index, including games added after loading
+    repo = SqlAlchemyRepository(session_factory)
+
+    games, total = repo.search_games(text="call of dut")
+    assert total == 1
+    assert games[0].game_id == 7940
+    games, total = repo.search_games(text="zombie", limit=3)
+    assert len(games) == 3
+    assert "zombie" in games[0].title.lower()
+
+    game = Game(1, "Domino Game")
+    game.price = 10.0
+    game.release_date = 'Oct 21, 2008'
+    game.description = "Knock over thousands of quixotic dominoes"
+    repo.add_game(game)
+    assert repo.search_games(text="quixot domin") == ([game], 1)
+
 def test_repository_can_add_a_genre(session_factory):
     # Check if the genre can be added to the repository
     repo = SqlAlchemyRepository(session_factory)
@@ -133,6 +212,39 @@ def test_repository_can_get_all_reviews(session_factory):
 
     assert len(reviews) == initiallen + 1
 
+def test_repository_can_get_reviews_for_a_game_and_a_user(session_factory):
+    # Check if the repository can page through the reviews of one game and of one user, newest first
+    repo = SqlAlchemyRepository(session_factory)
+
+    user = User("Test User", "Test Password")
+    repo.addUser(user)
+    game = repo.getGameById(7940)
+    other_game = repo.getGameById(1436990)
+    for i in range(3):
+        repo.add_review(Review(user, game, i, f"Review {i}"))
+    repo.add_review(Review(user, other_game, 5, "Other Review"))
+
+    assert repo.count_reviews_for_game(7940) == 3
+    assert [review.comment for review in repo.get_reviews_for_game(7940)] == ["Review 2", "Review 1", "Review 0"]
+    assert [review.comment for review in repo.get_reviews_for_game(7940, 1, 1)] == ["Review 1"]
+    assert repo.count_reviews_for_user("test user") == 4
+    assert [review.comment for review in repo.get_reviews_for_user("test user", 0, 2)] == ["Other Review", "Review 2"]
+    assert repo.get_reviews_for_user("nobody") == []
+
+def test_repository_maintains_rating_summaries(session_factory):
+    # Check if the review count and rating total of a game are kept up to date by add_review
+    repo = SqlAlchemyRepository(session_factory)
+
+    user = User("Test User", "Test Password")
+    repo.addUser(user)
+    assert repo.get_rating_summary(7940) == (0, 0)
+    repo.add_review(Review(user, repo.getGameById(7940), 5, "Review 1"))
+    repo.add_review(Review(user, repo.getGameById(7940), 2, "Review 2"))
+
+    assert repo.get_rating_summary(7940) == (2, 7)
+    assert repo.count_reviews_for_game(7940) == 2
+    assert repo.get_rating_summaries() == {7940: (2, 7)}
+
 def test_repository_can_get_a_wishlist(session_factory):
     # Check if the repository can retrieve a wishlist
     repo = SqlAlchemyRepository(session_factory)
@@ -219,3 +331,253 @@ def test_repository_can_get_all_users(session_factory):
     users = repo.getAllUsers()
 
     assert len(users) >= 0
+
+
+def test_repository_serves_catalogue_reads_from_cache(session_factory):
+    # Check that repeated catalogue reads do not query the database, and that adds invalidate the cache
+    repo = SqlAlchemyRepository(session_factory)
+    statements = []
+    engine = session_factory.kw['bind']
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(engine, "before_cursor_execute", count_statement)
+
+    game = repo.getGameById(7940)
+    genres = repo.getAllGenres()
+    publishers = repo.getAllPublishers()
+    games = repo.getAllGames()
+    statement_count = len(statements)
+    assert repo.getGameById(7940) == game
+    assert repo.getGameById(7940).genres == game.genres
+    assert repo.getAllGenres() == genres
+    assert repo.getAllPublishers() == publishers
+    assert repo.getAllGames() == games
+    assert len(statements) == statement_count
+    assert repo.catalogue_cache_stats()['hits'] == 5
+
+    repo.add_genre(Genre("Cached Genre"))
+    assert Genre("Cached Genre") in repo.getAllGenres()
+    new_game = Game(1, "Cached Game")
+    new_game.price = 1.0
+    new_game.release_date = 'Oct 21, 2008'
+    new_game.publisher = Publisher("Cached Publisher")
+    repo.add_game(new_game)
+    assert repo.getGameById(1) == new_game
+    assert new_game in repo.getAllGames()
+    assert Publisher("Cached Publisher") in repo.getAllPublishers()
+    event.remove(engine, "before_cursor_execute", count_statement)
+
+def test_repository_opens_sessions_lazily_and_closes_them_per_request(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    assert repo.session_stats()['sessions_opened'] == 0
+
+    # A request that never touches the repository never opens a session
+    repo.reset_session()
+    repo.close_session()
+    assert repo.session_stats()['sessions_opened'] == 0
+
+    repo.reset_session()
+    user = repo.getUser('thorke')
+    assert repo.get_reviews_for_user(user.username) is not None
+    assert repo.session_stats()['sessions_open'] == 1
+    repo.close_session()
+
+    stats = repo.session_stats()
+    assert stats['sessions_opened'] == stats['sessions_closed'] == 1
+    assert stats['objects_held_max'] >= 1
+    assert stats['session_lifetime_max'] > 0
+
+    # The next request starts with an empty identity map
+    repo.reset_session()
+    user = repo.getUser('thorke')
+    assert list(repo._session_cm.session.identity_map.values()) == [user]
+    repo.close_session()
+
+
+def test_repository_sessions_are_per_thread(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    repo.getUser('thorke')
+    session = repo._session_cm.session()
+
+    # Another thread ending its request leaves this thread's session alone
+    worker = threading.Thread(target=repo.close_session)
+    worker.start()
+    worker.join()
+    assert repo._session_cm.session() is session
+    assert repo.session_stats()['sessions_open'] == 1
+    repo.close_session()
+
+
+def test_repository_unit_of_work_commits_once(database_engine):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    commits = []
+
+    def count_commit(connection):
+        commits.append(connection)
+    event.listen(database_engine, "commit", count_commit)
+
+    repo.begin_unit_of_work()
+    user = repo.getUser('thorke')
+    wishlist = Wishlist(user)
+    wishlist.add_game(repo.getGameById(7940))
+    repo.add_wishlist(user, wishlist)
+    repo.add_review(Review(user, repo.getGameById(7940), 4, "Grouped"))
+    # Flushed for this session, but not yet visible to other connections
+    assert repo.get_wishlist(user) == wishlist
+    with database_engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT COUNT(*) FROM wishlists").scalar() == 0
+    repo.commit_unit_of_work()
+    repo.close_session()
+    event.remove(database_engine, "commit", count_commit)
+
+    assert len(commits) == 1
+    assert repo.get_rating_summary(7940) == (1, 4)
+    assert repo.getGameById(7940) in repo.get_wishlist(repo.getUser('thorke')).list_of_games()
+
+
+def test_repository_unit_of_work_rolls_back_when_not_committed(database_engine):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    repo.begin_unit_of_work()
+    user = repo.getUser('thorke')
+    repo.add_wishlist(user, Wishlist(user))
+    # e.g. the request failed before its after_request callback
+    repo.close_session()
+    assert repo.get_wishlist(repo.getUser('thorke')) is None
+
+
+def test_repository_can_queue_reviews_behind(database_engine):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine), review_batch_size=10)
+    user = repo.getUser('thorke')
+    game_ids = [7940, 1228870, 311120]
+
+    def submit_reviews(game_id):
+        for rating in range(5):
+            repo.add_review(Review(user, repo.getGameById(game_id), rating, "Queued"))
+    threads = [threading.Thread(target=submit_reviews, args=(game_id,)) for game_id in game_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    repo.flush_reviews()
+
+    for game_id in game_ids:
+        assert repo.count_reviews_for_game(game_id) == 5
+        assert repo.get_rating_summary(game_id) == (5, 10)
+        assert len(repo.get_reviews_for_game(game_id)) == 5
+    assert repo._review_queue.stats()['items'] == 15
+    assert repo._review_queue.stats()['batches'] < 15
+
+
+def test_repository_can_add_a_game_to_a_new_wishlist(session_factory):
+    repo = SqlAlchemyRepository(session_factory)
+    user = repo.getUser('thorke')
+    game = repo.getGameById(7940)
+    assert repo.get_wishlist(user) is None
+
+    repo.add_game_to_wishlist(user, game)
+    repo.add_game_to_wishlist(user, game)
+    assert repo.get_wishlist(user).list_of_games() == [game]
+
+
+def test_repository_catalogue_version_is_shared_through_the_database(database_engine):
+    # Two repositories on one database, e.g. two gunicorn workers
+    now = [0.0]
+    repo_a = SqlAlchemyRepository(sessionmaker(bind=database_engine), CatalogueCache(ttl=60, clock=lambda: now[0]))
+    repo_b = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    version = repo_a.catalogue_version()
+    assert version > 0
+    assert repo_b.catalogue_version() == version
+
+    game = Game(1, "Other Worker's Game")
+    game.price = 1.0
+    game.release_date = 'Oct 21, 2008'
+    repo_b.add_game(game)
+    assert repo_b.catalogue_version() > version
+    # Until its cached version expires, repo_a keeps it together with the games it has cached
+    assert repo_a.catalogue_version() == version
+    now[0] += 61
+    assert repo_a.catalogue_version() == repo_b.catalogue_version()
+    assert repo_a.getGameById(1) == game
+
+
+def test_repository_catalogue_version_is_not_reused_by_a_new_database(database_engine):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    version = repo.catalogue_version()
+    # The database is filled again from scratch, as create_app does for testing
+    for table in reversed(metadata.sorted_tables):
+        database_engine.execute(table.delete())
+    time.sleep(0.01)
+    repo.add_genre(Genre("Rebuilt Genre"))
+    assert repo.catalogue_version() > version
+
+
+def test_create_schema_gives_an_existing_database_a_catalogue_version(database_engine):
+    with database_engine.begin() as connection:
+        connection.execute(catalogue_meta_table.delete())
+    create_schema(database_engine)
+    assert SqlAlchemyRepository(sessionmaker(bind=database_engine)).catalogue_version() > 0
+
+
+def test_repository_failed_review_leaves_the_rest_of_the_unit_of_work(database_engine, monkeypatch):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine))
+    repo.begin_unit_of_work()
+    user = repo.getUser('thorke')
+    repo.add_wishlist(user, Wishlist(user))
+
+    def locked(*args):
+        raise OperationalError("UPDATE game_ratings", {}, Exception("database is locked"))
+    monkeypatch.setattr(repo, '_add_to_rating_summary', locked)
+    with pytest.raises(RepositoryException):
+        repo.add_review(Review(user, repo.getGameById(7940), 4, "Not saved"))
+    repo.commit_unit_of_work()
+    repo.close_session()
+
+    assert repo.get_wishlist(repo.getUser('thorke')) is not None
+    assert repo.get_reviews_for_game(7940) == []
+    with database_engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT COUNT(*) FROM reviews").scalar() == 0
+
+
+def test_repository_first_reviews_of_a_game_from_two_workers(database_engine):
+    # Two repositories on one database, both adding what may be the game's first review
+    repos = [SqlAlchemyRepository(sessionmaker(bind=database_engine)) for _ in range(2)]
+    failures = []
+
+    def review(repo, number):
+        try:
+            user = repo.getUser('thorke')
+            repo.add_review(Review(user, repo.getGameById(7940), 3, f"Review {number}"))
+        except Exception as e:
+            failures.append(e)
+        finally:
+            repo.close_session()
+    threads = [threading.Thread(target=review, args=(repos[number % 2], number)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert failures == []
+    assert repos[0].get_rating_summary(7940) == (8, 24)
+    assert repos[0].count_reviews_for_game(7940) == 8
+
+
+def test_repository_writes_a_failed_review_batch_again(database_engine, monkeypatch):
+    repo = SqlAlchemyRepository(sessionmaker(bind=database_engine), review_batch_size=10)
+    add_to_rating_summary = SqlAlchemyRepository._add_to_rating_summary
+    failures = [OperationalError("UPDATE game_ratings", {}, Exception("database is locked"))]
+
+    def locked_once(*args):
+        if failures:
+            raise failures.pop()
+        add_to_rating_summary(*args)
+    monkeypatch.setattr(repo, '_add_to_rating_summary', locked_once)
+    repo.add_review(Review(repo.getUser('thorke'), repo.getGameById(7940), 4, "Queued"))
+    repo.flush_reviews()
+
+    # The failed attempt left nothing behind, the second one wrote the review
+    assert repo.count_reviews_for_game(7940) == 1
+    assert len(repo.get_reviews_for_game(7940)) == 1
+    stats = repo.review_queue_stats()
+    assert (stats['items'], stats['failed_batches'], stats['lost_items']) == (1, 1, 0)
@@ -2,8 +2,10 @@ import pytest
 
 import datetime
 
+from sqlalchemy import create_engine, inspect
 from sqlalchemy.exc import IntegrityError
 
+from games.adapters.orm import create_schema
 from games.domainmodel.model import Game, Genre, Publisher, User, Wishlist, Review
 
 article_date = datetime.date(2020, 2, 28)
@@ -162,3 +164,41 @@ def test_loading_of_wishlist_game_associations(empty_session):
     game = empty_session.query(Game).get(game_key)
 
     assert game in wishlist.list_of_games()
+
+
+def test_create_schema_adds_missing_indexes_to_an_existing_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'games.db'}")
+    with engine.begin() as connection:
+        connection.exec_driver_sql("CREATE TABLE wishlists (id INTEGER PRIMARY KEY, username VARCHAR(255))")
+
+    create_schema(engine)
+
+    inspector = inspect(engine)
+    assert 'games' in inspector.get_table_names()
+    assert [index['name'] for index in inspector.get_indexes('wishlists')] == ['ux_wishlists_username']
+    engine.dispose()
+
+
+def test_create_schema_fills_the_rating_summary_and_text_index_of_an_existing_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'games.db'}")
+    with engine.begin() as connection:
+        # A database from before the rating summary and the full-text index
+        connection.exec_driver_sql("CREATE TABLE games (game_id INTEGER PRIMARY KEY, game_title TEXT, "
+                                   "game_price FLOAT, release_date VARCHAR(50), game_description VARCHAR(255), "
+                                   "game_image_url VARCHAR(255), game_website_url VARCHAR(255), "
+                                   "publisher_name VARCHAR(255))")
+        connection.exec_driver_sql("CREATE TABLE reviews (review_id INTEGER PRIMARY KEY, game_id INTEGER, "
+                                   "username VARCHAR(255), rating INTEGER, comment TEXT)")
+        connection.exec_driver_sql("INSERT INTO games VALUES (7940, 'Call of Duty 4', 9.99, 'Nov 12, 2007', "
+                                   "'Modern warfare', NULL, NULL, NULL)")
+        connection.exec_driver_sql("INSERT INTO reviews (game_id, username, rating, comment) "
+                                   "VALUES (7940, 'thorke', 4, 'Good'), (7940, 'fmercury', 2, 'Meh')")
+
+    create_schema(engine)
+
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql("SELECT game_id, review_count, rating_total FROM game_ratings") \
+            .fetchall() == [(7940, 2, 6)]
+        assert connection.exec_driver_sql("SELECT rowid FROM games_fts WHERE games_fts MATCH 'warfare'") \
+            .fetchall() == [(7940,)]
+    engine.dispose()
@@ -6,13 +6,13 @@ def test_database_populate_inspect_table_names(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    assert inspector.get_table_names() == ['game_genres', 'game_reviews', 'games', 'genres', 'publishers', 'reviews', 'user_reviews', 'users', 'wishlist_games', 'wishlists']
+    assert inspector.get_table_names() == ['catalogue_meta', 'game_genres', 'game_ratings', 'game_reviews', 'games', 'games_fts', 'games_fts_config', 'games_fts_data', 'games_fts_docsize', 'games_fts_idx', 'genres', 'publishers', 'reviews', 'user_reviews', 'users', 'wishlist_games', 'wishlists']
 
 def test_database_populate_select_all_games(database_engine):
 
         # Get table information
         inspector = inspect(database_engine)
-        name_of_games_table = inspector.get_table_names()[2]
+        name_of_games_table = inspector.get_table_names()[inspector.get_table_names().index('games')]
 
         with database_engine.connect() as connection:
             # query for records in table games
@@ -30,7 +30,7 @@ def test_database_populate_select_all_publishers(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_publishers_table = inspector.get_table_names()[4]
+    name_of_publishers_table = inspector.get_table_names()[inspector.get_table_names().index('publishers')]
 
     with database_engine.connect() as connection:
         # query for records in table publishers
@@ -47,7 +47,7 @@ def test_database_populate_select_all_users(database_engine):
 
     # Get table information
     inspector = inspect(database_engine)
-    name_of_users_table = inspector.get_table_names()[7]
+    name_of_users_table = inspector.get_table_names()[inspector.get_table_names().index('users')]
 
     with database_engine.connect() as connection:
         # query for records in table users
@@ -63,7 +63,7 @@ def test_database_populate_select_all_users(database_engine):
 def test_database_populate_select_all_genres(database_engine):
     # Get table information
     inspector = inspect(database_engine)
-    name_of_genres_table = inspector.get_table_names()[3]
+    name_of_genres_table = inspector.get_table_names()[inspector.get_table_names().index('genres')]
 
     with database_engine.connect() as connection:
         # query for records in table genres
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from games.adapters import repository
+from games.adapters.database_repository import SqlAlchemyRepository
+from games.domainmodel.model import Genre, User, Wishlist
+
+
+def query_plans(engine, query_counter) -> list[str]:
+    # EXPLAIN QUERY PLAN of every statement the repository ran, one line per step
+    plans = []
+    with engine.connect() as connection:
+        for statement, parameters in zip(query_counter.statements, query_counter.parameters):
+            if not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            plans.extend(row[-1] for row in rows)
+    return plans
+
+
+def assert_no_scans(plans: list[str], *tables):
+    for table in tables:
+        scans = [step for step in plans if step.startswith(f"SCAN {table}")]
+        assert scans == [], f"{table} is scanned: {scans}"
+
+
+def test_game_listing_uses_the_genre_indexes(session_factory, query_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    with query_counter:
+        repo.getGamesByGenres([Genre('Action')], load_plan=repository.GAME_LISTING_PLAN)
+        repo.search_games(genres=[Genre('Indie')], limit=20, load_plan=repository.GAME_LISTING_PLAN)
+
+    plans = query_plans(session_factory.kw['bind'], query_counter)
+    assert_no_scans(plans, 'game_genres')
+    assert any('ix_game_genres_genre_name_game_id' in step for step in plans)
+    assert any('ix_game_genres_game_id_genre_name' in step for step in plans)
+
+
+def test_review_pages_use_the_review_indexes(session_factory, query_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    with query_counter:
+        repo.get_reviews_for_game(7940, limit=10, load_plan={repository.LOAD_REVIEW_USER})
+        repo.get_reviews_for_user('thorke', limit=10, load_plan={repository.LOAD_REVIEW_GAME})
+        repo.count_reviews_for_user('thorke')
+
+    plans = query_plans(session_factory.kw['bind'], query_counter)
+    assert_no_scans(plans, 'reviews')
+    assert any('ix_reviews_game_id_review_id' in step for step in plans)
+    assert any('ix_reviews_username_review_id' in step for step in plans)
+
+
+def test_wishlist_uses_the_wishlist_indexes(session_factory, query_counter):
+    repo = SqlAlchemyRepository(session_factory)
+    user = repo.getUser('thorke')
+    wishlist = Wishlist(user)
+    wishlist.add_game(repo.getGameById(7940))
+    repo.add_wishlist(user, wishlist)
+
+    with query_counter:
+        repo.get_wishlist(user, load_plan=repository.GAME_LISTING_PLAN)
+
+    plans = query_plans(session_factory.kw['bind'], query_counter)
+    assert_no_scans(plans, 'wishlists', 'wishlist_games')
+    assert any('ux_wishlists_username' in step for step in plans)
+    assert any('ux_wishlist_games_wishlist_id_game_id' in step for step in plans)
+
+
+def test_games_by_publisher_uses_the_publisher_index(session_factory):
+    with session_factory.kw['bind'].connect() as connection:
+        rows = connection.exec_driver_sql(
+            "EXPLAIN QUERY PLAN SELECT game_id FROM games WHERE publisher_name = ?", ('Activision',)).fetchall()
+    assert any('ix_games_publisher_name' in row[-1] for row in rows)
+
+
+def test_one_wishlist_per_user(empty_session):
+    empty_session.execute("INSERT INTO users (username, password) VALUES ('thorke', 'hash')")
+    empty_session.execute("INSERT INTO wishlists (username) VALUES ('thorke')")
+    with pytest.raises(IntegrityError):
+        empty_session.execute("INSERT INTO wishlists (username) VALUES ('thorke')")
+
+
+def test_one_row_per_wishlist_and_game(empty_session):
+    empty_session.execute("INSERT INTO wishlist_games (wishlist_id, game_id) VALUES (1, 7940)")
+    with pytest.raises(IntegrityError):
+        empty_session.execute("INSERT INTO wishlist_games (wishlist_id, game_id) VALUES (1, 7940)")